@@ -0,0 +1,107 @@
+import asyncio
+import atexit
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+
+class GroupCommitQueue:
+    def __init__(self, flush, batch_size: int, flush_interval: float, name: str):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._flush = flush
+        self._name = name
+        self._queue = queue.SimpleQueue()
+        self._thread = None
+        self._lock = threading.Lock()
+        self._batches = 0
+        self._flushed = 0
+
+    def submit(self, item):
+        future = Future()
+        self._queue.put((item, future))
+        self._start()
+
+        return future
+
+    async def run(self, item):
+        return await asyncio.wrap_future(self.submit(item))
+
+    def close(self):
+        with self._lock:
+            thread, self._thread = self._thread, None
+
+        if thread is not None:
+            self._queue.put(None)
+            thread.join()
+
+    def stats(self):
+        return {
+            "batch_size": self.batch_size,
+            "flush_interval": self.flush_interval,
+            "pending": self._queue.qsize(),
+            "batches": self._batches,
+            "flushed": self._flushed,
+        }
+
+    def _start(self):
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(
+                    target=self._run, name=self._name, daemon=True
+                )
+                self._thread.start()
+                atexit.register(self.close)
+
+    def _run(self):
+        while True:
+            entry = self._queue.get()
+
+            if entry is None:
+                return
+
+            batch, closing = self._collect(entry)
+            self._commit(batch)
+
+            if closing:
+                return
+
+    def _collect(self, entry):
+        batch = [entry]
+        deadline = time.monotonic() + self.flush_interval
+
+        while len(batch) < self.batch_size:
+            try:
+                entry = self._queue.get(timeout=max(deadline - time.monotonic(), 0))
+            except queue.Empty:
+                break
+
+            if entry is None:
+                return batch, True
+
+            batch.append(entry)
+
+        return batch, False
+
+    def _commit(self, batch):
+        try:
+            results = self._flush([item for item, _ in batch])
+        except Exception as exc:
+            if len(batch) > 1:
+                # Retry one by one so a single bad item does not fail the batch.
+                for entry in batch:
+                    self._commit([entry])
+                return
+
+            self._count(batch)
+            batch[0][1].set_exception(exc)
+        else:
+            self._count(batch)
+
+            for (_, future), result in zip(batch, results):
+                future.set_result(result)
+
+    def _count(self, batch):
+        self._batches += 1
+        self._flushed += len(batch)
@@ -0,0 +1,101 @@
+import time
+from datetime import datetime
+
+import pytest
+from sqlalchemy import insert, select
+
+from .. import models, schemas
+from ..crud import events, guests, users
+from ..database import SessionLocal
+
+EVENT_COUNT = 300
+GUESTS_PER_EVENT = 50
+
+
+def create_user_with_events(db):
+    users.reset_tables(db)
+
+    db_user = users.create_user(
+        db, schemas.UserCreate(email="bench_user", password="123"), "hashed"
+    )
+
+    db.execute(
+        insert(models.Event),
+        [
+            {
+                "name": f"Event {i}",
+                "is_public": False,
+                "start_time": datetime(2050, 6, 1, 16),
+                "location": "Kraków",
+                "menu": "Mięsne;Wegetariańskie",
+                "decision_deadline": datetime(2050, 5, 1, 12),
+                "organizer_id": db_user.user_id,
+            }
+            for i in range(EVENT_COUNT)
+        ],
+    )
+    event_ids = db.scalars(select(models.Event.event_id)).all()
+
+    db.execute(
+        insert(models.Guest),
+        [
+            {
+                "event_id": event_id,
+                "name": f"Guest {i}",
+                "surname": "Nowak",
+                "email": f"guest{i}@example.com",
+                "phone": "+48765456384",
+            }
+            for event_id in event_ids
+            for i in range(GUESTS_PER_EVENT)
+        ],
+    )
+    db.commit()
+
+    return db_user.user_id
+
+
+def legacy_delete_user(db, user_id: int):
+    for event in events.get_event_by_organizer(db, user_id):
+        for guest in guests.get_guests_from_event(db, event.uuid):
+            db.delete(guest)
+        db.commit()
+
+        db.delete(event)
+        db.commit()
+
+    users.delete_user(db, user_id)
+
+
+def report(name, elapsed):
+    print(
+        f"\n{name:<22} {elapsed:7.2f} s  {EVENT_COUNT / elapsed:8.0f} events/s"
+        f"  {EVENT_COUNT * GUESTS_PER_EVENT / elapsed:9.0f} guests/s"
+    )
+
+
+def test_legacy_per_event_deletion():
+    db = SessionLocal()
+    user_id = create_user_with_events(db)
+
+    start = time.perf_counter()
+    legacy_delete_user(db, user_id)
+    report("per-event loop", time.perf_counter() - start)
+
+    db.close()
+
+
+@pytest.mark.parametrize("batch_size", [1, 10, 50, 300])
+def test_deletion_job(batch_size):
+    db = SessionLocal()
+    user_id = create_user_with_events(db)
+    db_job = users.create_deletion_job(db, user_id)
+
+    start = time.perf_counter()
+    db_job = users.run_deletion_job(db, db_job.job_id, batch_size)
+    report(f"job, batch of {batch_size}", time.perf_counter() - start)
+
+    assert db_job.status == "done"
+    assert db_job.deleted_events == EVENT_COUNT
+
+    db.close()
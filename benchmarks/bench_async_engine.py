@@ -0,0 +1,74 @@
+import asyncio
+import time
+
+import httpx
+import pytest
+from sqlalchemy import select
+
+from .. import models, utils
+from ..database import SessionLocal, create_async_sessionmaker, engine
+from ..main import create_app
+from .bench_event_stats import create_event_with_guests, menu
+
+app = create_app()
+
+GUEST_COUNT = 2_000
+CONCURRENCY = 200
+
+# SQLite serializes writers and aiosqlite adds a thread hop per query, so the
+# async engine pays off against Postgres; set SQLALCHEMY_DATABASE_URL to compare.
+
+
+async def run_load(guest_uuids, workload):
+    semaphore = asyncio.Semaphore(CONCURRENCY)
+    transport = httpx.ASGITransport(app=app)
+
+    async with httpx.AsyncClient(
+        transport=transport, base_url="http://bench"
+    ) as client:
+
+        async def request(i, guest_uuid):
+            async with semaphore:
+                if workload == "rsvp":
+                    response = await client.post(
+                        f"/guests/{guest_uuid}/answer",
+                        json={"answer": True, "menu": menu[i % len(menu)]},
+                    )
+                else:
+                    response = await client.get(f"/guests/{guest_uuid}")
+
+            assert response.status_code == 200
+
+        await asyncio.gather(
+            *[request(i, guest_uuid) for i, guest_uuid in enumerate(guest_uuids)]
+        )
+
+
+@pytest.mark.parametrize("async_database", [False, True])
+@pytest.mark.parametrize("workload", ["rsvp", "read"])
+def test_sync_and_async_engines_under_load(workload, async_database):
+    db = SessionLocal()
+    create_event_with_guests(db, GUEST_COUNT)
+    guest_uuids = db.scalars(select(models.Guest.uuid)).all()
+    db.close()
+
+    if async_database:
+        AsyncSessionLocal = create_async_sessionmaker(engine.url)
+
+        async def get_async_db():
+            async with AsyncSessionLocal() as db:
+                yield db
+
+        app.dependency_overrides[utils.get_async_db] = get_async_db
+
+    try:
+        start = time.perf_counter()
+        asyncio.run(run_load(guest_uuids, workload))
+        elapsed = time.perf_counter() - start
+    finally:
+        app.dependency_overrides.clear()
+
+    print(
+        f"\n{workload:<4} {'async' if async_database else 'sync '} engine"
+        f"  {GUEST_COUNT / elapsed:8.0f} requests/s"
+    )
@@ -0,0 +1,55 @@
+import io
+import os
+import time
+
+from PIL import Image
+
+from .. import images, storage
+
+
+def make_photo():
+    photo = Image.effect_mandelbrot((4000, 3000), (-2, -1.25, 1, 1.25), 100)
+    buffer = io.BytesIO()
+    photo.convert("RGB").save(buffer, "JPEG", quality=92)
+
+    return buffer.getvalue()
+
+
+def test_background_bytes_and_request_cpu(monkeypatch, tmp_path):
+    monkeypatch.setattr(images, "storage", storage.LocalStorage(str(tmp_path)))
+    upload = make_photo()
+
+    start = time.perf_counter()
+    Image.open(io.BytesIO(upload)).save(tmp_path / "legacy.jpeg")
+    legacy_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    background_hash = images.save_original(io.BytesIO(upload), "jpeg")
+    request_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    images.image_pool.submit(images.generate_variants, background_hash, "jpeg").result()
+    variants_time = time.perf_counter() - start
+
+    # A second upload of the same bytes stores nothing and generates nothing.
+    start = time.perf_counter()
+    images.save_original(io.BytesIO(upload), "jpeg")
+    placeholder = images.read_placeholder(background_hash)
+    duplicate_time = time.perf_counter() - start
+
+    print(
+        f"\nin request: decode + save {legacy_time * 1000:7.1f} ms"
+        f"  copy {request_time * 1000:7.1f} ms"
+        f"  (variants in pool {variants_time * 1000:7.1f} ms)"
+    )
+    print(f"duplicate upload  {duplicate_time * 1000:7.1f} ms")
+    print(f"placeholder       {len(placeholder):8d} B")
+    print(f"original          {len(upload) / 1024:8.1f} KiB")
+
+    for name, width in images.VARIANT_WIDTHS.items():
+        columns = []
+        for image_format in images.VARIANT_FORMATS:
+            key = images.variant_key(background_hash, width, image_format)
+            size = os.path.getsize(tmp_path / key) / 1024
+            columns.append(f"{image_format} {size:8.1f} KiB")
+        print(f"{name:<10} {width:>5}  {'  '.join(columns)}")
@@ -0,0 +1,52 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+from sqlalchemy import select
+from sqlalchemy.orm import sessionmaker
+
+from .. import models, schemas
+from ..configuration import settings
+from ..crud import guests
+from ..database import build_engine
+from .bench_event_stats import create_event_with_guests, menu
+
+GUEST_COUNT = 2_000
+THREADS = 16
+
+
+def answer(Session, i, guest_uuid):
+    with Session() as db:
+        db_guest, _ = guests.get_guest_for_answer(db, guest_uuid)
+        guests.answer_invitation(
+            db,
+            db_guest,
+            schemas.GuestAnswear(answer=True, menu=menu[i % len(menu)]),
+        )
+        db.commit()
+
+
+@pytest.mark.parametrize("database_tuning", [False, True])
+def test_concurrent_rsvp_writes(monkeypatch, tmp_path, database_tuning):
+    monkeypatch.setattr(settings, "database_tuning", database_tuning)
+    engine = build_engine(f"sqlite:///{tmp_path / 'bench.db'}")
+    models.Base.metadata.create_all(engine)
+    Session = sessionmaker(autoflush=False, bind=engine)
+
+    with Session() as db:
+        create_event_with_guests(db, GUEST_COUNT)
+        guest_uuids = db.scalars(select(models.Guest.uuid)).all()
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(THREADS) as executor:
+        list(
+            executor.map(answer, [Session] * GUEST_COUNT, *zip(*enumerate(guest_uuids)))
+        )
+    elapsed = time.perf_counter() - start
+
+    engine.dispose()
+
+    print(
+        f"\ntuning {'on ' if database_tuning else 'off'}"
+        f"  {GUEST_COUNT / elapsed:8.0f} RSVP commits/s"
+    )
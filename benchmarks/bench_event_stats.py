@@ -0,0 +1,132 @@
+import time
+from datetime import datetime
+from typing import Dict
+
+import pytest
+from sqlalchemy import func, insert
+
+from .. import models, schemas
+from ..crud import events, guests, stats, users
+from ..database import SessionLocal
+
+menu = ["Wegetariańskie", "Mięsne", "Wegańskie"]
+
+
+def legacy_event_stats(db, event_uuid: str):
+    # Start every run with an empty identity map, like a fresh request.
+    db.expunge_all()
+    event_guests = guests.get_guests_from_event(db, event_uuid)
+
+    menu_answers: Dict[str, int] = {}
+
+    answer_yes = 0
+    answer_no = 0
+    without_answer = 0
+
+    for guest in event_guests:
+        if guest.answer is True:
+            answer_yes += 1
+        elif guest.answer is False:
+            answer_no += 1
+        else:
+            without_answer += 1
+
+    for guest in event_guests:
+        if guest.menu not in menu_answers:
+            menu_answers[guest.menu] = 0
+
+        menu_answers[guest.menu] += 1
+
+    return {
+        "sum_true": answer_yes,
+        "sum_false": answer_no,
+        "sum_unkown": without_answer,
+        "menu_answers": menu_answers,
+    }
+
+
+def aggregate_event_stats(db, event_uuid: str):
+    answers = (
+        db.query(models.Guest.answer, models.Guest.menu, func.count())
+        .join(models.Event, models.Guest.event_id == models.Event.event_id)
+        .filter(models.Event.uuid == event_uuid)
+        .group_by(models.Guest.answer, models.Guest.menu)
+        .all()
+    )
+
+    return events._summarize_answers(answers)
+
+
+def create_event_with_guests(db, guest_count: int):
+    users.reset_tables(db)
+
+    db_user = users.create_user(
+        db, schemas.UserCreate(email="bench_user", password="123"), "hashed"
+    )
+    db_event = events.create_event(
+        db,
+        schemas.EventCreate(
+            name="Wesele",
+            is_public=False,
+            start_time=datetime(2050, 6, 1, 16),
+            location="Kraków",
+            menu=";".join(menu),
+            decision_deadline=datetime(2050, 5, 1, 12),
+        ),
+        db_user.user_id,
+    )
+
+    db.execute(
+        insert(models.Guest),
+        [
+            {
+                "event_id": db_event.event_id,
+                "name": f"Guest {i}",
+                "surname": "Nowak",
+                "email": f"guest{i}@example.com",
+                "phone": "+48765456384",
+                "answer": (True, False, None)[i % 3],
+                "menu": menu[i % len(menu)] if i % 3 == 0 else None,
+            }
+            for i in range(guest_count)
+        ],
+    )
+    db.commit()
+
+    # The bulk insert bypasses crud.guests, so fill the counters it skipped.
+    stats.reconcile_event_stats(db)
+
+    return db_event.uuid
+
+
+def best_of(repeat, func, *args):
+    timings = []
+
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func(*args)
+        timings.append(time.perf_counter() - start)
+
+    return min(timings), result
+
+
+@pytest.mark.parametrize("guest_count", [10_000, 100_000])
+def test_event_stats(guest_count):
+    db = SessionLocal()
+    event_uuid = create_event_with_guests(db, guest_count)
+
+    legacy_time, legacy_stats = best_of(3, legacy_event_stats, db, event_uuid)
+    aggregate_time, aggregate_stats = best_of(3, aggregate_event_stats, db, event_uuid)
+    counter_time, counter_stats = best_of(3, events.get_event_stats, db, event_uuid)
+
+    assert aggregate_stats == legacy_stats
+    assert counter_stats == legacy_stats
+
+    print(
+        f"\n{guest_count:>7} guests  python loop {legacy_time * 1000:9.2f} ms"
+        f"  sql aggregate {aggregate_time * 1000:9.2f} ms"
+        f"  counters {counter_time * 1000:9.2f} ms"
+        f"  ({legacy_time / counter_time:.1f}x)"
+    )
+
+    db.close()
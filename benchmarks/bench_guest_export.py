@@ -0,0 +1,56 @@
+import json
+import time
+import tracemalloc
+
+import pytest
+
+from .. import guest_export, schemas
+from ..crud import events, guests
+from ..database import SessionLocal
+from .bench_event_stats import create_event_with_guests
+
+GUEST_COUNT = 100_000
+
+
+def legacy_json_export(event_id: int):
+    with SessionLocal() as db:
+        db_event = events.get_event_by_id(db, event_id)
+        db_guests = guests.get_guests_from_event(db, db_event.uuid)
+
+        yield json.dumps(
+            [schemas.Guest.model_validate(guest).model_dump() for guest in db_guests]
+        ).encode()
+
+
+def measure(chunks):
+    tracemalloc.start()
+    start = time.perf_counter()
+    size = sum(len(chunk) for chunk in chunks)
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return elapsed, peak, size
+
+
+@pytest.fixture(scope="module")
+def event_id():
+    with SessionLocal() as db:
+        event_uuid = create_event_with_guests(db, GUEST_COUNT)
+
+        return events.get_event(db, event_uuid).event_id
+
+
+@pytest.mark.parametrize("file_format", ["json", "csv", "xlsx"])
+def test_guest_export_memory(event_id, file_format):
+    if file_format == "json":
+        chunks = legacy_json_export(event_id)
+    else:
+        chunks = guest_export.export_guests(event_id, file_format, 1000)
+
+    elapsed, peak, size = measure(chunks)
+
+    print(
+        f"\n{file_format:<5} {GUEST_COUNT} guests  {elapsed:6.2f} s"
+        f"  peak {peak / 2**20:7.1f} MiB  output {size / 2**20:6.1f} MiB"
+    )
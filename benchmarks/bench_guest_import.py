@@ -0,0 +1,76 @@
+import json
+import time
+
+from fastapi.testclient import TestClient
+
+from ..main import create_app
+
+app = create_app()
+
+GUEST_COUNT = 3_000
+
+user = {"email": "bench_user", "password": "123"}
+
+event = {
+    "name": "Wesele",
+    "is_public": False,
+    "start_time": "2050-06-01T16:00:00",
+    "location": "Kraków",
+    "menu": "Mięsne;Wegetariańskie",
+    "decision_deadline": "2050-05-01T12:00:00",
+}
+
+
+def guest(i: int):
+    return {
+        "name": f"Guest {i}",
+        "surname": "Nowak",
+        "email": f"guest{i}@example.com",
+        "phone": "+48765456384",
+        "has_companion": i % 4 == 0,
+    }
+
+
+def create_event(client: TestClient):
+    client.post("/reset_tables")
+    client.post("/users", json=user)
+    token = client.post(
+        "/token", data={"username": user["email"], "password": user["password"]}
+    ).json()["access_token"]
+    headers = {"Authorization": f"Bearer {token}"}
+    event_uuid = client.post("/events", json=event, headers=headers).json()["uuid"]
+
+    return event_uuid, headers
+
+
+def report(name, elapsed):
+    print(f"\n{name:<16} {elapsed:7.2f} s  {GUEST_COUNT / elapsed:8.0f} guests/s")
+
+
+def test_one_request_per_guest():
+    client = TestClient(app)
+    event_uuid, headers = create_event(client)
+
+    start = time.perf_counter()
+    for i in range(GUEST_COUNT):
+        response = client.post(
+            "/guests", json={**guest(i), "event_uuid": event_uuid}, headers=headers
+        )
+        assert response.status_code == 200
+    report("POST /guests", time.perf_counter() - start)
+
+
+def test_ndjson_import():
+    client = TestClient(app)
+    event_uuid, headers = create_event(client)
+    body = "\n".join(json.dumps(guest(i)) for i in range(GUEST_COUNT)).encode()
+
+    start = time.perf_counter()
+    response = client.post(
+        f"/events/{event_uuid}/guests/import",
+        content=body,
+        headers={**headers, "Content-Type": "application/x-ndjson"},
+    )
+    report("NDJSON import", time.perf_counter() - start)
+
+    assert response.json() == {"imported": GUEST_COUNT, "errors": []}
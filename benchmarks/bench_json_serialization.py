@@ -0,0 +1,62 @@
+import asyncio
+import json
+
+from fastapi.responses import JSONResponse, ORJSONResponse
+from fastapi.routing import serialize_response
+from fastapi.utils import create_model_field
+
+from .. import fast_json, schemas
+from ..configuration import settings
+from ..crud import events, guests
+from ..database import SessionLocal
+from .bench_event_stats import best_of, create_event_with_guests
+
+GUEST_COUNT = 10_000
+RUNS = 5
+
+
+def default_response(db, event_id):
+    # What FastAPI does for response_model: validate the ORM objects, dump them
+    # to JSON-compatible data and encode that with the json module.
+    db.expunge_all()
+    db_guests = guests.get_guests_page(db, event_id, limit=GUEST_COUNT)
+    content = asyncio.run(
+        serialize_response(
+            field=create_model_field("response", list[schemas.Guest]),
+            response_content=db_guests,
+        )
+    )
+
+    return JSONResponse(content).body
+
+
+def fast_response(db, event_id):
+    db_guests = guests.get_guests_page(
+        db,
+        event_id,
+        limit=GUEST_COUNT,
+        fields=fast_json.fields(schemas.Guest, extra=["guest_id"]),
+    )
+
+    return ORJSONResponse(fast_json.to_dicts(db_guests, schemas.Guest)).body
+
+
+def test_guest_list_serialization(monkeypatch):
+    db = SessionLocal()
+    event_uuid = create_event_with_guests(db, GUEST_COUNT)
+    event_id = events.get_event(db, event_uuid).event_id
+
+    default_time, default_body = best_of(RUNS, default_response, db, event_id)
+
+    monkeypatch.setattr(settings, "fast_json", True)
+    fast_time, fast_body = best_of(RUNS, fast_response, db, event_id)
+
+    assert json.loads(fast_body) == json.loads(default_body)
+
+    print(
+        f"\n{GUEST_COUNT} guests  response_model + json {default_time * 1000:8.2f} ms"
+        f"  rows + orjson {fast_time * 1000:8.2f} ms"
+        f"  ({default_time / fast_time:.1f}x)"
+    )
+
+    db.close()
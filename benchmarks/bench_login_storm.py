@@ -0,0 +1,90 @@
+import asyncio
+import statistics
+import time
+
+import httpx
+
+from ..main import create_app, utils
+
+app = create_app()
+
+user = {"email": "bench_user", "password": "123"}
+
+LOGINS = 32
+GETS = 200
+
+
+class InlinePool:
+    async def run(self, func, *args):
+        return func(*args)
+
+
+def percentile(samples, p):
+    return statistics.quantiles(samples, n=100)[p - 1]
+
+
+async def get_latencies(client: httpx.AsyncClient):
+    latencies = []
+
+    for _ in range(GETS):
+        start = time.perf_counter()
+        response = await client.get("/events/public")
+        latencies.append(time.perf_counter() - start)
+
+        assert response.status_code == 200
+
+    return latencies
+
+
+async def login_storm(client: httpx.AsyncClient):
+    responses = await asyncio.gather(
+        *[
+            client.post(
+                "/token",
+                data={"username": user["email"], "password": user["password"]},
+            )
+            for _ in range(LOGINS)
+        ]
+    )
+
+    assert all(response.status_code == 200 for response in responses)
+
+
+async def measure(with_storm: bool):
+    transport = httpx.ASGITransport(app=app)
+
+    async with httpx.AsyncClient(
+        transport=transport, base_url="http://bench"
+    ) as client:
+        if not with_storm:
+            return await get_latencies(client)
+
+        storm = asyncio.create_task(login_storm(client))
+        await asyncio.sleep(0)
+        latencies = await get_latencies(client)
+        await storm
+
+        return latencies
+
+
+def report(name, latencies):
+    print(
+        f"{name:<24} p50={percentile(latencies, 50) * 1000:8.2f} ms"
+        f"  p99={percentile(latencies, 99) * 1000:8.2f} ms"
+    )
+
+
+def test_unrelated_get_latency_during_login_storm(monkeypatch):
+    async def setup():
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://b") as c:
+            await c.post("/reset_tables")
+            await c.post("/users", json=user)
+
+    asyncio.run(setup())
+
+    report("idle", asyncio.run(measure(with_storm=False)))
+    report("storm, worker pool", asyncio.run(measure(with_storm=True)))
+
+    monkeypatch.setattr(utils, "password_pool", InlinePool())
+    report("storm, inline bcrypt", asyncio.run(measure(with_storm=True)))
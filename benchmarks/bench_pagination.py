@@ -0,0 +1,43 @@
+import time
+
+from ..crud import guests
+from ..database import SessionLocal
+from .bench_event_stats import create_event_with_guests
+
+GUEST_COUNT = 200_000
+PAGE_SIZE = 100
+
+
+def timed(func, *args, **kwargs):
+    start = time.perf_counter()
+    result = func(*args, **kwargs)
+
+    return time.perf_counter() - start, result
+
+
+def test_deep_page_offset_vs_keyset():
+    db = SessionLocal()
+    create_event_with_guests(db, GUEST_COUNT)
+
+    for page in [0, 100, 1000, GUEST_COUNT // PAGE_SIZE - 1]:
+        offset_time, offset_page = timed(
+            guests.get_guests, db, skip=page * PAGE_SIZE, limit=PAGE_SIZE
+        )
+        db.expunge_all()
+
+        after = offset_page[0].guest_id - 1 if page else None
+        keyset_time, keyset_page = timed(
+            guests.get_guests, db, after=after, limit=PAGE_SIZE
+        )
+        db.expunge_all()
+
+        assert [guest.guest_id for guest in keyset_page] == [
+            guest.guest_id for guest in offset_page
+        ]
+
+        print(
+            f"\npage {page:>5}  offset {offset_time * 1000:8.2f} ms"
+            f"  keyset {keyset_time * 1000:8.2f} ms"
+        )
+
+    db.close()
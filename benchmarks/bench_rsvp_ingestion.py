@@ -0,0 +1,58 @@
+import asyncio
+import time
+
+import httpx
+import pytest
+from sqlalchemy import select
+
+from .. import models
+from ..configuration import settings
+from ..database import SessionLocal
+from ..main import create_app
+from .bench_event_stats import create_event_with_guests, menu
+
+app = create_app()
+
+GUEST_COUNT = 2_000
+CONCURRENCY = 200
+
+
+async def answer_all(guest_uuids):
+    semaphore = asyncio.Semaphore(CONCURRENCY)
+    transport = httpx.ASGITransport(app=app)
+
+    async with httpx.AsyncClient(
+        transport=transport, base_url="http://bench"
+    ) as client:
+
+        async def answer(i, guest_uuid):
+            async with semaphore:
+                response = await client.post(
+                    f"/guests/{guest_uuid}/answer",
+                    json={"answer": True, "menu": menu[i % len(menu)]},
+                )
+
+            assert response.status_code == 200
+
+        await asyncio.gather(
+            *[answer(i, guest_uuid) for i, guest_uuid in enumerate(guest_uuids)]
+        )
+
+
+@pytest.mark.parametrize("write_behind", [False, True])
+def test_rsvp_ingestion(monkeypatch, write_behind):
+    monkeypatch.setattr(settings, "rsvp_write_behind", write_behind)
+
+    db = SessionLocal()
+    create_event_with_guests(db, GUEST_COUNT)
+    guest_uuids = db.scalars(select(models.Guest.uuid)).all()
+    db.close()
+
+    start = time.perf_counter()
+    asyncio.run(answer_all(guest_uuids))
+    elapsed = time.perf_counter() - start
+
+    print(
+        f"\nwrite-behind {'on ' if write_behind else 'off'}"
+        f"  {GUEST_COUNT / elapsed:8.0f} RSVPs/s"
+    )
@@ -0,0 +1,125 @@
+import asyncio
+import os
+import socket
+import subprocess
+import sys
+import time
+
+import httpx
+import pytest
+
+from .. import main
+
+REQUESTS = 3_000
+CONCURRENCY = 64
+PACKAGE = __package__.rsplit(".", 1)[0]
+PACKAGE_PATH = os.path.dirname(main.__file__)
+
+event = {
+    "name": "Wesele",
+    "is_public": True,
+    "start_time": "2050-06-01T16:00:00",
+    "location": "Kraków",
+    "menu": "Wegetariańskie;Mięsne",
+    "decision_deadline": "2050-05-01T12:00:00",
+}
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def start_server(kind, port, env):
+    if kind == "dev":
+        command = [
+            sys.executable,
+            "-m",
+            "uvicorn",
+            f"{PACKAGE}.main:create_app",
+            "--factory",
+            "--reload",
+            "--port",
+            str(port),
+        ]
+    else:
+        command = [sys.executable, "-m", f"{PACKAGE}.server", "--port", str(port)]
+
+    process = subprocess.Popen(
+        command,
+        env=env,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        try:
+            httpx.get(f"http://127.0.0.1:{port}/events/public")
+            return process
+        except httpx.TransportError:
+            time.sleep(0.2)
+
+    process.terminate()
+    raise RuntimeError(f"{kind} server did not start")
+
+
+def create_event(base_url):
+    user = {"email": "bench_user", "password": "123"}
+    httpx.post(f"{base_url}/users", json=user)
+    token = httpx.post(
+        f"{base_url}/token",
+        data={"username": user["email"], "password": user["password"]},
+    ).json()["access_token"]
+
+    return httpx.post(
+        f"{base_url}/events",
+        json=event,
+        headers={"Authorization": f"Bearer {token}"},
+    ).json()["uuid"]
+
+
+async def run_load(base_url, event_uuid):
+    semaphore = asyncio.Semaphore(CONCURRENCY)
+    limits = httpx.Limits(max_connections=CONCURRENCY)
+
+    async with httpx.AsyncClient(base_url=base_url, limits=limits) as client:
+
+        async def read():
+            async with semaphore:
+                response = await client.get(f"/events/{event_uuid}")
+
+            assert response.status_code == 200
+
+        await asyncio.gather(*[read() for _ in range(REQUESTS)])
+
+
+@pytest.mark.parametrize("kind", ["dev", "production"])
+def test_server_throughput(tmp_path, kind):
+    env = {
+        **os.environ,
+        "PYTHONPATH": os.path.dirname(PACKAGE_PATH),
+        "SQLALCHEMY_DATABASE_URL": f"sqlite:///{tmp_path / 'bench.db'}",
+    }
+    subprocess.run(
+        [sys.executable, "-m", f"{PACKAGE}.commands", "bootstrap"],
+        env=env,
+        capture_output=True,
+        check=True,
+    )
+
+    port = free_port()
+    process = start_server(kind, port, env)
+    try:
+        base_url = f"http://127.0.0.1:{port}"
+        event_uuid = create_event(base_url)
+
+        start = time.perf_counter()
+        asyncio.run(run_load(base_url, event_uuid))
+        elapsed = time.perf_counter() - start
+    finally:
+        process.terminate()
+        process.wait()
+
+    print(f"\n{kind:<10} {REQUESTS / elapsed:8.0f} requests/s ({os.cpu_count()} CPUs)")
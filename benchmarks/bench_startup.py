@@ -0,0 +1,71 @@
+import os
+import subprocess
+import sys
+import time
+
+from .. import main
+
+RUNS = 5
+DEFERRED_IMPORTS = ["PIL.Image", "passlib.context", "openpyxl"]
+PACKAGE = __package__.rsplit(".", 1)[0]
+
+# Time from interpreter start to the first answered request; override on
+# slower machines.
+BUDGET = float(os.environ.get("STARTUP_BUDGET", "1.5"))
+
+FIRST_REQUEST = f"""
+from fastapi.testclient import TestClient
+from {PACKAGE}.main import create_app
+
+assert TestClient(create_app()).get("/events/public").status_code == 200
+"""
+
+
+def run(code, env, *options):
+    start = time.perf_counter()
+    result = subprocess.run(
+        [sys.executable, *options, "-c", code],
+        env=env,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+
+    return time.perf_counter() - start, result.stderr
+
+
+def import_times(stderr):
+    times = {}
+
+    for line in stderr.splitlines():
+        if line.startswith("import time:") and "|" in line:
+            _, cumulative, name = line.split("|")
+            if cumulative.strip().isdigit():
+                times[name.strip()] = int(cumulative) / 1000
+
+    return times
+
+
+def test_time_to_first_request(tmp_path):
+    env = {
+        **os.environ,
+        "PYTHONPATH": os.path.dirname(os.path.dirname(main.__file__)),
+        "SQLALCHEMY_DATABASE_URL": f"sqlite:///{tmp_path / 'startup.db'}",
+    }
+
+    first_request = min(run(FIRST_REQUEST, env)[0] for _ in range(RUNS))
+    _, stderr = run(f"import {PACKAGE}.main", env, "-X", "importtime")
+    main_import = import_times(stderr)[f"{PACKAGE}.main"]
+
+    # What importing the deferred modules eagerly would add to every start.
+    _, stderr = run(f"import {', '.join(DEFERRED_IMPORTS)}", env, "-X", "importtime")
+    deferred = import_times(stderr)
+    deferred_import = sum(deferred[name] for name in DEFERRED_IMPORTS)
+
+    print(
+        f"\nfirst request {first_request * 1000:7.1f} ms"
+        f"  import main {main_import:7.1f} ms"
+        f"  deferred imports {deferred_import:7.1f} ms"
+    )
+
+    assert first_request < BUDGET
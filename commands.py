@@ -0,0 +1,49 @@
+import argparse
+
+from . import migrations
+from .crud import stats
+from .database import SessionLocal, engine
+
+
+def bootstrap(args):
+    migrations.upgrade(engine)
+    print("Database schema is up to date")
+
+
+def reconcile_stats(args):
+    with SessionLocal() as db:
+        drift = stats.reconcile_event_stats(db, fix=not args.dry_run)
+
+    for row in drift:
+        print(
+            f"event {row['event_id']}: answer={row['answer']} menu={row['menu']!r}"
+            f" expected {row['expected']}, counted {row['counted']}"
+        )
+
+    status = "found" if args.dry_run else "fixed"
+    print(f"{len(drift)} drifted counters {status}")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    subparsers = parser.add_subparsers(required=True)
+
+    bootstrap_parser = subparsers.add_parser(
+        "bootstrap",
+        help="Create or upgrade the database schema before starting the server",
+    )
+    bootstrap_parser.set_defaults(func=bootstrap)
+
+    reconcile_parser = subparsers.add_parser(
+        "reconcile-stats",
+        help="Recompute per-event RSVP counters from the guests table",
+    )
+    reconcile_parser.add_argument("--dry-run", action="store_true")
+    reconcile_parser.set_defaults(func=reconcile_stats)
+
+    args = parser.parse_args()
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -4,8 +4,47 @@ from pydantic_settings import BaseSettings, SettingsConfigDict
 class Settings(BaseSettings):
     model_config = SettingsConfigDict(env_file=".env")
     sqlalchemy_database_url: str = "sqlite:///./sql_app.db"
+    async_database: bool = False
+    replica_database_url: str | None = None
+    replica_sticky_seconds: int = 5
+    database_tuning: bool = True
+    sqlite_journal_mode: str = "WAL"
+    sqlite_synchronous: str = "NORMAL"
+    sqlite_busy_timeout: int = 30_000
+    sqlite_cache_size: int = -64_000
+    sqlite_mmap_size: int = 256 * 1024 * 1024
+    database_pool_size: int = 10
+    database_max_overflow: int = 20
+    database_pool_pre_ping: bool = True
+    database_pool_recycle: int = 1800
+    postgres_statement_timeout: int = 30_000
     secret_key: str
+    auto_migrate: bool = True
+    web_concurrency: int | None = None
     algorithm: str = "HS256"
+    principal_cache_size: int = 1024
+    principal_cache_ttl: int = 60
+    password_hash_workers: int = 4
+    deletion_batch_size: int = 50
+    deletion_job_timeout: int = 300
+    guest_import_batch_size: int = 1000
+    guest_export_chunk_size: int = 1000
+    background_path: str = "./backgrounds"
+    storage_backend: str = "local"
+    s3_bucket: str = ""
+    s3_prefix: str = "backgrounds/"
+    s3_endpoint_url: str | None = None
+    image_workers: int = 2
+    max_background_size: int = 10 * 1024 * 1024
+    max_background_pixels: int = 40_000_000
+    max_decoded_background_pixels: int = 16_000_000
+    upload_path: str = "./uploads"
+    upload_ttl: int = 24 * 60 * 60
+    signed_url_ttl: int = 3600
+    rsvp_write_behind: bool = False
+    rsvp_batch_size: int = 500
+    rsvp_flush_interval: float = 0.01
+    fast_json: bool = False
 
 
 settings = Settings()
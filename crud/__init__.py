@@ -1,3 +1,3 @@
-from . import events, guests, users
+from . import events, guests, stats, users
 
-__all__ = ["events", "guests", "users"]
+__all__ = ["events", "guests", "stats", "users"]
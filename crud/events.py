@@ -1,9 +1,11 @@
+from datetime import datetime
 from typing import Dict
 
+from sqlalchemy import delete, func, select, tuple_, update
 from sqlalchemy.orm import Session
 
 from .. import models, schemas
-from . import guests
+from . import stats
 
 
 def get_event(db: Session, event_uuid: str):
@@ -18,7 +20,10 @@ def get_event_by_organizer(db: Session, user_id: int):
     return db.query(models.Event).filter(models.Event.organizer_id == user_id).all()
 
 
-def get_events(db: Session):
+def get_events(db: Session, fields: list[str] | None = None):
+    if fields:
+        return db.query(*(getattr(models.Event, field) for field in fields)).all()
+
     return db.query(models.Event).all()
 
 
@@ -26,6 +31,44 @@ def get_public_events(db: Session):
     return db.query(models.Event).filter(models.Event.is_public == "1").all()
 
 
+def get_events_page(
+    db: Session,
+    organizer_id: int | None = None,
+    is_public: bool | None = None,
+    start_after: datetime | None = None,
+    start_before: datetime | None = None,
+    location: str | None = None,
+    after: tuple[datetime, int] | None = None,
+    limit: int = 100,
+    fields: list[str] | None = None,
+):
+    if fields:
+        query = db.query(*(getattr(models.Event, field) for field in fields))
+    else:
+        query = db.query(models.Event)
+
+    if organizer_id is not None:
+        query = query.filter(models.Event.organizer_id == organizer_id)
+    if is_public is not None:
+        query = query.filter(models.Event.is_public == is_public)
+    if start_after is not None:
+        query = query.filter(models.Event.start_time >= start_after)
+    if start_before is not None:
+        query = query.filter(models.Event.start_time < start_before)
+    if location is not None:
+        query = query.filter(models.Event.location == location)
+    if after is not None:
+        query = query.filter(
+            tuple_(models.Event.start_time, models.Event.event_id) > tuple_(*after)
+        )
+
+    return (
+        query.order_by(models.Event.start_time, models.Event.event_id)
+        .limit(limit)
+        .all()
+    )
+
+
 def create_event(db: Session, event: schemas.EventCreate, user_id: int):
     db_event = models.Event(**event.model_dump())
     db_event.organizer_id = user_id
@@ -36,27 +79,25 @@ def create_event(db: Session, event: schemas.EventCreate, user_id: int):
 
 
 def get_event_stats(db: Session, event_uuid: str):
-    event_guests = guests.get_guests_from_event(db, event_uuid)
+    return _summarize_answers(stats.get_answer_counts(db, event_uuid))
 
+
+def _summarize_answers(answers):
     menu_answers: Dict[str, int] = {}
 
     answer_yes = 0
     answer_no = 0
     without_answer = 0
 
-    for guest in event_guests:
-        if guest.answer is True:
-            answer_yes += 1
-        elif guest.answer is False:
-            answer_no += 1
+    for answer, menu, count in answers:
+        if answer is True:
+            answer_yes += count
+        elif answer is False:
+            answer_no += count
         else:
-            without_answer += 1
-
-    for guest in event_guests:
-        if guest.menu not in menu_answers:
-            menu_answers[guest.menu] = 0
+            without_answer += count
 
-        menu_answers[guest.menu] += 1
+        menu_answers[menu] = menu_answers.get(menu, 0) + count
 
     return {
         "sum_true": answer_yes,
@@ -66,15 +107,28 @@ def get_event_stats(db: Session, event_uuid: str):
     }
 
 
-def delete_event(db: Session, event_uuid: str):
-    db_event = db.query(models.Event).filter(models.Event.uuid == event_uuid).first()
-
-    db.delete(db_event)
+def delete_event(db: Session, db_event):
+    delete_events(db, [db_event.event_id])
+    db.expunge(db_event)
     db.commit()
 
     return db_event
 
 
+def delete_events(db: Session, event_ids: list[int]):
+    stats.delete_answer_counts(db, event_ids)
+    db.execute(
+        delete(models.Guest)
+        .where(models.Guest.event_id.in_(event_ids))
+        .execution_options(synchronize_session=False)
+    )
+    db.execute(
+        delete(models.Event)
+        .where(models.Event.event_id.in_(event_ids))
+        .execution_options(synchronize_session=False)
+    )
+
+
 def modify_event(
     db: Session,
     event_uuid: str,
@@ -101,21 +155,72 @@ def add_background(
     db: Session,
     event_uuid: str,
     ext: str,
+    background_hash: str,
+    placeholder: str | None = None,
 ):
+    lock_background(db, background_hash)
     db_event = db.query(models.Event).filter(models.Event.uuid == event_uuid).first()
     db_event.background_photo = ext
+    db_event.background_hash = background_hash
+    db_event.background_placeholder = placeholder
     db.commit()
     db.refresh(db_event)
 
     return db_event
 
 
+def lock_background(db: Session, background_hash: str):
+    # Held until commit, so adding and releasing a reference to the same blob
+    # never interleave.
+    if db.get_bind().dialect.name == "postgresql":
+        db.execute(select(func.pg_advisory_xact_lock(func.hashtext(background_hash))))
+    else:
+        # SQLite takes its single write lock on the first write statement.
+        db.execute(
+            update(models.Event)
+            .where(models.Event.background_hash == background_hash)
+            .values(background_hash=models.Event.background_hash)
+            .execution_options(synchronize_session=False)
+        )
+
+
+def set_background_placeholder(db: Session, background_hash: str, placeholder: str):
+    db.execute(
+        update(models.Event)
+        .where(models.Event.background_hash == background_hash)
+        .values(background_placeholder=placeholder)
+    )
+    db.commit()
+
+
+def get_event_backgrounds(db: Session, event_ids: list[int]):
+    return (
+        db.query(models.Event.background_hash, models.Event.background_photo)
+        .filter(
+            models.Event.event_id.in_(event_ids),
+            models.Event.background_hash.is_not(None),
+        )
+        .distinct()
+        .all()
+    )
+
+
+def count_background_references(db: Session, background_hash: str):
+    return (
+        db.query(models.Event)
+        .filter(models.Event.background_hash == background_hash)
+        .count()
+    )
+
+
 def delete_background(
     db: Session,
     event_uuid: str,
 ):
     db_event = db.query(models.Event).filter(models.Event.uuid == event_uuid).first()
     db_event.background_photo = None
+    db_event.background_hash = None
+    db_event.background_placeholder = None
     db.commit()
     db.refresh(db_event)
 
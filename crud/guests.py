@@ -1,10 +1,17 @@
-from sqlalchemy.orm import Session
+from collections import Counter
+
+from sqlalchemy import delete, exists, insert, select
+from sqlalchemy.orm import Session, aliased, joinedload
 
 from .. import models, schemas
+from . import stats
 
 
 def delete_guest_from_event(db: Session, guest_uuid: str):
     event_guest = get_guest(db, guest_uuid)
+    stats.adjust_answer_count(
+        db, event_guest.event_id, event_guest.answer, event_guest.menu, -1
+    )
     db.delete(event_guest)
     db.commit()
 
@@ -12,11 +19,18 @@ def delete_guest_from_event(db: Session, guest_uuid: str):
 
 
 def delete_participants_from_event(db: Session, event_uuid: str):
-    event_guests = get_guests_from_event(db, event_uuid)
-
-    for guest in event_guests:
-        db.delete(guest)
+    event_id = (
+        select(models.Event.event_id)
+        .where(models.Event.uuid == event_uuid)
+        .scalar_subquery()
+    )
 
+    stats.delete_answer_counts(db, [event_id])
+    db.execute(
+        delete(models.Guest)
+        .where(models.Guest.event_id == event_id)
+        .execution_options(synchronize_session=False)
+    )
     db.commit()
 
 
@@ -28,8 +42,48 @@ def get_guest_by_id(db: Session, guest_id: int):
     return db.query(models.Guest).filter(models.Guest.guest_id == guest_id).first()
 
 
-def get_guests(db: Session, skip: int = 0, limit: int = 100):
-    return db.query(models.Guest).offset(skip).limit(limit).all()
+ANSWER_FILTERS = {"yes": True, "no": False, "unknown": None}
+
+
+def get_guests(
+    db: Session,
+    skip: int = 0,
+    limit: int = 100,
+    after: int | None = None,
+    fields: list[str] | None = None,
+):
+    if fields:
+        query = db.query(*(getattr(models.Guest, field) for field in fields))
+    else:
+        query = db.query(models.Guest)
+
+    if after is not None:
+        query = query.filter(models.Guest.guest_id > after)
+
+    return query.order_by(models.Guest.guest_id).offset(skip).limit(limit).all()
+
+
+def get_guests_page(
+    db: Session,
+    event_id: int,
+    answer: str | None = None,
+    after: int | None = None,
+    limit: int = 100,
+    fields: list[str] | None = None,
+):
+    if fields:
+        query = db.query(*(getattr(models.Guest, field) for field in fields))
+    else:
+        query = db.query(models.Guest)
+
+    query = query.filter(models.Guest.event_id == event_id)
+
+    if answer is not None:
+        query = query.filter(models.Guest.answer.is_(ANSWER_FILTERS[answer]))
+    if after is not None:
+        query = query.filter(models.Guest.guest_id > after)
+
+    return query.order_by(models.Guest.guest_id).limit(limit).all()
 
 
 def get_guests_from_event(db: Session, event_uuid: str):
@@ -39,6 +93,18 @@ def get_guests_from_event(db: Session, event_uuid: str):
     )
 
 
+EXPORT_COLUMNS = ["name", "surname", "email", "phone", "answer", "menu", "comments"]
+
+
+def get_guest_export_rows(db: Session, event_id: int, chunk_size: int = 1000):
+    return db.execute(
+        select(*(getattr(models.Guest, column) for column in EXPORT_COLUMNS))
+        .where(models.Guest.event_id == event_id)
+        .order_by(models.Guest.guest_id)
+        .execution_options(yield_per=chunk_size)
+    )
+
+
 def create_event_guest(
     db: Session,
     guest: schemas.GuestCreate,
@@ -56,20 +122,55 @@ def create_event_guest(
 
     db_guest = models.Guest(**g)
     db.add(db_guest)
+    stats.adjust_answer_count(db, event_id, None, None, 1)
     db.commit()
     db.refresh(db_guest)
     return db_guest
 
 
+def create_event_guests(
+    db: Session, event_guests: list[schemas.GuestCreate], event_id: int
+):
+    companions = [
+        {"event_id": event_id, "name": "", "surname": "", "email": "", "phone": ""}
+        for guest in event_guests
+        if guest.has_companion
+    ]
+    companion_ids = iter(
+        db.scalars(
+            insert(models.Guest).returning(
+                models.Guest.guest_id, sort_by_parameter_order=True
+            ),
+            companions,
+        ).all()
+        if companions
+        else []
+    )
+
+    db.execute(
+        insert(models.Guest),
+        [
+            {
+                **guest.model_dump(exclude={"event_uuid", "has_companion"}),
+                "event_id": event_id,
+                "companion_id": next(companion_ids) if guest.has_companion else None,
+            }
+            for guest in event_guests
+        ],
+    )
+    stats.adjust_answer_count(
+        db, event_id, None, None, len(event_guests) + len(companions)
+    )
+    db.commit()
+
+
 def update_guest_answear(
     db: Session,
     guest_uuid: str,
     guest_answer: schemas.GuestAnswear,
 ):
     db_guest = db.query(models.Guest).filter(models.Guest.uuid == guest_uuid).first()
-    db_guest.answer = guest_answer.answer
-    db_guest.menu = guest_answer.menu
-    db_guest.comments = guest_answer.comments
+    apply_guest_answer(db, db_guest, guest_answer)
 
     db.commit()
     db.refresh(db_guest)
@@ -83,21 +184,107 @@ def update_companion_answer(
     companion_answer: schemas.CompanionAnswear,
 ):
     db_companion_guest = get_guest(db, companion_uuid)
+    apply_companion_answer(db, db_companion_guest, companion_answer)
+
+    db.commit()
+    db.refresh(db_companion_guest)
+
+    return db_companion_guest
+
+
+def apply_guest_answer(
+    db: Session,
+    db_guest,
+    guest_answer: schemas.GuestAnswear,
+    deltas: Counter | None = None,
+):
+    stats.move_answer_count(
+        db, db_guest, guest_answer.answer, guest_answer.menu, deltas
+    )
+    db_guest.answer = guest_answer.answer
+    db_guest.menu = guest_answer.menu
+    db_guest.comments = guest_answer.comments
 
+
+def apply_companion_answer(
+    db: Session,
+    db_companion_guest,
+    companion_answer: schemas.CompanionAnswear,
+    deltas: Counter | None = None,
+):
     if companion_answer.name:
         db_companion_guest.name = companion_answer.name
 
     if companion_answer.surname:
         db_companion_guest.surname = companion_answer.surname
 
-    db_companion_guest.answer = companion_answer.answer
-    db_companion_guest.menu = companion_answer.menu
-    db_companion_guest.comments = companion_answer.comments
+    apply_guest_answer(db, db_companion_guest, companion_answer, deltas)
 
-    db.commit()
-    db.refresh(db_companion_guest)
 
-    return db_companion_guest
+def answer_invitation(
+    db: Session,
+    db_guest,
+    guest_answer: schemas.GuestAnswear,
+    deltas: Counter | None = None,
+):
+    if db_guest.companion is not None and db_guest.answer is False:
+        companion_answer = schemas.GuestAnswear(answer=False, menu="", comments="")
+        apply_guest_answer(db, db_guest.companion, companion_answer, deltas)
+
+    apply_guest_answer(db, db_guest, guest_answer, deltas)
+
+
+def apply_queued_answers(db: Session, answers: list):
+    db_guests = {
+        db_guest.uuid: db_guest
+        for db_guest in db.query(models.Guest)
+        .options(joinedload(models.Guest.companion))
+        .filter(models.Guest.uuid.in_({guest_uuid for guest_uuid, _ in answers}))
+    }
+    deltas = Counter()
+
+    for guest_uuid, answer in answers:
+        db_guest = db_guests.get(guest_uuid)
+
+        if db_guest is None:
+            continue
+
+        if isinstance(answer, schemas.CompanionAnswear):
+            apply_companion_answer(db, db_guest, answer, deltas)
+        else:
+            answer_invitation(db, db_guest, answer, deltas)
+
+    stats.apply_answer_deltas(db, deltas)
+
+    return [db_guests.get(guest_uuid) for guest_uuid, _ in answers]
+
+
+def get_guest_for_answer(db: Session, guest_uuid: str):
+    primary_guest = aliased(models.Guest)
+    is_companion = (
+        exists()
+        .where(primary_guest.companion_id == models.Guest.guest_id)
+        .label("is_companion")
+    )
+
+    return (
+        db.query(models.Guest, is_companion)
+        .options(joinedload(models.Guest.event), joinedload(models.Guest.companion))
+        .filter(models.Guest.uuid == guest_uuid)
+        .first()
+    )
+
+
+def get_companion_for_answer(db: Session, companion_uuid: str):
+    primary_guest = aliased(models.Guest)
+
+    return (
+        db.query(models.Guest, primary_guest)
+        .outerjoin(primary_guest, primary_guest.companion_id == models.Guest.guest_id)
+        .options(joinedload(models.Guest.event))
+        .filter(models.Guest.uuid == companion_uuid)
+        .first()
+    )
 
 
 def get_primary_guest(db: Session, guest_id: int):
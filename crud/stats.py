@@ -0,0 +1,165 @@
+from collections import Counter
+
+from sqlalchemy import delete, func, insert
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session
+
+from .. import models
+
+
+def get_answer_counts(db: Session, event_uuid: str):
+    return (
+        db.query(
+            models.EventAnswerCount.answer,
+            models.EventAnswerCount.menu,
+            models.EventAnswerCount.count,
+        )
+        .join(models.Event, models.EventAnswerCount.event_id == models.Event.event_id)
+        .filter(models.Event.uuid == event_uuid, models.EventAnswerCount.count != 0)
+        .all()
+    )
+
+
+def adjust_answer_count(
+    db: Session, event_id: int, answer: bool | None, menu: str | None, delta: int
+):
+    dialect = postgresql if db.get_bind().dialect.name == "postgresql" else sqlite
+    statement = dialect.insert(models.EventAnswerCount).values(
+        event_id=event_id, answer=answer, menu=menu, count=delta
+    )
+
+    # ON CONFLICT names the unique index by its expressions, so concurrent
+    # first answers for a key all land on the one row. Postgres only takes
+    # bare columns and function calls there, so `menu IS NULL` is grouped.
+    (key,) = [
+        index for index in models.EventAnswerCount.__table__.indexes if index.unique
+    ]
+    db.execute(
+        statement.on_conflict_do_update(
+            index_elements=[expression.self_group() for expression in key.expressions],
+            set_={"count": models.EventAnswerCount.count + statement.excluded.count},
+        )
+    )
+
+
+def move_answer_count(
+    db: Session,
+    db_guest,
+    answer: bool,
+    menu: str | None,
+    deltas: Counter | None = None,
+):
+    if (db_guest.answer, db_guest.menu) == (answer, menu):
+        return
+
+    pending = Counter() if deltas is None else deltas
+    pending[(db_guest.event_id, db_guest.answer, db_guest.menu)] -= 1
+    pending[(db_guest.event_id, answer, menu)] += 1
+
+    if deltas is None:
+        apply_answer_deltas(db, pending)
+
+
+def apply_answer_deltas(db: Session, deltas: Counter):
+    for (event_id, answer, menu), delta in deltas.items():
+        if delta:
+            adjust_answer_count(db, event_id, answer, menu, delta)
+
+
+def merge_duplicate_answer_counts(db: Session):
+    key = (
+        models.EventAnswerCount.event_id,
+        models.EventAnswerCount.answer,
+        models.EventAnswerCount.menu,
+    )
+    duplicates = (
+        db.query(*key, func.sum(models.EventAnswerCount.count))
+        .group_by(*key)
+        .having(func.count() > 1)
+        .all()
+    )
+
+    for event_id, answer, menu, count in duplicates:
+        db.execute(
+            delete(models.EventAnswerCount).where(
+                models.EventAnswerCount.event_id == event_id,
+                models.EventAnswerCount.answer.is_not_distinct_from(answer),
+                models.EventAnswerCount.menu.is_not_distinct_from(menu),
+            )
+        )
+        db.execute(
+            insert(models.EventAnswerCount).values(
+                event_id=event_id, answer=answer, menu=menu, count=count
+            )
+        )
+
+    db.commit()
+
+
+def delete_answer_counts(db: Session, event_ids: list[int]):
+    db.execute(
+        delete(models.EventAnswerCount)
+        .where(models.EventAnswerCount.event_id.in_(event_ids))
+        .execution_options(synchronize_session=False)
+    )
+
+
+def reconcile_event_stats(db: Session, fix: bool = True):
+    expected = {
+        (event_id, answer, menu): count
+        for event_id, answer, menu, count in db.query(
+            models.Guest.event_id,
+            models.Guest.answer,
+            models.Guest.menu,
+            func.count(),
+        ).group_by(models.Guest.event_id, models.Guest.answer, models.Guest.menu)
+    }
+
+    counted = {}
+    for event_id, answer, menu, count in db.query(
+        models.EventAnswerCount.event_id,
+        models.EventAnswerCount.answer,
+        models.EventAnswerCount.menu,
+        func.sum(models.EventAnswerCount.count),
+    ).group_by(
+        models.EventAnswerCount.event_id,
+        models.EventAnswerCount.answer,
+        models.EventAnswerCount.menu,
+    ):
+        if count:
+            counted[(event_id, answer, menu)] = count
+
+    drift = [
+        {
+            "event_id": key[0],
+            "answer": key[1],
+            "menu": key[2],
+            "expected": expected.get(key, 0),
+            "counted": counted.get(key, 0),
+        }
+        for key in sorted(
+            expected.keys() | counted.keys(),
+            key=lambda key: (key[0], str(key[1]), str(key[2])),
+        )
+        if expected.get(key, 0) != counted.get(key, 0)
+    ]
+
+    if fix and drift:
+        drifted_events = {row["event_id"] for row in drift}
+
+        db.execute(
+            delete(models.EventAnswerCount).where(
+                models.EventAnswerCount.event_id.in_(drifted_events)
+            )
+        )
+        answer_counts = [
+            {"event_id": event_id, "answer": answer, "menu": menu, "count": count}
+            for (event_id, answer, menu), count in expected.items()
+            if event_id in drifted_events
+        ]
+        if answer_counts:
+            db.execute(insert(models.EventAnswerCount), answer_counts)
+
+        db.commit()
+
+    return drift
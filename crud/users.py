@@ -1,7 +1,12 @@
+from datetime import timedelta
+
+from sqlalchemy import and_, delete, func, or_, select, update
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import Session
 
 from .. import models, schemas, utils
 from ..database import engine
+from . import events
 
 
 def get_user(db: Session, user_id: int):
@@ -16,12 +21,24 @@ def get_user_by_email(db: Session, email: str):
     return db.query(models.User).filter(models.User.email == email).first()
 
 
-def get_users(db: Session):
+def get_principal(db: Session, email: str):
+    # Never from a replica: a lagging one could cache a revoked user again.
+    return (
+        db.query(models.User)
+        .filter(models.User.email == email)
+        .execution_options(primary=True)
+        .first()
+    )
+
+
+def get_users(db: Session, fields: list[str] | None = None):
+    if fields:
+        return db.query(*(getattr(models.User, field) for field in fields)).all()
+
     return db.query(models.User).all()
 
 
-def create_user(db: Session, user: schemas.UserCreate):
-    hashed_password = utils.get_password_hash(user.password)
+def create_user(db: Session, user: schemas.UserCreate, hashed_password: str):
     db_user = models.User(email=user.email, hashed_password=hashed_password)
     db.add(db_user)
     db.commit()
@@ -31,17 +48,162 @@ def create_user(db: Session, user: schemas.UserCreate):
 
 def delete_user(db: Session, user_id: int):
     db_user = get_user(db, user_id)
+    if db_user is None:
+        return None
+
+    db.execute(
+        delete(models.ForgotPassowordToken).where(
+            models.ForgotPassowordToken.user_id == user_id
+        )
+    )
     db.delete(db_user)
     db.commit()
+    # After the commit, so a concurrent request can't cache the old row again.
+    utils.invalidate_principal(db_user)
 
     return db_user
 
 
+def create_deletion_job(db: Session, user_id: int):
+    total_events = (
+        db.query(func.count(models.Event.event_id))
+        .filter(models.Event.organizer_id == user_id)
+        .scalar()
+    )
+
+    db_job = models.UserDeletionJob(user_id=user_id, total_events=total_events)
+    db.add(db_job)
+
+    try:
+        db.commit()
+    except IntegrityError:
+        # A concurrent request created the user's active job first.
+        db.rollback()
+        return get_active_deletion_job(db, user_id)
+
+    db.refresh(db_job)
+
+    return db_job
+
+
+def get_deletion_job(db: Session, job_id: str):
+    return (
+        db.query(models.UserDeletionJob)
+        .filter(models.UserDeletionJob.job_id == job_id)
+        .first()
+    )
+
+
+def get_active_deletion_job(db: Session, user_id: int):
+    return (
+        db.query(models.UserDeletionJob)
+        .filter(
+            models.UserDeletionJob.user_id == user_id,
+            models.UserDeletionJob.status.in_(["pending", "running"]),
+        )
+        .first()
+    )
+
+
+def claim_deletion_job(db: Session, job_id: str, stale_after: int):
+    # A running job whose worker stopped reporting progress was abandoned,
+    # e.g. by a restart, and can be taken over.
+    stale = utils.utc_now() - timedelta(seconds=stale_after)
+    result = db.execute(
+        update(models.UserDeletionJob)
+        .where(
+            models.UserDeletionJob.job_id == job_id,
+            or_(
+                models.UserDeletionJob.status == "pending",
+                and_(
+                    models.UserDeletionJob.status == "running",
+                    or_(
+                        models.UserDeletionJob.updated_at.is_(None),
+                        models.UserDeletionJob.updated_at < stale,
+                    ),
+                ),
+            ),
+        )
+        .values(status="running", updated_at=utils.utc_now())
+        .execution_options(synchronize_session=False)
+    )
+    db.commit()
+
+    return result.rowcount == 1
+
+
+def run_deletion_job(
+    db: Session,
+    job_id: str,
+    batch_size: int,
+    release_background=None,
+    stale_after: int = 300,
+):
+    if not claim_deletion_job(db, job_id, stale_after):
+        return get_deletion_job(db, job_id)
+
+    db_job = get_deletion_job(db, job_id)
+
+    try:
+        while True:
+            event_ids = db.scalars(
+                select(models.Event.event_id)
+                .filter(models.Event.organizer_id == db_job.user_id)
+                .limit(batch_size)
+            ).all()
+
+            if not event_ids:
+                break
+
+            backgrounds = events.get_event_backgrounds(db, event_ids)
+            events.delete_events(db, event_ids)
+            db_job.deleted_events += len(event_ids)
+            db_job.total_events = max(db_job.total_events, db_job.deleted_events)
+            db_job.updated_at = utils.utc_now()
+            db.commit()
+
+            # Only after the commit, so the refcount no longer sees this batch.
+            if release_background is not None:
+                for background_hash, file_extension in backgrounds:
+                    release_background(db, background_hash, file_extension)
+
+        delete_user(db, db_job.user_id)
+    except Exception as e:
+        db.rollback()
+        db_job.status = "failed"
+        db_job.error = str(e)
+    else:
+        db_job.status = "done"
+
+    db_job.updated_at = utils.utc_now()
+    db.commit()
+
+    return db_job
+
+
+def supersede_duplicate_deletion_jobs(db: Session):
+    # Older versions could start several jobs for one user; keep one active.
+    active = models.UserDeletionJob.status.in_(["pending", "running"])
+    kept = (
+        select(func.min(models.UserDeletionJob.job_id))
+        .where(active)
+        .group_by(models.UserDeletionJob.user_id)
+    )
+    db.execute(
+        update(models.UserDeletionJob)
+        .where(active, models.UserDeletionJob.job_id.not_in(kept))
+        .values(status="failed", error="Superseded by another deletion job")
+        .execution_options(synchronize_session=False)
+    )
+    db.commit()
+
+
 def change_user_role(db: Session, role: str, email: str):
     db_user = get_user_by_email(db, email)
     db_user.role = role
     db.commit()
     db.refresh(db_user)
+    utils.invalidate_principal(db_user)
 
     return db_user
 
@@ -53,16 +215,17 @@ def change_role_by_user_uuid(
     db_user.role = user_change_role.role
     db.commit()
     db.refresh(db_user)
+    utils.invalidate_principal(db_user)
 
     return db_user
 
 
-def change_password(db: Session, new_password: str, user_id: int):
+def change_password(db: Session, hashed_password: str, user_id: int):
     db_user = db.query(models.User).filter(models.User.user_id == user_id).first()
-    new_password_hashed = utils.get_password_hash(new_password)
-    db_user.hashed_password = new_password_hashed
+    db_user.hashed_password = hashed_password
     db.commit()
     db.refresh(db_user)
+    utils.invalidate_principal(db_user)
 
     return db_user
 
@@ -85,11 +248,19 @@ def get_reset_password_token(db: Session, token: str):
     )
 
 
-def use_reset_password_token(db: Session, db_token):
-    db.delete(db_token)
-    db.commit()
+def use_reset_password_token(db: Session, token: str):
+    # Only one of several concurrent requests deletes the row; the caller
+    # commits this together with the new password.
+    result = db.execute(
+        delete(models.ForgotPassowordToken)
+        .where(models.ForgotPassowordToken.token == token)
+        .execution_options(synchronize_session=False)
+    )
+
+    return result.rowcount == 1
 
 
 def reset_tables(db: Session):
     models.Base.metadata.drop_all(bind=engine)
     models.Base.metadata.create_all(bind=engine)
+    utils.principal_cache.clear()
@@ -1,15 +1,127 @@
-from sqlalchemy import create_engine
-from sqlalchemy.orm import declarative_base, sessionmaker
+from sqlalchemy import create_engine, event, make_url
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlalchemy.orm import Session, declarative_base, sessionmaker
+from sqlalchemy.sql.dml import UpdateBase
 
 from .configuration import settings
 
-connect_args = {}
+ASYNC_DRIVERS = {"sqlite": "sqlite+aiosqlite", "postgresql": "postgresql+asyncpg"}
 
-if settings.sqlalchemy_database_url.startswith("sqlite:"):
-    connect_args["check_same_thread"] = False
 
-engine = create_engine(settings.sqlalchemy_database_url, connect_args=connect_args)
+def sqlite_pragmas():
+    if not settings.database_tuning:
+        return {"foreign_keys": "ON"}
 
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+    # WAL lets readers run alongside the single writer, and NORMAL only syncs
+    # at checkpoints, which is still safe against corruption in WAL mode.
+    return {
+        "foreign_keys": "ON",
+        "journal_mode": settings.sqlite_journal_mode,
+        "synchronous": settings.sqlite_synchronous,
+        "busy_timeout": settings.sqlite_busy_timeout,
+        "cache_size": settings.sqlite_cache_size,
+        "mmap_size": settings.sqlite_mmap_size,
+    }
+
+
+def set_sqlite_pragmas(dbapi_connection, connection_record):
+    cursor = dbapi_connection.cursor()
+    for name, value in sqlite_pragmas().items():
+        cursor.execute(f"PRAGMA {name}={value}")
+    cursor.close()
+
+
+def engine_options(url):
+    url = make_url(url)
+    options = {}
+
+    if url.get_backend_name() == "sqlite":
+        if url.get_driver_name() == "pysqlite":
+            options["connect_args"] = {"check_same_thread": False}
+
+        return options
+
+    if url.get_backend_name() == "postgresql" and settings.database_tuning:
+        options.update(
+            pool_size=settings.database_pool_size,
+            max_overflow=settings.database_max_overflow,
+            pool_pre_ping=settings.database_pool_pre_ping,
+            pool_recycle=settings.database_pool_recycle,
+        )
+
+        timeout = str(settings.postgres_statement_timeout)
+        if url.get_driver_name() == "asyncpg":
+            options["connect_args"] = {
+                "server_settings": {"statement_timeout": timeout}
+            }
+        else:
+            options["connect_args"] = {"options": f"-c statement_timeout={timeout}"}
+
+    return options
+
+
+def tune_engine(engine):
+    if engine.dialect.name == "sqlite":
+        event.listen(engine, "connect", set_sqlite_pragmas)
+
+    return engine
+
+
+def build_engine(url):
+    return tune_engine(create_engine(url, **engine_options(url)))
+
+
+engine = build_engine(settings.sqlalchemy_database_url)
+
+
+class RoutingSession(Session):
+    def get_bind(self, mapper=None, clause=None, **kwargs):
+        # Sessions opened for a read-only request carry a replica; anything
+        # that writes, or asks for the primary, still goes to the primary.
+        replica = self.info.get("replica")
+
+        if replica is not None and not self._flushing:
+            if not isinstance(clause, UpdateBase) and not (
+                clause is not None and clause.get_execution_options().get("primary")
+            ):
+                return replica
+
+        return super().get_bind(mapper, clause=clause, **kwargs)
+
+
+SessionLocal = sessionmaker(
+    class_=RoutingSession, autocommit=False, autoflush=False, bind=engine
+)
+
+
+def async_url(url):
+    url = make_url(url)
+
+    return url.set(drivername=ASYNC_DRIVERS[url.get_backend_name()])
+
+
+def build_async_engine(url):
+    url = async_url(url)
+    async_engine = create_async_engine(url, **engine_options(url))
+    tune_engine(async_engine.sync_engine)
+
+    return async_engine
+
+
+def create_async_sessionmaker(url):
+    # Objects are read after commit outside the greenlet, where lazy refreshes
+    # cannot run.
+    return async_sessionmaker(
+        build_async_engine(url),
+        sync_session_class=RoutingSession,
+        autoflush=False,
+        expire_on_commit=False,
+    )
+
+
+AsyncSessionLocal = None
+
+if settings.async_database:
+    AsyncSessionLocal = create_async_sessionmaker(settings.sqlalchemy_database_url)
 
 Base = declarative_base()
@@ -0,0 +1,53 @@
+from collections import defaultdict
+
+from fastapi import Response
+from fastapi.responses import ORJSONResponse
+
+from . import pagination, schemas
+from .configuration import settings
+
+
+def schema_fields(schema, exclude=()):
+    return [name for name in schema.model_fields if name not in exclude]
+
+
+def fields(schema, exclude=(), extra=()):
+    # Without fields the crud functions return ORM objects, as before.
+    if not settings.fast_json:
+        return None
+
+    names = schema_fields(schema, exclude)
+
+    # Extra columns, like a cursor key, go last so to_dicts leaves them out.
+    return names + [name for name in extra if name not in names]
+
+
+def to_dicts(rows, schema, exclude=()):
+    names = schema_fields(schema, exclude)
+
+    return [dict(zip(names, row)) for row in rows]
+
+
+def page(response: Response, items: list, limit: int, key, schema):
+    # The rows already hold the schema's columns, so response_model validation
+    # is skipped and orjson encodes them directly. Headers set on the injected
+    # response are dropped when a Response is returned, hence the new one.
+    if settings.fast_json:
+        response = ORJSONResponse(to_dicts(items, schema))
+
+    pagination.set_next_cursor(response, items, limit, key)
+
+    return response if settings.fast_json else items
+
+
+def users_response(user_rows, event_rows):
+    events_by_organizer = defaultdict(list)
+    for event in to_dicts(event_rows, schemas.Event):
+        events_by_organizer[event["organizer_id"]].append(event)
+
+    return ORJSONResponse(
+        [
+            {**user, "events": events_by_organizer[user["user_id"]]}
+            for user in to_dicts(user_rows, schemas.User, ["events"])
+        ]
+    )
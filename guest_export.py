@@ -0,0 +1,70 @@
+import csv
+import io
+import tempfile
+
+from .crud import guests
+from .database import SessionLocal
+
+MEDIA_TYPES = {
+    "csv": "text/csv; charset=utf-8",
+    "xlsx": "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+}
+
+ANSWERS = {answer: name for name, answer in guests.ANSWER_FILTERS.items()}
+ANSWER_COLUMN = guests.EXPORT_COLUMNS.index("answer")
+
+CHUNK_SIZE = 64 * 1024
+
+
+def iter_guest_rows(event_id: int, chunk_size: int):
+    # The request session is closed before a streaming response starts.
+    with SessionLocal() as db:
+        for row in guests.get_guest_export_rows(db, event_id, chunk_size):
+            row = list(row)
+            row[ANSWER_COLUMN] = ANSWERS[row[ANSWER_COLUMN]]
+            yield row
+
+
+def iter_csv(rows):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(guests.EXPORT_COLUMNS)
+
+    for row in rows:
+        writer.writerow(row)
+
+        if buffer.tell() >= CHUNK_SIZE:
+            yield buffer.getvalue().encode()
+            buffer.seek(0)
+            buffer.truncate()
+
+    yield buffer.getvalue().encode()
+
+
+def iter_xlsx(rows):
+    # openpyxl is slow to import and only needed for spreadsheet exports.
+    from openpyxl import Workbook
+
+    # Write-only workbooks keep rows in a temporary file, not in memory.
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet("Guests")
+    sheet.append(guests.EXPORT_COLUMNS)
+
+    for row in rows:
+        sheet.append(row)
+
+    with tempfile.TemporaryFile() as file:
+        workbook.save(file)
+        file.seek(0)
+
+        while chunk := file.read(CHUNK_SIZE):
+            yield chunk
+
+
+def export_guests(event_id: int, file_format: str, chunk_size: int):
+    rows = iter_guest_rows(event_id, chunk_size)
+
+    if file_format == "xlsx":
+        return iter_xlsx(rows)
+
+    return iter_csv(rows)
@@ -0,0 +1,99 @@
+import codecs
+import csv
+import json
+
+from pydantic import ValidationError
+
+FORMATS = {
+    "text/csv": "csv",
+    "application/x-ndjson": "ndjson",
+    "application/ndjson": "ndjson",
+    "application/jsonl": "ndjson",
+}
+
+
+def get_format(content_type: str | None):
+    return FORMATS.get((content_type or "").split(";")[0].strip().lower())
+
+
+async def iter_lines(chunks):
+    decoder = codecs.getincrementaldecoder("utf-8-sig")()
+    line_number = 0
+    pending = ""
+
+    async for chunk in chunks:
+        *lines, pending = (pending + decoder.decode(chunk)).split("\n")
+
+        for line in lines:
+            line_number += 1
+            yield line_number, line.removesuffix("\r")
+
+    pending += decoder.decode(b"", final=True)
+
+    if pending:
+        yield line_number + 1, pending.removesuffix("\r")
+
+
+async def iter_csv_records(chunks):
+    header = None
+    record = []
+
+    async for line_number, line in iter_lines(chunks):
+        if not record:
+            first_line = line_number
+
+            if not line.strip():
+                continue
+
+        record.append(line)
+        text = "\n".join(record)
+
+        # A record is complete once every quoted field has been closed.
+        if text.count('"') % 2:
+            continue
+
+        record = []
+        values = next(csv.reader([text]))
+
+        if header is None:
+            header = [name.strip() for name in values]
+        elif len(values) != len(header):
+            yield first_line, f"Expected {len(header)} fields, got {len(values)}"
+        else:
+            yield first_line, {
+                name: value for name, value in zip(header, values) if value != ""
+            }
+
+    if record:
+        yield first_line, "Unterminated quoted field"
+
+
+async def iter_ndjson_records(chunks):
+    async for line_number, line in iter_lines(chunks):
+        if not line.strip():
+            continue
+
+        try:
+            record = json.loads(line)
+        except ValueError as exc:
+            yield line_number, f"Invalid JSON: {exc}"
+            continue
+
+        if not isinstance(record, dict):
+            yield line_number, "Expected a JSON object"
+        else:
+            yield line_number, record
+
+
+def iter_records(chunks, file_format: str):
+    if file_format == "csv":
+        return iter_csv_records(chunks)
+
+    return iter_ndjson_records(chunks)
+
+
+def describe_error(exc: ValidationError):
+    return "; ".join(
+        f"{'.'.join(str(part) for part in error['loc'])}: {error['msg']}"
+        for error in exc.errors()
+    )
@@ -0,0 +1,354 @@
+import base64
+import hashlib
+import io
+import os
+import re
+import shutil
+import struct
+import tempfile
+
+from .configuration import settings
+from .pools import WorkerPool
+from .storage import create_storage
+
+IMAGE_FORMATS = {"JPEG": "jpeg", "PNG": "png", "WEBP": "webp"}
+
+VARIANT_WIDTHS = {"thumbnail": 320, "mobile": 768, "desktop": 1920}
+
+VARIANT_FORMATS = {
+    "webp": ("WEBP", {"quality": 80, "method": 4}),
+    "jpeg": ("JPEG", {"quality": 82, "optimize": True, "progressive": True}),
+}
+
+BACKGROUND_KEY = re.compile(
+    r"[0-9a-f]{64}(\.(jpeg|png|webp)|-(320|768|1920)\.(webp|jpeg))"
+)
+
+PLACEHOLDER_WIDTH = 16
+
+HASH_CHUNK_SIZE = 1024 * 1024
+
+# JFIF, ICC profile and Adobe colour transform segments affect how the image
+# decodes; every other APPn (EXIF, XMP, IPTC, ...) and comments are dropped.
+JPEG_KEPT_SEGMENTS = {0xE0, 0xE2, 0xEE}
+
+PNG_METADATA_CHUNKS = {b"tEXt", b"zTXt", b"iTXt", b"eXIf", b"tIME"}
+
+WEBP_METADATA_CHUNKS = {b"EXIF", b"XMP "}
+
+# VP8X flags announcing the EXIF and XMP chunks.
+WEBP_METADATA_FLAGS = 0x08 | 0x04
+
+image_pool = WorkerPool(settings.image_workers, "image")
+
+storage = create_storage()
+
+
+def original_key(background_hash: str, file_extension: str):
+    return f"{background_hash}.{file_extension}"
+
+
+def variant_key(background_hash: str, width: int, image_format: str):
+    return f"{background_hash}-{width}.{image_format}"
+
+
+def placeholder_key(background_hash: str):
+    return f"{background_hash}.placeholder"
+
+
+def legacy_background_paths(event_uuid: str, file_extension: str):
+    # Before content addressing, files were named after the event.
+    return [
+        os.path.join(settings.background_path, f"{event_uuid}.{file_extension}")
+    ] + [
+        os.path.join(settings.background_path, f"{event_uuid}-{width}.{image_format}")
+        for width in VARIANT_WIDTHS.values()
+        for image_format in VARIANT_FORMATS
+    ]
+
+
+def background_keys(background_hash: str, file_extension: str):
+    return [
+        original_key(background_hash, file_extension),
+        placeholder_key(background_hash),
+    ] + [
+        variant_key(background_hash, width, image_format)
+        for width in VARIANT_WIDTHS.values()
+        for image_format in VARIANT_FORMATS
+    ]
+
+
+def is_background_key(key: str):
+    return BACKGROUND_KEY.fullmatch(key) is not None
+
+
+def media_type(key: str):
+    return f"image/{key.rsplit('.', 1)[1]}"
+
+
+def background_etag(key: str):
+    # Variants derive from the upload, so its content hash versions them too.
+    if "-" in key:
+        return f'"{key}"'
+
+    return f'"{key.split(".")[0]}"'
+
+
+def hash_file(file):
+    digest = hashlib.sha256()
+
+    file.seek(0)
+    while chunk := file.read(HASH_CHUNK_SIZE):
+        digest.update(chunk)
+    file.seek(0)
+
+    return digest.hexdigest()
+
+
+def copy_bytes(source, destination, length: int):
+    while length > 0:
+        chunk = source.read(min(length, HASH_CHUNK_SIZE))
+        if not chunk:
+            break
+        destination.write(chunk)
+        length -= len(chunk)
+
+
+def strip_jpeg(source, destination):
+    destination.write(source.read(2))
+
+    while marker := source.read(2):
+        if len(marker) < 2 or marker[0] != 0xFF:
+            destination.write(marker)
+            break
+
+        # Start of scan: the entropy-coded data runs to the end of the file.
+        if marker[1] == 0xDA:
+            destination.write(marker)
+            break
+
+        header = source.read(2)
+        if len(header) < 2:
+            destination.write(marker + header)
+            break
+
+        (length,) = struct.unpack(">H", header)
+
+        if marker[1] == 0xFE or (
+            0xE1 <= marker[1] <= 0xEF and marker[1] not in JPEG_KEPT_SEGMENTS
+        ):
+            source.seek(length - 2, io.SEEK_CUR)
+            continue
+
+        destination.write(marker + header)
+        copy_bytes(source, destination, length - 2)
+
+    shutil.copyfileobj(source, destination, HASH_CHUNK_SIZE)
+
+
+def strip_png(source, destination):
+    destination.write(source.read(8))
+
+    while header := source.read(8):
+        if len(header) < 8:
+            destination.write(header)
+            break
+
+        length, chunk_type = struct.unpack(">I4s", header)
+
+        # Chunk data is followed by its CRC.
+        if chunk_type in PNG_METADATA_CHUNKS:
+            source.seek(length + 4, io.SEEK_CUR)
+            continue
+
+        destination.write(header)
+        copy_bytes(source, destination, length + 4)
+
+        if chunk_type == b"IEND":
+            break
+
+
+def strip_webp(source, destination):
+    destination.write(source.read(12))
+
+    while header := source.read(8):
+        if len(header) < 8:
+            destination.write(header)
+            break
+
+        chunk_type, length = struct.unpack("<4sI", header)
+        # Chunks are padded to an even length.
+        padded = length + (length & 1)
+
+        if chunk_type in WEBP_METADATA_CHUNKS:
+            source.seek(padded, io.SEEK_CUR)
+            continue
+
+        destination.write(header)
+
+        if chunk_type == b"VP8X":
+            flags = source.read(1)
+            destination.write(bytes([flags[0] & ~WEBP_METADATA_FLAGS]))
+            padded -= 1
+
+        copy_bytes(source, destination, padded)
+
+    # The RIFF size covers everything after its own eight-byte header.
+    size = destination.tell() - 8
+    destination.seek(4)
+    destination.write(struct.pack("<I", size))
+    destination.seek(0, io.SEEK_END)
+
+
+METADATA_STRIPPERS = {"jpeg": strip_jpeg, "png": strip_png, "webp": strip_webp}
+
+
+def strip_metadata(file, file_extension: str):
+    # Originals are served as uploaded, so EXIF (camera, GPS position) and
+    # text chunks are dropped first. Pixel data is copied, never re-encoded.
+    stripped = tempfile.SpooledTemporaryFile(max_size=HASH_CHUNK_SIZE)
+
+    file.seek(0)
+    METADATA_STRIPPERS[file_extension](file, stripped)
+    stripped.seek(0)
+
+    return stripped
+
+
+def put_original(file, background_hash: str, file_extension: str):
+    key = original_key(background_hash, file_extension)
+
+    # Identical uploads share one blob and one set of variants.
+    if storage.exists(key):
+        return False
+
+    file.seek(0)
+    storage.put(key, file)
+
+    return True
+
+
+def save_original(file, file_extension: str):
+    background_hash = hash_file(file)
+    put_original(file, background_hash, file_extension)
+
+    return background_hash
+
+
+def to_rgb(image):
+    from PIL import Image
+
+    if image.mode == "RGB":
+        return image
+
+    if image.mode in ("RGBA", "LA", "P"):
+        image = image.convert("RGBA")
+        background = Image.new("RGB", image.size, "white")
+        background.paste(image, mask=image.getchannel("A"))
+
+        return background
+
+    return image.convert("RGB")
+
+
+def read_header(file):
+    # Pillow is imported on the first upload, not at startup.
+    from PIL import Image, UnidentifiedImageError
+
+    # Image.open parses the header only; pixel data is decoded on demand.
+    try:
+        with Image.open(file, formats=list(IMAGE_FORMATS)) as image:
+            return IMAGE_FORMATS[image.format], image.size
+    except (UnidentifiedImageError, Image.DecompressionBombError):
+        return None
+
+
+def max_pixels(file_extension: str):
+    # Only JPEG can be drafted to a smaller scale; PNG and WebP are decoded at
+    # full size, so they get the tighter limit.
+    if file_extension == "jpeg":
+        return settings.max_background_pixels
+
+    return min(settings.max_background_pixels, settings.max_decoded_background_pixels)
+
+
+def generate_variants(background_hash: str, file_extension: str):
+    from PIL import Image
+
+    widths = sorted(VARIANT_WIDTHS.values(), reverse=True)
+
+    with (
+        storage.open(original_key(background_hash, file_extension)) as file,
+        Image.open(file) as image,
+    ):
+        largest = min(widths[0], image.width)
+
+        # JPEG can decode straight to a smaller scale, which bounds memory.
+        image.draft("RGB", (largest, round(image.height * largest / image.width)))
+        variant = to_rgb(image)
+
+        # Each variant is scaled from the previous one, so the full-size
+        # decode can be released after the first resize.
+        for width in widths:
+            if width < variant.width:
+                height = round(variant.height * width / variant.width)
+                variant = variant.resize(
+                    (width, height), Image.Resampling.LANCZOS, reducing_gap=3.0
+                )
+            elif width != widths[0]:
+                # Never upscale; the largest variant already holds the image.
+                continue
+
+            for image_format, (pil_format, options) in VARIANT_FORMATS.items():
+                buffer = io.BytesIO()
+                variant.save(buffer, pil_format, **options)
+                buffer.seek(0)
+
+                storage.put(variant_key(background_hash, width, image_format), buffer)
+
+        placeholder = make_placeholder(variant)
+
+    # Written last, so it also marks the variants as complete.
+    storage.put(placeholder_key(background_hash), io.BytesIO(placeholder.encode()))
+
+    return placeholder
+
+
+def make_placeholder(image):
+    from PIL import Image
+
+    height = max(round(image.height * PLACEHOLDER_WIDTH / image.width), 1)
+    image = image.resize((PLACEHOLDER_WIDTH, height), Image.Resampling.BOX)
+
+    buffer = io.BytesIO()
+    image.save(buffer, "WEBP", quality=40)
+
+    return f"data:image/webp;base64,{base64.b64encode(buffer.getvalue()).decode()}"
+
+
+def read_placeholder(background_hash: str):
+    key = placeholder_key(background_hash)
+
+    if not storage.exists(key):
+        return None
+
+    with storage.open(key) as file:
+        return file.read().decode()
+
+
+def find_variant(background_hash: str, width: int, image_format: str):
+    widths = sorted(VARIANT_WIDTHS.values())
+    candidates = [w for w in widths if w >= width] + [w for w in reversed(widths)]
+
+    for candidate in candidates:
+        key = variant_key(background_hash, candidate, image_format)
+
+        if storage.exists(key):
+            return key
+
+    return None
+
+
+def remove_background(background_hash: str, file_extension: str):
+    for key in background_keys(background_hash, file_extension):
+        storage.delete(key)
@@ -0,0 +1,53 @@
+import re
+
+from fastapi import HTTPException, status
+from fastapi.responses import JSONResponse
+
+
+class BodySizeLimitMiddleware:
+    def __init__(self, app, max_size: int, paths: str):
+        self.app = app
+        self.max_size = max_size
+        self.paths = re.compile(paths)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not self.paths.fullmatch(scope["path"]):
+            return await self.app(scope, receive, send)
+
+        content_length = dict(scope["headers"]).get(b"content-length")
+
+        if content_length is not None:
+            try:
+                content_length = int(content_length)
+            except ValueError:
+                response = JSONResponse(
+                    {"detail": "Invalid Content-Length header"},
+                    status_code=status.HTTP_400_BAD_REQUEST,
+                )
+                return await response(scope, receive, send)
+
+        if content_length is not None and content_length > self.max_size:
+            response = JSONResponse(
+                {"detail": "Request body is too large"},
+                status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            )
+            return await response(scope, receive, send)
+
+        received = 0
+
+        # Chunked bodies carry no Content-Length, so count them as they arrive.
+        async def limited_receive():
+            nonlocal received
+
+            message = await receive()
+            received += len(message.get("body", b""))
+
+            if received > self.max_size:
+                raise HTTPException(
+                    status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+                    detail="Request body is too large",
+                )
+
+            return message
+
+        await self.app(scope, limited_receive, send)
@@ -1,77 +1,64 @@
 from datetime import datetime, timezone
 from typing import Annotated
 
-from fastapi import Depends, FastAPI, HTTPException, status
+from fastapi import APIRouter, Depends, FastAPI, HTTPException, status
+from fastapi.concurrency import run_in_threadpool
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.security import OAuth2PasswordRequestForm
-from sqlalchemy import event
-from sqlalchemy.engine import Engine
 from sqlalchemy.orm import Session
 
-from . import crud, models, schemas, utils
+from . import crud, migrations, pagination, schemas, utils
+from .configuration import settings
 from .database import engine
-from .routers import events, guests, users
-from .utils import get_db, verify_password
+from .limits import BodySizeLimitMiddleware
+from .replicas import ReadYourWritesMiddleware
+from .routers import backgrounds, events, guests, users
+from .utils import get_db
 
+router = APIRouter()
 
-@event.listens_for(Engine, "connect")
-def set_sqlite_pragma(dbapi_connection, connection_record):
-    cursor = dbapi_connection.cursor()
-    cursor.execute("PRAGMA foreign_keys=ON")
-    cursor.close()
 
-
-models.Base.metadata.create_all(bind=engine)
-
-app = FastAPI()
-app.include_router(users.router)
-app.include_router(events.router)
-app.include_router(guests.router)
-
-origins = [
-    "*",
-]
-
-app.add_middleware(
-    CORSMiddleware,
-    allow_origins=origins,
-    allow_credentials=True,
-    allow_methods=["*"],
-    allow_headers=["*"],
-)
-
-
-@app.post("/change_password", response_model=schemas.UserBase)
-def change_password(
+@router.post("/change_password", response_model=schemas.UserBase)
+async def change_password(
     user_change_password: schemas.UserChangePassword,
     current_user: Annotated[schemas.User, Depends(utils.get_current_user)],
     db: Session = Depends(get_db),
 ):
-    db_user = crud.users.get_user_by_email(db, current_user.email)
+    db_user = await run_in_threadpool(
+        crud.users.get_user_by_email, db, current_user.email
+    )
 
     if not db_user:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND, detail="User not found"
         )
 
-    if not verify_password(user_change_password.old_password, db_user.hashed_password):
+    user_id = db_user.user_id
+    hashed_password = db_user.hashed_password
+    utils.release_connection(db)
+
+    if not await utils.verify_password_async(
+        user_change_password.old_password, hashed_password
+    ):
         raise HTTPException(
             status_code=status.HTTP_406_NOT_ACCEPTABLE, detail="Wrong password"
         )
 
-    return crud.users.change_password(
-        db=db,
-        new_password=user_change_password.new_password,
-        user_id=current_user.user_id,
+    hashed_password = await utils.get_password_hash_async(
+        user_change_password.new_password
+    )
+
+    return await run_in_threadpool(
+        crud.users.change_password, db, hashed_password, user_id
     )
 
 
-@app.post("/token")
+@router.post("/token")
 async def login_for_access_token(
     form_data: Annotated[OAuth2PasswordRequestForm, Depends()],
     db: Session = Depends(get_db),
 ) -> schemas.Token:
-    user = utils.authenticate_user(form_data, db)
+    user = await utils.authenticate_user(form_data, db)
 
     if not user:
         raise HTTPException(
@@ -89,7 +76,7 @@ async def login_for_access_token(
     return schemas.Token(access_token=access_token, token_type="bearer")
 
 
-@app.post("/forget_password")
+@router.post("/forget_password")
 def forget_password(
     forgot_password_request: schemas.ForgetPasswordRequest,
     db: Session = Depends(get_db),
@@ -105,32 +92,99 @@ def forget_password(
     return {"status": "ok"}
 
 
-@app.post("/reset_password_with_token", response_model=schemas.UserBase)
-def reset_password_with_token(
+@router.post("/reset_password_with_token", response_model=schemas.UserBase)
+async def reset_password_with_token(
     reset_password_token: schemas.ResetPasswordToken, db: Session = Depends(get_db)
 ):
 
-    db_token = crud.users.get_reset_password_token(db, reset_password_token.token)
+    db_token = await run_in_threadpool(
+        crud.users.get_reset_password_token, db, reset_password_token.token
+    )
 
     if not db_token:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED, detail="Token not exist"
         )
 
-    db_token.expire_time = db_token.expire_time.replace(tzinfo=timezone.utc)
-    if datetime.now(timezone.utc) > db_token.expire_time:
+    expire_time = db_token.expire_time.replace(tzinfo=timezone.utc)
+    if datetime.now(timezone.utc) > expire_time:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED, detail="Token expired"
         )
 
-    db_user = crud.users.change_password(
-        db, reset_password_token.new_password, db_token.user_id
+    user_id = db_token.user_id
+    utils.release_connection(db)
+
+    hashed_password = await utils.get_password_hash_async(
+        reset_password_token.new_password
     )
-    crud.users.use_reset_password_token(db, db_token)
 
-    return db_user
+    def reset_password():
+        # The token may have been redeemed while the password was hashing.
+        if not crud.users.use_reset_password_token(db, reset_password_token.token):
+            raise HTTPException(
+                status_code=status.HTTP_401_UNAUTHORIZED, detail="Token not exist"
+            )
 
+        return crud.users.change_password(db, hashed_password, user_id)
 
-@app.post("/reset_tables")
+    return await run_in_threadpool(reset_password)
+
+
+@router.get("/metrics")
+def read_metrics(_: Annotated[schemas.User, Depends(utils.get_admin_user)]):
+    return {
+        "principal_cache": utils.principal_cache.stats(),
+        "password_pool": utils.password_pool.stats(),
+        "rsvp_queue": guests.answer_queue.stats(),
+    }
+
+
+@router.post("/reset_tables")
 def reset_tables(db: Session = Depends(get_db)):
     crud.users.reset_tables(db)
+
+
+# The engine, sessions, replicas and pools are built from the settings when
+# their modules are imported, so the factory only builds the app around them;
+# configure it through the environment before importing. Nothing builds an app
+# at import time: servers and tests call the factory.
+def create_app():
+    # Production runs `commands bootstrap` once instead, so workers starting
+    # side by side never race on the schema.
+    if settings.auto_migrate:
+        migrations.upgrade(engine)
+
+    app = FastAPI()
+    app.include_router(users.router)
+    app.include_router(events.router)
+    app.include_router(guests.router)
+    app.include_router(backgrounds.router)
+    app.include_router(router)
+
+    origins = [
+        "*",
+    ]
+
+    app.add_middleware(
+        CORSMiddleware,
+        allow_origins=origins,
+        allow_credentials=True,
+        allow_methods=["*"],
+        allow_headers=["*"],
+        expose_headers=[pagination.NEXT_CURSOR_HEADER],
+    )
+
+    # Reject oversized uploads before the multipart body is spooled. The margin
+    # covers the multipart boundaries and part headers.
+    app.add_middleware(
+        BodySizeLimitMiddleware,
+        max_size=settings.max_background_size + 64 * 1024,
+        paths=r"/events/[^/]+/background",
+    )
+
+    app.add_middleware(
+        ReadYourWritesMiddleware, sticky_seconds=settings.replica_sticky_seconds
+    )
+
+    return app
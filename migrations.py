@@ -0,0 +1,127 @@
+import os
+
+from sqlalchemy import inspect, text
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import Session
+from sqlalchemy.schema import CreateIndex
+
+from . import images, models
+from .crud import events, stats, users
+from .routers.backgrounds import prepare_background
+
+
+def create_missing_indexes(engine: Engine):
+    # Reflection skips expression indexes, so checkfirst would miss them.
+    with engine.begin() as connection:
+        for table in models.Base.metadata.sorted_tables:
+            for index in table.indexes:
+                connection.execute(CreateIndex(index, if_not_exists=True))
+
+
+# Single-column indexes that the composite pagination indexes replaced.
+REPLACED_INDEXES = ["ix_events_organizer_id", "ix_guests_event_id"]
+
+
+def drop_replaced_indexes(engine: Engine):
+    preparer = engine.dialect.identifier_preparer
+
+    with engine.begin() as connection:
+        for name in REPLACED_INDEXES:
+            connection.execute(text(f"DROP INDEX IF EXISTS {preparer.quote(name)}"))
+
+
+def add_missing_columns(engine: Engine):
+    inspector = inspect(engine)
+    existing_tables = set(inspector.get_table_names())
+    preparer = engine.dialect.identifier_preparer
+
+    with engine.begin() as connection:
+        for table in models.Base.metadata.sorted_tables:
+            if table.name not in existing_tables:
+                continue
+
+            existing_columns = {
+                column["name"] for column in inspector.get_columns(table.name)
+            }
+
+            for column in table.columns:
+                if column.name in existing_columns:
+                    continue
+
+                connection.execute(
+                    text(
+                        f"ALTER TABLE {preparer.format_table(table)} ADD COLUMN "
+                        f"{preparer.format_column(column)} "
+                        f"{column.type.compile(dialect=engine.dialect)}"
+                    )
+                )
+
+
+def migrate_legacy_backgrounds(engine: Engine):
+    with Session(engine) as db:
+        legacy_backgrounds = (
+            db.query(models.Event.uuid, models.Event.background_photo)
+            .filter(
+                models.Event.background_photo.is_not(None),
+                models.Event.background_hash.is_(None),
+            )
+            .all()
+        )
+
+        for event_uuid, file_extension in legacy_backgrounds:
+            original_path, *variant_paths = images.legacy_background_paths(
+                event_uuid, file_extension
+            )
+
+            if not os.path.exists(original_path):
+                continue
+
+            with open(original_path, "rb") as file:
+                stripped = images.strip_metadata(file, file_extension)
+
+            background_hash = images.save_original(stripped, file_extension)
+            placeholder = images.read_placeholder(background_hash)
+
+            # Committed per event, so an interrupted run resumes with the rest;
+            # the old files go only once the hash is recorded.
+            events.add_background(
+                db, event_uuid, file_extension, background_hash, placeholder
+            )
+
+            for path in [original_path, *variant_paths]:
+                if os.path.exists(path):
+                    os.remove(path)
+
+            if placeholder is None:
+                images.image_pool.spawn(
+                    prepare_background, background_hash, file_extension
+                )
+
+
+def upgrade(engine: Engine):
+    existing_tables = set(inspect(engine).get_table_names())
+
+    models.Base.metadata.create_all(bind=engine)
+    add_missing_columns(engine)
+
+    # Counters written before the unique index may hold duplicate keys.
+    if models.EventAnswerCount.__tablename__ in existing_tables:
+        with Session(engine) as db:
+            stats.merge_duplicate_answer_counts(db)
+
+    if models.UserDeletionJob.__tablename__ in existing_tables:
+        with Session(engine) as db:
+            users.supersede_duplicate_deletion_jobs(db)
+
+    create_missing_indexes(engine)
+    drop_replaced_indexes(engine)
+
+    if (
+        models.Guest.__tablename__ in existing_tables
+        and models.EventAnswerCount.__tablename__ not in existing_tables
+    ):
+        with Session(engine) as db:
+            stats.reconcile_event_stats(db)
+
+    if models.Event.__tablename__ in existing_tables:
+        migrate_legacy_backgrounds(engine)
@@ -1,4 +1,5 @@
-from sqlalchemy import Boolean, Column, DateTime, ForeignKey, Integer, String
+from sqlalchemy import (Boolean, Column, DateTime, ForeignKey, Index, Integer,
+                        String, cast, func, literal_column)
 from sqlalchemy.orm import relationship
 
 from . import utils
@@ -9,7 +10,7 @@ class User(Base):
     __tablename__ = "users"
 
     user_id = Column(Integer, primary_key=True)
-    uuid = Column(String, default=utils.get_uuid4)
+    uuid = Column(String, default=utils.get_uuid4, index=True)
     email = Column(String(50), unique=True)
     hashed_password = Column(String)
     role = Column(String, default="user")
@@ -21,7 +22,7 @@ class Event(Base):
     __tablename__ = "events"
 
     event_id = Column(Integer, primary_key=True)
-    uuid = Column(String, default=utils.get_uuid4)
+    uuid = Column(String, default=utils.get_uuid4, index=True)
     name = Column(String)
     is_public = Column(Boolean)
     start_time = Column(DateTime)
@@ -31,16 +32,32 @@ class Event(Base):
     decision_deadline = Column(DateTime)
     organizer_id = Column(Integer, ForeignKey("users.user_id"))
     background_photo = Column(String)
+    background_hash = Column(String, index=True)
+    background_placeholder = Column(String)
 
     organizer = relationship("User", back_populates="events")
     guests = relationship("Guest", back_populates="event")
 
+    __table_args__ = (
+        Index("ix_events_start_time_event_id", start_time, event_id),
+        Index(
+            "ix_events_organizer_id_start_time_event_id",
+            organizer_id,
+            start_time,
+            event_id,
+        ),
+        Index(
+            "ix_events_is_public_start_time_event_id", is_public, start_time, event_id
+        ),
+        Index("ix_events_location_start_time_event_id", location, start_time, event_id),
+    )
+
 
 class Guest(Base):
     __tablename__ = "guests"
 
     guest_id = Column(Integer, primary_key=True)
-    uuid = Column(String, default=utils.get_uuid4)
+    uuid = Column(String, default=utils.get_uuid4, index=True)
     event_id = Column(Integer, ForeignKey("events.event_id"))
     name = Column(String)
     surname = Column(String)
@@ -50,16 +67,66 @@ class Guest(Base):
     menu = Column(String)
     comments = Column(String)
 
-    companion_id = Column(Integer, ForeignKey("guests.guest_id"))
+    companion_id = Column(Integer, ForeignKey("guests.guest_id"), index=True)
 
     event = relationship("Event", back_populates="guests")
-    # companion = relationship("Guest")
+    companion = relationship("Guest", remote_side=[guest_id])
+
+    __table_args__ = (
+        Index("ix_guests_event_id_guest_id", event_id, guest_id),
+        Index("ix_guests_event_id_answer_guest_id", event_id, answer, guest_id),
+    )
+
+
+class EventAnswerCount(Base):
+    __tablename__ = "event_answer_counts"
+
+    event_answer_count_id = Column(Integer, primary_key=True)
+    event_id = Column(Integer, ForeignKey("events.event_id"), index=True)
+    answer = Column(Boolean)
+    menu = Column(String)
+    count = Column(Integer, default=0)
+
+    __table_args__ = (
+        # One row per key; unlike a plain unique constraint, NULL answers and
+        # menus compare equal here.
+        Index(
+            "ux_event_answer_counts_event_id_answer_menu",
+            event_id,
+            func.coalesce(cast(answer, Integer), literal_column("-1")),
+            func.coalesce(menu, literal_column("''")),
+            menu.is_(None),
+            unique=True,
+        ),
+    )
+
+
+class UserDeletionJob(Base):
+    __tablename__ = "user_deletion_jobs"
+
+    job_id = Column(String, primary_key=True, default=utils.get_uuid4)
+    user_id = Column(Integer, index=True)
+    status = Column(String, default="pending")
+    total_events = Column(Integer, default=0)
+    deleted_events = Column(Integer, default=0)
+    error = Column(String)
+    updated_at = Column(DateTime, default=utils.utc_now)
+
+    __table_args__ = (
+        Index(
+            "ux_user_deletion_jobs_active_user_id",
+            user_id,
+            unique=True,
+            sqlite_where=status.in_(["pending", "running"]),
+            postgresql_where=status.in_(["pending", "running"]),
+        ),
+    )
 
 
 class ForgotPassowordToken(Base):
     __tablename__ = "forgot_password_token"
 
-    user_id = Column(Integer, ForeignKey("users.user_id"))
+    user_id = Column(Integer, ForeignKey("users.user_id"), index=True)
     token = Column(String, primary_key=True, unique=True, default=utils.get_uuid4)
     expire_time = Column(DateTime, default=utils.get_default_expire_date)
 
@@ -0,0 +1,60 @@
+import asyncio
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+
+class WorkerPool:
+    def __init__(self, workers: int, name: str):
+        self.workers = workers
+        self.name = name
+        self._executor = ThreadPoolExecutor(
+            max_workers=workers, thread_name_prefix=name
+        )
+        self._in_flight = 0
+        self._lock = threading.Lock()
+
+    def submit(self, func, *args):
+        with self._lock:
+            self._in_flight += 1
+
+        future = self._executor.submit(func, *args)
+        future.add_done_callback(self._done)
+
+        return future
+
+    def spawn(self, func, *args):
+        # Nobody waits on the future, so a failure would otherwise vanish.
+        future = self.submit(func, *args)
+        future.add_done_callback(lambda future: self._log_failure(func, future))
+
+        return future
+
+    async def run(self, func, *args):
+        return await asyncio.wrap_future(self.submit(func, *args))
+
+    def _log_failure(self, func, future):
+        exception = future.exception()
+
+        if exception is not None:
+            logger.error(
+                "%s failed in the %s pool",
+                func.__name__,
+                self.name,
+                exc_info=exception,
+            )
+
+    def _done(self, _):
+        with self._lock:
+            self._in_flight -= 1
+
+    def stats(self):
+        in_flight = self._in_flight
+
+        return {
+            "workers": self.workers,
+            "in_flight": in_flight,
+            "queue_depth": max(in_flight - self.workers, 0),
+        }
@@ -0,0 +1,61 @@
+import time
+
+from .configuration import settings
+from .database import build_async_engine, build_engine
+
+STICKY_COOKIE = "primary_until"
+
+SAFE_METHODS = {"GET", "HEAD", "OPTIONS"}
+
+replica_engine = None
+async_replica_engine = None
+
+if settings.replica_database_url:
+    replica_engine = build_engine(settings.replica_database_url)
+
+    if settings.async_database:
+        async_replica_engine = build_async_engine(settings.replica_database_url)
+
+
+def use_replica(request):
+    if request.method not in SAFE_METHODS:
+        return False
+
+    # A client that just wrote reads from the primary until the replica has
+    # had time to catch up, so it always sees its own changes.
+    try:
+        primary_until = float(request.cookies.get(STICKY_COOKIE, 0))
+    except ValueError:
+        primary_until = 0
+
+    return primary_until < time.time()
+
+
+class ReadYourWritesMiddleware:
+    def __init__(self, app, sticky_seconds: int):
+        self.app = app
+        self.sticky_seconds = sticky_seconds
+
+    async def __call__(self, scope, receive, send):
+        if (
+            replica_engine is None
+            or scope["type"] != "http"
+            or scope["method"] in SAFE_METHODS
+        ):
+            return await self.app(scope, receive, send)
+
+        async def sticky_send(message):
+            if message["type"] == "http.response.start" and message["status"] < 400:
+                primary_until = int(time.time()) + self.sticky_seconds
+                cookie = (
+                    f"{STICKY_COOKIE}={primary_until}; Max-Age={self.sticky_seconds}"
+                    "; Path=/; HttpOnly; SameSite=Lax"
+                )
+                message["headers"] = [
+                    *message.get("headers", []),
+                    (b"set-cookie", cookie.encode()),
+                ]
+
+            await send(message)
+
+        await self.app(scope, receive, sticky_send)
@@ -0,0 +1,121 @@
+import time
+
+from fastapi import APIRouter, HTTPException, Request, Response, status
+from sqlalchemy.orm import Session
+
+from .. import images, signing, utils
+from ..configuration import settings
+from ..crud import events
+from ..database import SessionLocal
+
+router = APIRouter(prefix="/backgrounds")
+
+
+def find_background(request: Request, db_event, width, image_format):
+    background_hash = db_event.background_hash
+    if not db_event.background_photo or background_hash is None:
+        raise HTTPException(
+            status_code=404, detail="The event does not have a background photo"
+        )
+
+    key = images.original_key(background_hash, db_event.background_photo)
+    negotiated = False
+
+    if width is not None or image_format is not None:
+        if image_format is None:
+            accepts_webp = "image/webp" in request.headers.get("accept", "")
+            image_format = "webp" if accepts_webp else "jpeg"
+            negotiated = True
+
+        variant_key = images.find_variant(
+            background_hash, width or images.VARIANT_WIDTHS["desktop"], image_format
+        )
+
+        # Variants are generated in the background; serve the original meanwhile.
+        if variant_key is not None:
+            key = variant_key
+
+    if not images.storage.exists(key):
+        raise HTTPException(
+            status_code=404, detail="The event does not have a background photo"
+        )
+
+    return key, negotiated
+
+
+def serve_background(request: Request, key: str, headers: dict):
+    etag = images.background_etag(key)
+    headers = {**headers, "ETag": etag}
+
+    if utils.etag_matches(request, etag):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+
+    return images.storage.response(
+        key, images.media_type(key), headers, request.headers.get("range")
+    )
+
+
+def serve_event_background(
+    request: Request,
+    db_event,
+    width: int | None,
+    image_format: str | None,
+    cache_control: str,
+):
+    key, negotiated = find_background(request, db_event, width, image_format)
+    headers = {"Cache-Control": cache_control}
+
+    if negotiated:
+        headers["Vary"] = "Accept"
+
+    return serve_background(request, key, headers)
+
+
+def signed_background_url(request: Request, db_event, width, image_format):
+    key, _ = find_background(request, db_event, width, image_format)
+    url, expires = signing.signed_url(f"/backgrounds/{key}", settings.signed_url_ttl)
+
+    return {"url": url, "expires": expires}
+
+
+def prepare_background(background_hash: str, file_extension: str):
+    placeholder = images.generate_variants(background_hash, file_extension)
+
+    # Runs in the image pool after the request has returned.
+    with SessionLocal() as db:
+        events.set_background_placeholder(db, background_hash, placeholder)
+        # The last reference may have gone while the variants were written.
+        release_background(db, background_hash, file_extension)
+
+    return placeholder
+
+
+def release_background(db: Session, background_hash: str | None, file_extension):
+    # Blobs are shared by every event that uploaded the same image, so they
+    # go only once the last reference is gone.
+    if background_hash is None:
+        return
+
+    events.lock_background(db, background_hash)
+
+    if events.count_background_references(db, background_hash) == 0:
+        images.remove_background(background_hash, file_extension)
+
+    db.commit()
+
+
+@router.get("/{key}")
+def get_signed_background(key: str, expires: int, signature: str, request: Request):
+    if not signing.verify(request.url.path, expires, signature):
+        raise HTTPException(
+            status.HTTP_403_FORBIDDEN, detail="Invalid or expired signature"
+        )
+
+    if not images.is_background_key(key) or not images.storage.exists(key):
+        raise HTTPException(status_code=404, detail="Background not found")
+
+    max_age = max(expires - int(time.time()), 0)
+
+    return serve_background(
+        request, key, {"Cache-Control": f"public, max-age={max_age}, immutable"}
+    )
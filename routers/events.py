@@ -1,14 +1,22 @@
-import os.path
-from typing import Annotated
-
-from fastapi import APIRouter, Depends, HTTPException, UploadFile, status
-from fastapi.responses import FileResponse
-from PIL import Image
+from datetime import datetime
+from typing import Annotated, Literal
+
+from fastapi import (APIRouter, Depends, HTTPException, Query, Request,
+                     Response, UploadFile, status)
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
+from pydantic import ValidationError
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 
-from .. import schemas, utils
+from .. import (fast_json, guest_export, guest_import, images, pagination,
+                schemas, uploads, utils)
+from ..configuration import settings
 from ..crud import events, guests
 from ..utils import get_db
+from .backgrounds import (prepare_background, release_background,
+                          serve_event_background, signed_background_url)
 
 router = APIRouter(prefix="/events")
 
@@ -49,43 +57,86 @@ def delete_event(
     if not db_event or db_event.organizer_id != current_user.user_id:
         raise HTTPException(status_code=404, detail="Event not found")
 
-    guests.delete_participants_from_event(db, event_uuid)
+    db_event = events.delete_event(db, db_event)
+    release_background(db, db_event.background_hash, db_event.background_photo)
+
+    return db_event
 
-    return events.delete_event(db, event_uuid)
+
+def event_cursor(db_event):
+    return db_event.start_time, db_event.event_id
 
 
 @router.get("/public", response_model=list[schemas.Event])
-def read_public_events(db: Session = Depends(get_db)):
-    db_events = events.get_public_events(db)
+def read_public_events(
+    response: Response,
+    start_after: datetime | None = None,
+    start_before: datetime | None = None,
+    location: str | None = None,
+    cursor: str | None = None,
+    limit: int = Query(100, ge=1, le=1000),
+    db: Session = Depends(get_db),
+):
+    db_events = events.get_events_page(
+        db,
+        is_public=True,
+        start_after=start_after,
+        start_before=start_before,
+        location=location,
+        after=pagination.decode_cursor(cursor, datetime, int),
+        limit=limit,
+        fields=fast_json.fields(schemas.Event),
+    )
 
-    return db_events
+    return fast_json.page(response, db_events, limit, event_cursor, schemas.Event)
 
 
 @router.get("", response_model=list[schemas.Event])
 def read_events(
     current_user: Annotated[schemas.User, Depends(utils.get_current_user)],
+    response: Response,
+    start_after: datetime | None = None,
+    start_before: datetime | None = None,
+    location: str | None = None,
+    cursor: str | None = None,
+    limit: int = Query(100, ge=1, le=1000),
     db: Session = Depends(get_db),
 ):
-    if current_user.role != "admin":
-        db_events = events.get_event_by_organizer(db, current_user.user_id)
-    else:
-        db_events = events.get_events(db)
+    db_events = events.get_events_page(
+        db,
+        organizer_id=current_user.user_id if current_user.role != "admin" else None,
+        start_after=start_after,
+        start_before=start_before,
+        location=location,
+        after=pagination.decode_cursor(cursor, datetime, int),
+        limit=limit,
+        fields=fast_json.fields(schemas.Event),
+    )
 
-    return db_events
+    return fast_json.page(response, db_events, limit, event_cursor, schemas.Event)
 
 
 @router.get("/{event_uuid}", response_model=schemas.Event)
-def read_event(event_uuid: str, db: Session = Depends(get_db)):
-    db_event = events.get_event(db, event_uuid=event_uuid)
-    if db_event is None:
-        raise HTTPException(status_code=404, detail="Event not found")
-    return db_event
+async def read_event(
+    event_uuid: str, db: Session | AsyncSession = Depends(utils.get_async_db)
+):
+    def read(db: Session):
+        db_event = events.get_event(db, event_uuid=event_uuid)
+        if db_event is None:
+            raise HTTPException(status_code=404, detail="Event not found")
+        return schemas.Event.model_validate(db_event)
+
+    return await utils.run_db(db, read)
 
 
 @router.get("/{event_uuid}/guests", response_model=list[schemas.Guest])
 def read_guests_from_event(
     event_uuid: str,
     current_user: Annotated[schemas.User, Depends(utils.get_current_user)],
+    response: Response,
+    answer: Literal["yes", "no", "unknown"] | None = None,
+    cursor: str | None = None,
+    limit: int = Query(100, ge=1, le=1000),
     db: Session = Depends(get_db),
 ):
     db_event = events.get_event(db, event_uuid)
@@ -100,7 +151,117 @@ def read_guests_from_event(
             detail="You are not an owner of this event",
         )
 
-    return guests.get_guests_from_event(db, event_uuid)
+    after = pagination.decode_cursor(cursor, int)
+    db_guests = guests.get_guests_page(
+        db,
+        db_event.event_id,
+        answer=answer,
+        after=after[0] if after else None,
+        limit=limit,
+        fields=fast_json.fields(schemas.Guest, extra=["guest_id"]),
+    )
+
+    return fast_json.page(
+        response,
+        db_guests,
+        limit,
+        lambda db_guest: (db_guest.guest_id,),
+        schemas.Guest,
+    )
+
+
+@router.get("/{event_uuid}/guests/export")
+def export_guests_from_event(
+    event_uuid: str,
+    current_user: Annotated[schemas.User, Depends(utils.get_current_user)],
+    file_format: Literal["csv", "xlsx"] = Query("csv", alias="format"),
+    db: Session = Depends(get_db),
+):
+    db_event = events.get_event(db, event_uuid)
+    if not db_event or db_event.organizer_id != current_user.user_id:
+        raise HTTPException(status_code=404, detail="Event not found")
+
+    return StreamingResponse(
+        guest_export.export_guests(
+            db_event.event_id, file_format, settings.guest_export_chunk_size
+        ),
+        media_type=guest_export.MEDIA_TYPES[file_format],
+        headers={
+            "Content-Disposition": (
+                f'attachment; filename="guests-{event_uuid}.{file_format}"'
+            )
+        },
+    )
+
+
+@router.post("/{event_uuid}/guests/import", response_model=schemas.GuestImportResult)
+async def import_guests(
+    event_uuid: str,
+    request: Request,
+    current_user: Annotated[schemas.User, Depends(utils.get_current_user)],
+    db: Session = Depends(get_db),
+):
+    file_format = guest_import.get_format(request.headers.get("content-type"))
+
+    if file_format is None:
+        raise HTTPException(
+            status.HTTP_415_UNSUPPORTED_MEDIA_TYPE,
+            detail="Send guests as text/csv or application/x-ndjson",
+        )
+
+    db_event = await run_in_threadpool(events.get_event, db, event_uuid)
+    if not db_event or db_event.organizer_id != current_user.user_id:
+        raise HTTPException(status_code=404, detail="Event not found")
+
+    event_id = db_event.event_id
+    utils.release_connection(db)
+
+    imported = 0
+    errors = []
+    batch = []
+
+    def store(batch):
+        try:
+            guests.create_event_guests(db, [guest for _, guest in batch], event_id)
+            return len(batch)
+        except SQLAlchemyError:
+            db.rollback()
+
+        # Retry the failed batch row by row, so only the bad rows are reported.
+        stored = 0
+        for line, guest in batch:
+            try:
+                guests.create_event_guests(db, [guest], event_id)
+                stored += 1
+            except SQLAlchemyError:
+                db.rollback()
+                errors.append({"line": line, "detail": "Guest could not be stored"})
+
+        return stored
+
+    async for line, record in guest_import.iter_records(request.stream(), file_format):
+        if isinstance(record, str):
+            errors.append({"line": line, "detail": record})
+            continue
+
+        try:
+            guest = schemas.GuestCreate.model_validate(
+                {**record, "event_uuid": event_uuid}
+            )
+        except ValidationError as exc:
+            errors.append({"line": line, "detail": guest_import.describe_error(exc)})
+            continue
+
+        batch.append((line, guest))
+
+        if len(batch) == settings.guest_import_batch_size:
+            imported += await run_in_threadpool(store, batch)
+            batch = []
+
+    if batch:
+        imported += await run_in_threadpool(store, batch)
+
+    return {"imported": imported, "errors": errors}
 
 
 @router.get("/{event_uuid}/stats")
@@ -125,6 +286,63 @@ def read_event_stats(
     return events.get_event_stats(db, event_uuid)
 
 
+BACKGROUND_CONTENT_TYPES = ["image/webp", "image/png", "image/jpeg"]
+
+
+def save_background(db: Session, event_uuid: str, file, content_type: str | None):
+    if content_type not in BACKGROUND_CONTENT_TYPES:
+        raise HTTPException(
+            status.HTTP_406_NOT_ACCEPTABLE, detail="The file should be webp, png or jpg"
+        )
+
+    header = images.read_header(file)
+
+    if header is None or f"image/{header[0]}" != content_type:
+        raise HTTPException(
+            status.HTTP_406_NOT_ACCEPTABLE, detail="The file should be webp, png or jpg"
+        )
+
+    file_extension, (width, height) = header
+
+    if width < 300 or height < 300:
+        raise HTTPException(
+            status.HTTP_406_NOT_ACCEPTABLE,
+            detail="Image should be bigger than (300,300)",
+        )
+
+    max_pixels = images.max_pixels(file_extension)
+
+    if width * height > max_pixels:
+        raise HTTPException(
+            status.HTTP_406_NOT_ACCEPTABLE,
+            detail=f"Image should have at most {max_pixels} pixels",
+        )
+
+    db_event = events.get_event(db, event_uuid)
+    previous = db_event.background_hash, db_event.background_photo
+
+    file = images.strip_metadata(file, file_extension)
+    background_hash = images.save_original(file, file_extension)
+
+    # Re-uploads of a known image reuse the variants generated the first time.
+    placeholder = images.read_placeholder(background_hash)
+    db_event = events.add_background(
+        db, event_uuid, file_extension, background_hash, placeholder
+    )
+
+    # A release that committed just before the reference did may have removed
+    # the blob we reused; now that the reference is visible, restore it.
+    restored = images.put_original(file, background_hash, file_extension)
+
+    if placeholder is None or restored:
+        images.image_pool.spawn(prepare_background, background_hash, file_extension)
+
+    if previous[0] != background_hash:
+        release_background(db, *previous)
+
+    return db_event
+
+
 @router.post("/{event_uuid}/background")
 def upload_background(
     event_uuid: str,
@@ -136,64 +354,214 @@ def upload_background(
     if not db_event or db_event.organizer_id != current_user.user_id:
         raise HTTPException(status_code=404, detail="Event not found")
 
-    if file.size > 10 * 1024 * 1024:
+    if file.size > settings.max_background_size:
         raise HTTPException(
-            status.HTTP_406_NOT_ACCEPTABLE, detail="The file is bigger than 10 MB"
+            status.HTTP_406_NOT_ACCEPTABLE,
+            detail=f"The file is bigger than {settings.max_background_size // 2**20} MB",
         )
 
-    if file.content_type not in ["image/webp", "image/png", "image/jpeg"]:
+    db_event = save_background(db, event_uuid, file.file, file.content_type)
+
+    return {
+        "filename": file.filename,
+        "size": file.size,
+        "content_type": file.content_type,
+        "url": f"/events/{event_uuid}/background/{db_event.background_hash}",
+    }
+
+
+def get_background_upload(db: Session, event_uuid: str, upload_id: str, user_id):
+    db_event = events.get_event(db, event_uuid)
+    if not db_event or db_event.organizer_id != user_id:
+        raise HTTPException(status_code=404, detail="Event not found")
+
+    upload = uploads.get_upload(upload_id)
+    if upload is None or upload["event_uuid"] != event_uuid:
+        raise HTTPException(status_code=404, detail="Upload not found")
+
+    return upload
+
+
+@router.post(
+    "/{event_uuid}/background/uploads",
+    response_model=schemas.BackgroundUpload,
+    status_code=status.HTTP_201_CREATED,
+)
+def create_background_upload(
+    event_uuid: str,
+    background_upload: schemas.BackgroundUploadCreate,
+    current_user: Annotated[schemas.User, Depends(utils.get_current_user)],
+    db: Session = Depends(get_db),
+):
+    db_event = events.get_event(db, event_uuid)
+    if not db_event or db_event.organizer_id != current_user.user_id:
+        raise HTTPException(status_code=404, detail="Event not found")
+
+    if background_upload.content_type not in BACKGROUND_CONTENT_TYPES:
         raise HTTPException(
             status.HTTP_406_NOT_ACCEPTABLE, detail="The file should be webp, png or jpg"
         )
 
-    image = Image.open(file.file)
-
-    width, height = image.size
-
-    if width < 300 or height < 300:
+    if background_upload.size > settings.max_background_size:
         raise HTTPException(
             status.HTTP_406_NOT_ACCEPTABLE,
-            detail="Image should be bigger than (300,300)",
+            detail=f"The file is bigger than {settings.max_background_size // 2**20} MB",
         )
 
-    file_extension = file.content_type[6:]
+    return uploads.create_upload(
+        event_uuid, background_upload.size, background_upload.content_type
+    )
+
+
+@router.get(
+    "/{event_uuid}/background/uploads/{upload_id}",
+    response_model=schemas.BackgroundUpload,
+)
+def read_background_upload(
+    event_uuid: str,
+    upload_id: str,
+    current_user: Annotated[schemas.User, Depends(utils.get_current_user)],
+    db: Session = Depends(get_db),
+):
+    return get_background_upload(db, event_uuid, upload_id, current_user.user_id)
 
-    background_path = "./backgrounds"
-    if not os.path.isdir(background_path):
-        os.mkdir(background_path)
 
-    image.save(os.path.join(background_path, f"{event_uuid}.{file_extension}"))
+@router.put(
+    "/{event_uuid}/background/uploads/{upload_id}",
+    response_model=schemas.BackgroundUpload,
+)
+async def upload_background_chunk(
+    event_uuid: str,
+    upload_id: str,
+    offset: int,
+    request: Request,
+    current_user: Annotated[schemas.User, Depends(utils.get_current_user)],
+    db: Session = Depends(get_db),
+):
+    upload = await run_in_threadpool(
+        get_background_upload, db, event_uuid, upload_id, current_user.user_id
+    )
+    utils.release_connection(db)
+
+    file = await run_in_threadpool(uploads.open_part, upload_id, offset)
+    remaining = upload["size"] - offset
+
+    # Chunks go straight to disk as they arrive; bytes written before a
+    # dropped connection are kept and the client resumes after them.
+    try:
+        async for chunk in request.stream():
+            if len(chunk) > remaining:
+                raise HTTPException(
+                    status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+                    detail="The chunk goes past the declared size",
+                )
+
+            await run_in_threadpool(file.write, chunk)
+            remaining -= len(chunk)
+    finally:
+        await run_in_threadpool(file.close)
+
+    return {**upload, "offset": upload["size"] - remaining}
+
+
+@router.post("/{event_uuid}/background/uploads/{upload_id}/finalize")
+def finalize_background_upload(
+    event_uuid: str,
+    upload_id: str,
+    current_user: Annotated[schemas.User, Depends(utils.get_current_user)],
+    db: Session = Depends(get_db),
+):
+    upload = get_background_upload(db, event_uuid, upload_id, current_user.user_id)
+
+    if upload["offset"] != upload["size"]:
+        raise HTTPException(
+            status.HTTP_409_CONFLICT,
+            detail=f"Only {upload['offset']} of {upload['size']} bytes were uploaded",
+        )
 
-    events.add_background(db, event_uuid, file_extension)
+    try:
+        with open(uploads.upload_path(upload_id, "part"), "rb") as file:
+            db_event = save_background(db, event_uuid, file, upload["content_type"])
+    finally:
+        uploads.remove_upload(upload_id)
 
     return {
-        "filename": file.filename,
-        "size": file.size,
-        "content_type": file.content_type,
+        "size": upload["size"],
+        "content_type": upload["content_type"],
+        "url": f"/events/{event_uuid}/background/{db_event.background_hash}",
     }
 
 
+@router.delete("/{event_uuid}/background/uploads/{upload_id}")
+def delete_background_upload(
+    event_uuid: str,
+    upload_id: str,
+    current_user: Annotated[schemas.User, Depends(utils.get_current_user)],
+    db: Session = Depends(get_db),
+):
+    get_background_upload(db, event_uuid, upload_id, current_user.user_id)
+    uploads.remove_upload(upload_id)
+
+    return {"detail": "Upload deleted successfully"}
+
+
+@router.get("/{event_uuid}/background_url", response_model=schemas.SignedUrl)
+def get_background_url(
+    event_uuid: str,
+    current_user: Annotated[schemas.User, Depends(utils.get_current_user)],
+    request: Request,
+    width: int | None = Query(None, ge=1, le=4096),
+    image_format: Literal["webp", "jpeg"] | None = Query(None, alias="format"),
+    db: Session = Depends(get_db),
+):
+    db_event = events.get_event(db, event_uuid)
+    if not db_event or db_event.organizer_id != current_user.user_id:
+        raise HTTPException(status_code=404, detail="Event not found")
+
+    return signed_background_url(request, db_event, width, image_format)
+
+
 @router.get("/{event_uuid}/background")
 def get_background(
     event_uuid: str,
     current_user: Annotated[schemas.User, Depends(utils.get_current_user)],
+    request: Request,
+    width: int | None = Query(None, ge=1, le=4096),
+    image_format: Literal["webp", "jpeg"] | None = Query(None, alias="format"),
     db: Session = Depends(get_db),
 ):
     db_event = events.get_event(db, event_uuid)
     if not db_event or db_event.organizer_id != current_user.user_id:
         raise HTTPException(status_code=404, detail="Event not found")
 
-    file_extension = db_event.background_photo
-    if not file_extension:
-        raise HTTPException(
-            status_code=404, detail="The event does not have a background photo"
-        )
+    return serve_event_background(request, db_event, width, image_format, "no-cache")
 
-    background_path = "./backgrounds"
-    file_path = os.path.join(background_path, f"{event_uuid}.{file_extension}")
 
-    if os.path.exists(file_path):
-        return FileResponse(file_path)
+@router.get("/{event_uuid}/background/{background_hash}")
+def get_versioned_background(
+    event_uuid: str,
+    background_hash: str,
+    current_user: Annotated[schemas.User, Depends(utils.get_current_user)],
+    request: Request,
+    width: int | None = Query(None, ge=1, le=4096),
+    image_format: Literal["webp", "jpeg"] | None = Query(None, alias="format"),
+    db: Session = Depends(get_db),
+):
+    db_event = events.get_event(db, event_uuid)
+    if not db_event or db_event.organizer_id != current_user.user_id:
+        raise HTTPException(status_code=404, detail="Event not found")
+
+    # An old version is gone for good; its URL must never serve new content.
+    if db_event.background_hash != background_hash:
+        raise HTTPException(status_code=404, detail="Background version not found")
+
+    return serve_event_background(
+        request,
+        db_event,
+        width,
+        image_format,
+        "private, max-age=31536000, immutable",
+    )
 
 
 @router.delete("/{event_uuid}/background")
@@ -206,18 +574,14 @@ def delete_background(
     if not db_event or db_event.organizer_id != current_user.user_id:
         raise HTTPException(status_code=404, detail="Event not found")
 
+    background_hash = db_event.background_hash
     file_extension = db_event.background_photo
     if not file_extension:
         raise HTTPException(
             status_code=404, detail="The event does not have a background photo"
         )
 
-    background_path = "./backgrounds"
-    file_path = os.path.join(background_path, f"{event_uuid}.{file_extension}")
-
-    if os.path.exists(file_path):
-        os.remove(file_path)
-
     events.delete_background(db, event_uuid)
+    release_background(db, background_hash, file_extension)
 
     return {"detail": "Background deleted successfully"}
@@ -1,16 +1,42 @@
+import asyncio
 from datetime import datetime
-from typing import Annotated
+from typing import Annotated, Literal
 
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import (APIRouter, Depends, HTTPException, Query, Request,
+                     Response, status)
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 
-from .. import schemas, utils
+from .. import fast_json, pagination, schemas, utils
+from ..batching import GroupCommitQueue
+from ..configuration import settings
 from ..crud import events, guests
+from ..database import SessionLocal
 from ..utils import get_db
+from .backgrounds import signed_background_url
 
 router = APIRouter(prefix="/guests")
 
 
+def apply_answer_batch(answers: list):
+    with SessionLocal() as db:
+        results = [
+            None if db_guest is None else schemas.Guest.model_validate(db_guest)
+            for db_guest in guests.apply_queued_answers(db, answers)
+        ]
+        db.commit()
+
+    return results
+
+
+answer_queue = GroupCommitQueue(
+    apply_answer_batch,
+    settings.rsvp_batch_size,
+    settings.rsvp_flush_interval,
+    "rsvp-writer",
+)
+
+
 @router.delete("/{guest_uuid}", response_model=schemas.Guest)
 def delete_guest(
     guest_uuid: str,
@@ -27,17 +53,56 @@ def delete_guest(
 
 
 @router.get("", response_model=list[schemas.Guest])
-def read_guests(skip: int = 0, limit: int = 100, db: Session = Depends(get_db)):
-    db_guests = guests.get_guests(db, skip=skip, limit=limit)
-    return db_guests
+def read_guests(
+    response: Response,
+    skip: int = Query(0, deprecated=True),
+    cursor: str | None = None,
+    limit: int = Query(100, ge=1, le=1000),
+    db: Session = Depends(get_db),
+):
+    after = pagination.decode_cursor(cursor, int)
+    db_guests = guests.get_guests(
+        db,
+        skip=skip,
+        limit=limit,
+        after=after[0] if after else None,
+        fields=fast_json.fields(schemas.Guest, extra=["guest_id"]),
+    )
+    return fast_json.page(
+        response,
+        db_guests,
+        limit,
+        lambda db_guest: (db_guest.guest_id,),
+        schemas.Guest,
+    )
 
 
 @router.get("/{guest_uuid}", response_model=schemas.Guest)
-def read_guest(guest_uuid: str, db: Session = Depends(get_db)):
+async def read_guest(
+    guest_uuid: str, db: Session | AsyncSession = Depends(utils.get_async_db)
+):
+    def read(db: Session):
+        db_guest = guests.get_guest(db, guest_uuid=guest_uuid)
+        if db_guest is None:
+            raise HTTPException(status_code=404, detail="User not found")
+        return schemas.Guest.model_validate(db_guest)
+
+    return await utils.run_db(db, read)
+
+
+@router.get("/{guest_uuid}/background_url", response_model=schemas.SignedUrl)
+def get_background_url(
+    guest_uuid: str,
+    request: Request,
+    width: int | None = Query(None, ge=1, le=4096),
+    image_format: Literal["webp", "jpeg"] | None = Query(None, alias="format"),
+    db: Session = Depends(get_db),
+):
     db_guest = guests.get_guest(db, guest_uuid=guest_uuid)
     if db_guest is None:
-        raise HTTPException(status_code=404, detail="User not found")
-    return db_guest
+        raise HTTPException(status_code=404, detail="Guest not found")
+
+    return signed_background_url(request, db_guest.event, width, image_format)
 
 
 @router.post("", response_model=schemas.Guest)
@@ -66,55 +131,66 @@ def create_event_guest(
 
 
 @router.post("/{guest_uuid}/answer", response_model=schemas.GuestAnswearResponse)
-def update_answear(
+async def update_answear(
     guest_uuid: str,
     guest_answer: schemas.GuestAnswear,
-    db: Session = Depends(get_db),
+    db: Session | AsyncSession = Depends(utils.get_async_db),
 ):
-    db_guest = guests.get_guest(db, guest_uuid)
+    def answer(db: Session):
+        row = guests.get_guest_for_answer(db, guest_uuid)
 
-    if not db_guest:
-        raise HTTPException(status_code=404, detail="Guest not found")
+        if not row:
+            raise HTTPException(status_code=404, detail="Guest not found")
 
-    if guests.get_primary_guest(db, db_guest.guest_id):
-        raise HTTPException(
-            status_code=status.HTTP_401_UNAUTHORIZED,
-            detail="Companion cannot change their answers",
-        )
+        db_guest, is_companion = row
 
-    if db_guest.event.decision_deadline < datetime.now():
-        raise HTTPException(
-            status.HTTP_406_NOT_ACCEPTABLE,
-            detail="After the deadline you cannot update your answer",
-        )
+        if is_companion:
+            raise HTTPException(
+                status_code=status.HTTP_401_UNAUTHORIZED,
+                detail="Companion cannot change their answers",
+            )
 
-    if guest_answer.answer is False:
-        guest_answer.menu = None
-    else:
-        menu = db_guest.event.menu.split(";")
-        if guest_answer.menu not in menu:
-            raise HTTPException(status_code=400, detail="Menu not found")
+        if db_guest.event.decision_deadline < datetime.now():
+            raise HTTPException(
+                status.HTTP_406_NOT_ACCEPTABLE,
+                detail="After the deadline you cannot update your answer",
+            )
 
-    companion_uuid = None
+        if guest_answer.answer is False:
+            guest_answer.menu = None
+        else:
+            menu = db_guest.event.menu.split(";")
+            if guest_answer.menu not in menu:
+                raise HTTPException(status_code=400, detail="Menu not found")
 
-    if db_guest.companion_id is not None:
-        db_companion = guests.get_guest_by_id(db, db_guest.companion_id)
-        companion_uuid = db_companion.uuid
+        response = {
+            "companion_uuid": (
+                db_guest.companion.uuid if db_guest.companion is not None else None
+            )
+        }
 
-        if db_guest.answer is False:
-            companion_answer = schemas.GuestAnswear(answer=False, menu="", comments="")
-            guests.update_guest_answear(db, db_companion.uuid, companion_answer)
+        if settings.rsvp_write_behind:
+            utils.release_connection(db)
+            return response, answer_queue.submit((guest_uuid, guest_answer))
+
+        guests.answer_invitation(db, db_guest, guest_answer)
+        db.commit()
+
+        return response, None
 
-    guests.update_guest_answear(db, guest_uuid, guest_answer)
+    response, queued = await utils.run_db(db, answer)
 
-    return {"companion_uuid": companion_uuid}
+    if queued is not None and await asyncio.wrap_future(queued) is None:
+        raise HTTPException(status_code=404, detail="Guest not found")
+
+    return response
 
 
 @router.post("/{companion_uuid}/companion_answer", response_model=schemas.Guest)
-def update_comapnion_data(
+async def update_comapnion_data(
     companion_uuid: str,
     companion_answer: schemas.CompanionAnswear,
-    db: Session = Depends(get_db),
+    db: Session | AsyncSession = Depends(utils.get_async_db),
 ):
     if companion_answer.answer:
         if companion_answer.name is None or companion_answer.surname is None:
@@ -123,34 +199,54 @@ def update_comapnion_data(
                 "You need to provide name and surname",
             )
 
-    db_companion = guests.get_guest(db, companion_uuid)
+    def answer(db: Session):
+        row = guests.get_companion_for_answer(db, companion_uuid)
 
-    if not db_companion:
-        raise HTTPException(status_code=404, detail="Companion guest not found")
+        if not row or row[1] is None:
+            raise HTTPException(status_code=404, detail="Companion guest not found")
 
-    db_guest = guests.get_primary_guest(db, db_companion.guest_id)
-    if db_guest.answer is None:
-        raise HTTPException(
-            status_code=status.HTTP_403_FORBIDDEN,
-            detail="Primary guest has to answer first",
-        )
+        db_companion, db_guest = row
 
-    if db_guest.answer is False:
-        raise HTTPException(
-            status.HTTP_403_FORBIDDEN,
-            detail="You cannot participate without primary guest",
-        )
+        if db_guest.answer is None:
+            raise HTTPException(
+                status_code=status.HTTP_403_FORBIDDEN,
+                detail="Primary guest has to answer first",
+            )
 
-    if db_guest.event.decision_deadline < datetime.now():
-        raise HTTPException(
-            status.HTTP_406_NOT_ACCEPTABLE,
-            detail="After the deadline you cannot update companion answer",
-        )
-    if companion_answer.answer is False:
-        companion_answer.menu = None
-    else:
-        menu = db_companion.event.menu.split(";")
-        if companion_answer.menu not in menu:
-            raise HTTPException(status_code=400, detail="Menu not found")
-
-    return guests.update_companion_answer(db, companion_uuid, companion_answer)
+        if db_guest.answer is False:
+            raise HTTPException(
+                status.HTTP_403_FORBIDDEN,
+                detail="You cannot participate without primary guest",
+            )
+
+        if db_companion.event.decision_deadline < datetime.now():
+            raise HTTPException(
+                status.HTTP_406_NOT_ACCEPTABLE,
+                detail="After the deadline you cannot update companion answer",
+            )
+        if companion_answer.answer is False:
+            companion_answer.menu = None
+        else:
+            menu = db_companion.event.menu.split(";")
+            if companion_answer.menu not in menu:
+                raise HTTPException(status_code=400, detail="Menu not found")
+
+        if settings.rsvp_write_behind:
+            utils.release_connection(db)
+            return None, answer_queue.submit((companion_uuid, companion_answer))
+
+        guests.apply_companion_answer(db, db_companion, companion_answer)
+        response = schemas.Guest.model_validate(db_companion)
+        db.commit()
+
+        return response, None
+
+    response, queued = await utils.run_db(db, answer)
+
+    if queued is not None:
+        response = await asyncio.wrap_future(queued)
+
+        if response is None:
+            raise HTTPException(status_code=404, detail="Companion guest not found")
+
+    return response
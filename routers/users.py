@@ -1,21 +1,29 @@
 from typing import Annotated
 
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, status
+from fastapi.concurrency import run_in_threadpool
 from sqlalchemy.orm import Session
 
-from .. import schemas, utils
-from ..crud import events, guests, users
+from .. import fast_json, schemas, utils
+from ..configuration import settings
+from ..crud import events, users
+from ..database import SessionLocal
 from ..utils import get_db
+from .backgrounds import release_background
 
 router = APIRouter(prefix="/users")
 
 
 @router.post("", response_model=schemas.User)
-def create_user(user: schemas.UserCreate, db: Session = Depends(get_db)):
-    db_user = users.get_user_by_email(db, email=user.email)
+async def create_user(user: schemas.UserCreate, db: Session = Depends(get_db)):
+    db_user = await run_in_threadpool(users.get_user_by_email, db, user.email)
     if db_user:
         raise HTTPException(status_code=400, detail="Email already registered")
-    return users.create_user(db=db, user=user)
+
+    utils.release_connection(db)
+    hashed_password = await utils.get_password_hash_async(user.password)
+
+    return await run_in_threadpool(users.create_user, db, user, hashed_password)
 
 
 @router.get("", response_model=list[schemas.User])
@@ -24,6 +32,12 @@ def read_users(
     db: Session = Depends(get_db),
 ):
 
+    if settings.fast_json:
+        return fast_json.users_response(
+            users.get_users(db, fields=fast_json.fields(schemas.User, ["events"])),
+            events.get_events(db, fields=fast_json.fields(schemas.Event)),
+        )
+
     db_users = users.get_users(db)
     return db_users
 
@@ -35,6 +49,20 @@ def read_users_me(
     return current_user
 
 
+@router.get("/deletion_jobs/{job_id}", response_model=schemas.UserDeletionJob)
+def read_deletion_job(
+    job_id: str,
+    current_user: Annotated[schemas.User, Depends(utils.get_current_user)],
+    db: Session = Depends(get_db),
+):
+    db_job = users.get_deletion_job(db, job_id)
+    if db_job is None or (
+        current_user.role != "admin" and current_user.user_id != db_job.user_id
+    ):
+        raise HTTPException(status_code=404, detail="Deletion job not found")
+    return db_job
+
+
 @router.get("/{user_id}", response_model=schemas.User)
 def read_user(
     _: Annotated[schemas.User, Depends(utils.get_admin_user)],
@@ -63,10 +91,22 @@ def change_role(
     users.change_role_by_user_uuid(db, role, user_uuid)
 
 
-@router.delete("/{user_uuid}")
+def run_deletion_job(job_id: str):
+    with SessionLocal() as db:
+        users.run_deletion_job(
+            db,
+            job_id,
+            settings.deletion_batch_size,
+            release_background,
+            settings.deletion_job_timeout,
+        )
+
+
+@router.delete("/{user_uuid}", status_code=status.HTTP_202_ACCEPTED)
 def delete_user(
     current_user: Annotated[schemas.User, Depends(utils.get_current_user)],
     user_uuid: str,
+    background_tasks: BackgroundTasks,
     db: Session = Depends(get_db),
 ):
     db_user = users.get_user_by_uuid(db, user_uuid)
@@ -80,14 +120,16 @@ def delete_user(
     if current_user.role == "admin" and current_user.user_id == db_user.user_id:
         raise HTTPException(status_code=401, detail="Admin can't remove theirselves")
 
-    db_events = events.get_event_by_organizer(db, db_user.user_id)
+    db_job = users.get_active_deletion_job(db, db_user.user_id)
 
-    for event in db_events:
-        guests.delete_participants_from_event(db, event.uuid)
-        events.delete_event(db, event.uuid)
+    if not db_job:
+        db_job = users.create_deletion_job(db, db_user.user_id)
 
-    users.delete_user(db, db_user.user_id)
+    # A job that is still making progress is left alone; one abandoned by a
+    # restarted worker is resumed.
+    background_tasks.add_task(run_deletion_job, db_job.job_id)
 
     return {
-        "detail": f"User <{user_uuid}> and their events and guests have been deleted successfully"
+        "detail": f"Deletion of user <{user_uuid}> and their events and guests has been scheduled",
+        "job_id": db_job.job_id,
     }
@@ -31,6 +31,8 @@ class Event(EventBase):
     event_id: int
     organizer_id: int
     uuid: str
+    background_hash: str | None = None
+    background_placeholder: str | None = None
 
     model_config = ConfigDict(from_attributes=True)
 
@@ -64,6 +66,16 @@ class User(UserBase):
     model_config = ConfigDict(from_attributes=True)
 
 
+class UserDeletionJob(BaseModel):
+    job_id: str
+    status: str
+    total_events: int
+    deleted_events: int
+    error: str | None = None
+
+    model_config = ConfigDict(from_attributes=True)
+
+
 class UserChangePassword(BaseModel):
     old_password: str
     new_password: str
@@ -104,6 +116,31 @@ class Guest(GuestBase):
     model_config = ConfigDict(from_attributes=True)
 
 
+class SignedUrl(BaseModel):
+    url: str
+    expires: int
+
+
+class BackgroundUploadCreate(BaseModel):
+    size: int
+    content_type: str
+
+
+class BackgroundUpload(BackgroundUploadCreate):
+    upload_id: str
+    offset: int
+
+
+class GuestImportError(BaseModel):
+    line: int
+    detail: str
+
+
+class GuestImportResult(BaseModel):
+    imported: int
+    errors: list[GuestImportError]
+
+
 class ForgetPasswordRequest(BaseModel):
     email: str
 
@@ -0,0 +1,37 @@
+import argparse
+import os
+
+import uvicorn
+
+from .configuration import settings
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument(
+        "--workers", type=int, default=settings.web_concurrency or os.cpu_count()
+    )
+    args = parser.parse_args()
+
+    # The schema belongs to `commands bootstrap`; workers only serve. Spawned
+    # workers load the settings from the environment, while a single worker
+    # runs in this process, where they are already loaded.
+    os.environ["AUTO_MIGRATE"] = "false"
+    settings.auto_migrate = False
+
+    uvicorn.run(
+        f"{__package__}.main:create_app",
+        factory=True,
+        host=args.host,
+        port=args.port,
+        workers=args.workers,
+        loop="uvloop",
+        http="httptools",
+        proxy_headers=True,
+    )
+
+
+if __name__ == "__main__":
+    main()
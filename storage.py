@@ -0,0 +1,115 @@
+import os
+import shutil
+import tempfile
+
+from fastapi.responses import FileResponse, StreamingResponse
+
+from .configuration import settings
+
+CHUNK_SIZE = 1024 * 1024
+
+
+class LocalStorage:
+    def __init__(self, root: str):
+        self.root = root
+
+    def path(self, key: str):
+        return os.path.join(self.root, key)
+
+    def exists(self, key: str):
+        return os.path.exists(self.path(key))
+
+    def put(self, key: str, file):
+        os.makedirs(self.root, exist_ok=True)
+
+        # Write next to the target and rename, so readers never see a partial
+        # file and a failed write leaves nothing behind.
+        fd, temp_path = tempfile.mkstemp(dir=self.root, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as destination:
+                shutil.copyfileobj(file, destination, CHUNK_SIZE)
+            os.replace(temp_path, self.path(key))
+        except BaseException:
+            os.remove(temp_path)
+            raise
+
+    def open(self, key: str):
+        return open(self.path(key), "rb")
+
+    def delete(self, key: str):
+        try:
+            os.remove(self.path(key))
+        except FileNotFoundError:
+            pass
+
+    def response(self, key: str, media_type: str, headers: dict, byte_range=None):
+        # FileResponse reads the Range header from the request itself.
+        return FileResponse(self.path(key), media_type=media_type, headers=headers)
+
+
+class S3Storage:
+    def __init__(self, bucket: str, prefix: str = "", client=None):
+        if client is None:
+            import boto3
+
+            client = boto3.client("s3", endpoint_url=settings.s3_endpoint_url)
+
+        self.client = client
+        self.bucket = bucket
+        self.prefix = prefix
+
+    def exists(self, key: str):
+        try:
+            self.client.head_object(Bucket=self.bucket, Key=self.prefix + key)
+        except Exception as exc:
+            error = getattr(exc, "response", {}).get("Error", {})
+            if error.get("Code") in ("404", "NoSuchKey", "NotFound"):
+                return False
+            raise
+
+        return True
+
+    def put(self, key: str, file):
+        # A single PUT replaces the object atomically.
+        self.client.upload_fileobj(file, self.bucket, self.prefix + key)
+
+    def open(self, key: str):
+        file = tempfile.SpooledTemporaryFile(max_size=CHUNK_SIZE)
+        self.client.download_fileobj(self.bucket, self.prefix + key, file)
+        file.seek(0)
+
+        return file
+
+    def delete(self, key: str):
+        self.client.delete_object(Bucket=self.bucket, Key=self.prefix + key)
+
+    def response(self, key: str, media_type: str, headers: dict, byte_range=None):
+        options = {"Range": byte_range} if byte_range else {}
+        s3_object = self.client.get_object(
+            Bucket=self.bucket, Key=self.prefix + key, **options
+        )
+
+        headers = {
+            **headers,
+            "Accept-Ranges": "bytes",
+            "Content-Length": str(s3_object["ContentLength"]),
+        }
+        status_code = 200
+
+        if byte_range and "ContentRange" in s3_object:
+            headers["Content-Range"] = s3_object["ContentRange"]
+            status_code = 206
+
+        return StreamingResponse(
+            s3_object["Body"].iter_chunks(CHUNK_SIZE),
+            status_code=status_code,
+            headers=headers,
+            media_type=media_type,
+        )
+
+
+def create_storage():
+    if settings.storage_backend == "s3":
+        return S3Storage(settings.s3_bucket, settings.s3_prefix)
+
+    return LocalStorage(settings.background_path)
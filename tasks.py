@@ -1,5 +1,9 @@
+import os.path
+
 from invoke import task
 
+PACKAGE = os.path.basename(os.path.dirname(os.path.abspath(__file__)))
+
 
 @task
 def lint(c):
@@ -13,9 +17,35 @@ def populate(c):
     c.run("python populate_database.py")
 
 
+@task
+def reconcile_stats(c, dry_run=False):
+    c.run(
+        f"python -m {PACKAGE}.commands reconcile-stats"
+        + (" --dry-run" if dry_run else ""),
+        env={"PYTHONPATH": ".."},
+    )
+
+
 @task
 def run(c):
-    c.run("fastapi dev main.py")
+    c.run(
+        f"uvicorn {PACKAGE}.main:create_app --factory --reload",
+        env={"PYTHONPATH": ".."},
+    )
+
+
+@task
+def bootstrap(c):
+    c.run(f"python -m {PACKAGE}.commands bootstrap", env={"PYTHONPATH": ".."})
+
+
+@task(pre=[bootstrap])
+def serve(c, host="127.0.0.1", port=8000, workers=None):
+    c.run(
+        f"python -m {PACKAGE}.server --host {host} --port {port}"
+        + (f" --workers {workers}" if workers else ""),
+        env={"PYTHONPATH": ".."},
+    )
 
 
 @task
@@ -26,3 +56,8 @@ def reqs(c):
 @task
 def test(c):
     c.run("pytest")
+
+
+@task
+def bench(c):
+    c.run("pytest -s benchmarks/bench_*.py")
@@ -1,13 +1,35 @@
+import base64
+import csv
+import hashlib
+import io
+import json
+import os
+import subprocess
+import sys
+import time
+
+import openpyxl
 import pytest
 from fastapi.testclient import TestClient
+from PIL import Image, PngImagePlugin
+from sqlalchemy import event, update
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.exc import IntegrityError
 
+from .. import images, models, signing, storage
 from ..configuration import settings
+from ..crud import events as crud_events
+from ..crud import guests as crud_guests
+from ..crud import stats, users
+from ..database import SessionLocal, engine
+from ..routers.backgrounds import prepare_background
 from . import test_utils
 
 settings.sqlalchemy_database_url = "sqlite:///./sql_app_test.db"
 
-from ..main import app  # noqa: E402
+from ..main import create_app  # noqa: E402
 
+app = create_app()
 client = TestClient(app)
 
 user_1 = {"email": "test_user", "password": "123"}
@@ -323,3 +345,1052 @@ def get_events():
     events = response.json()
     assert len(events) == 1
     assert events[0]["name"] == event_1["name"]
+
+
+def test_get_event_stats_groups_answers_and_menus():
+    test_utils.create_user(client=client, user=user_1)
+    token = test_utils.login_user(client=client, user=user_1)
+    response = test_utils.create_event(
+        client=client,
+        event={**event_1, "decision_deadline": "2050-11-28T12:00:00"},
+        token=token,
+    )
+    event_uuid = response.json()["uuid"]
+
+    guest_uuids = [
+        test_utils.create_guest(client, dict(guest), event_uuid, token).json()["uuid"]
+        for guest in [guest_1, guest_1, guest_1]
+    ]
+
+    client.post(f"/guests/{guest_uuids[0]}/answer", json=guest_answer)
+    client.post(f"/guests/{guest_uuids[1]}/answer", json={"answer": False})
+
+    response = client.get(
+        f"/events/{event_uuid}/stats",
+        headers={
+            "Authorization": f"Bearer {token}",
+        },
+    )
+
+    assert response.status_code == 200
+    assert response.json() == {
+        "sum_true": 1,
+        "sum_false": 1,
+        "sum_unkown": 1,
+        "menu_answers": {"Wegetariańskie": 1, "null": 2},
+    }
+
+
+def test_reconcile_event_stats_reports_and_fixes_drift():
+    test_utils.create_user(client=client, user=user_1)
+    token = test_utils.login_user(client=client, user=user_1)
+    response = test_utils.create_event(
+        client=client,
+        event={**event_1, "decision_deadline": "2050-11-28T12:00:00"},
+        token=token,
+    )
+    event_uuid = response.json()["uuid"]
+
+    guest_uuid = test_utils.create_guest(client, dict(guests[0]), event_uuid, token)
+    guest_uuid = guest_uuid.json()["uuid"]
+    client.post(f"/guests/{guest_uuid}/answer", json=guest_answer)
+
+    db = SessionLocal()
+    assert stats.reconcile_event_stats(db) == []
+
+    db.execute(update(models.Guest).values(answer=False, menu=None))
+    db.commit()
+
+    drift = stats.reconcile_event_stats(db)
+    assert {(row["answer"], row["expected"], row["counted"]) for row in drift} == {
+        (True, 0, 1),
+        (False, 2, 0),
+        (None, 0, 1),
+    }
+    assert stats.reconcile_event_stats(db, fix=False) == []
+    db.close()
+
+    response = client.get(
+        f"/events/{event_uuid}/stats",
+        headers={
+            "Authorization": f"Bearer {token}",
+        },
+    )
+
+    assert response.json()["sum_false"] == 2
+
+
+def test_answer_counts_keep_one_row_per_key():
+    test_utils.create_user(client=client, user=user_1)
+    token = test_utils.login_user(client=client, user=user_1)
+    response = test_utils.create_event(client=client, event=event_1, token=token)
+    event_uuid = response.json()["uuid"]
+
+    with SessionLocal() as db:
+        event_id = crud_events.get_event(db, event_uuid).event_id
+
+        # Two moves into the same new key within one transaction.
+        for answer, menu in [(None, None), (True, "Mięsne")] * 2:
+            stats.adjust_answer_count(db, event_id, answer, menu, 1)
+        db.commit()
+
+        rows = db.query(
+            models.EventAnswerCount.answer,
+            models.EventAnswerCount.menu,
+            models.EventAnswerCount.count,
+        ).all()
+
+    assert sorted(rows, key=str) == [(None, None, 2), (True, "Mięsne", 2)]
+
+
+class PostgresSession:
+    def __init__(self):
+        self.dialect = postgresql.dialect()
+        self.statements = []
+
+    def get_bind(self):
+        return self
+
+    def execute(self, statement):
+        self.statements.append(str(statement.compile(dialect=self.dialect)))
+
+
+def test_answer_count_upsert_compiles_for_postgres():
+    db = PostgresSession()
+    stats.adjust_answer_count(db, 1, None, None, 1)
+
+    (statement,) = db.statements
+    # Postgres rejects a bare `menu IS NULL` in the conflict target.
+    assert (
+        "ON CONFLICT (event_id, coalesce(CAST(answer AS INTEGER), -1), "
+        "coalesce(menu, ''), (menu IS NULL)) DO UPDATE"
+    ) in statement
+
+
+def test_get_events_with_cursor_pagination():
+    test_utils.create_user(client=client, user=user_1)
+    token = test_utils.login_user(client=client, user=user_1)
+
+    for start_time in ["2024-12-07T14:00:00", "2024-12-05T14:00:00", "2024-12-06"]:
+        test_utils.create_event(
+            client=client, event={**event_1, "start_time": start_time}, token=token
+        )
+
+    headers = {"Authorization": f"Bearer {token}"}
+
+    response = client.get("/events?limit=2", headers=headers)
+    assert response.status_code == 200
+    assert [event["start_time"] for event in response.json()] == [
+        "2024-12-05T14:00:00",
+        "2024-12-06T00:00:00",
+    ]
+
+    cursor = response.headers["X-Next-Cursor"]
+    response = client.get(f"/events?limit=2&cursor={cursor}", headers=headers)
+    assert [event["start_time"] for event in response.json()] == ["2024-12-07T14:00:00"]
+    assert "X-Next-Cursor" not in response.headers
+
+    response = client.get(
+        "/events?start_after=2024-12-06T00:00:00&location=Warszawa", headers=headers
+    )
+    assert len(response.json()) == 2
+
+    response = client.get("/events?cursor=broken", headers=headers)
+    assert response.status_code == 400
+
+
+def test_fast_json_list_responses_match_default(monkeypatch):
+    test_utils.create_admin(SessionLocal(), client, user_1)
+    token = test_utils.login_user(client=client, user=user_1)
+    headers = {"Authorization": f"Bearer {token}"}
+
+    for new_event in [event_1, {**event_1, "is_public": True, "description": None}]:
+        response = test_utils.create_event(client=client, event=new_event, token=token)
+    event_uuid = response.json()["uuid"]
+
+    for guest in guests:
+        test_utils.create_guest(client, dict(guest), event_uuid, token)
+
+    urls = [
+        "/events?limit=1",
+        "/events/public",
+        f"/events/{event_uuid}/guests?limit=2",
+        f"/events/{event_uuid}/guests?answer=unknown",
+        "/guests?limit=2",
+        "/users",
+    ]
+
+    def get_all():
+        responses = [client.get(url, headers=headers) for url in urls]
+        assert all(response.status_code == 200 for response in responses)
+        return [
+            (response.json(), response.headers.get("X-Next-Cursor"))
+            for response in responses
+        ]
+
+    default_responses = get_all()
+    monkeypatch.setattr(settings, "fast_json", True)
+
+    assert get_all() == default_responses
+    assert default_responses[0][1] is not None
+    assert default_responses[5][0][0]["events"] != []
+
+
+def test_delete_event_with_guests_uses_set_based_deletes():
+    test_utils.create_user(client=client, user=user_1)
+    token = test_utils.login_user(client=client, user=user_1)
+    response = test_utils.create_event(client=client, event=event_1, token=token)
+    event_uuid = response.json()["uuid"]
+
+    for guest in guests:
+        test_utils.create_guest(client, dict(guest), event_uuid, token)
+
+    statements = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(engine, "before_cursor_execute", record)
+    try:
+        response = client.delete(
+            f"/events/{event_uuid}",
+            headers={
+                "Authorization": f"Bearer {token}",
+            },
+        )
+    finally:
+        event.remove(engine, "before_cursor_execute", record)
+
+    assert response.status_code == 200
+    assert response.json()["uuid"] == event_uuid
+    assert len([s for s in statements if s.startswith("DELETE")]) == 3
+
+    response = client.get(
+        "/guests",
+        headers={
+            "Authorization": f"Bearer {token}",
+        },
+    )
+    assert response.json() == []
+
+
+def test_import_guests_from_csv_and_ndjson():
+    test_utils.create_user(client=client, user=user_1)
+    token = test_utils.login_user(client=client, user=user_1)
+    response = test_utils.create_event(client=client, event=event_1, token=token)
+    event_uuid = response.json()["uuid"]
+
+    csv_body = (
+        "name,surname,email,phone,has_companion\r\n"
+        'Karolina,Kowalska,karkowal@gmail.com,"+48 765,456",true\r\n'
+        "Michał,Nowak,michalnowak@gmail.com,+48783467582,\r\n"
+        "Anna,,anna@gmail.com,+48111222333,\r\n"
+        "Jan,Kowalski\r\n"
+    )
+    response = client.post(
+        f"/events/{event_uuid}/guests/import",
+        content=csv_body.encode(),
+        headers={
+            "Authorization": f"Bearer {token}",
+            "Content-Type": "text/csv",
+        },
+    )
+
+    assert response.status_code == 200
+    assert response.json()["imported"] == 2
+    assert [error["line"] for error in response.json()["errors"]] == [4, 5]
+    assert response.json()["errors"][0]["detail"].startswith("surname:")
+
+    ndjson_body = "\n".join(
+        [json.dumps(guests[1]), "{not json", json.dumps({**guest_1, "phone": "1"})]
+    )
+    response = client.post(
+        f"/events/{event_uuid}/guests/import",
+        content=ndjson_body.encode(),
+        headers={
+            "Authorization": f"Bearer {token}",
+            "Content-Type": "application/x-ndjson",
+        },
+    )
+
+    assert response.status_code == 200
+    assert response.json()["imported"] == 2
+    assert [error["line"] for error in response.json()["errors"]] == [2]
+
+    response = client.get(
+        f"/events/{event_uuid}/guests",
+        headers={
+            "Authorization": f"Bearer {token}",
+        },
+    )
+    event_guests = response.json()
+
+    # The first CSV guest brought a companion.
+    assert len(event_guests) == 5
+    assert "+48 765,456" in {guest["phone"] for guest in event_guests}
+
+    db = SessionLocal()
+    assert stats.reconcile_event_stats(db, fix=False) == []
+    db.close()
+
+    response = client.post(
+        f"/events/{event_uuid}/guests/import",
+        content=b"[]",
+        headers={
+            "Authorization": f"Bearer {token}",
+            "Content-Type": "application/json",
+        },
+    )
+    assert response.status_code == 415
+
+
+def test_import_reports_only_the_rows_that_could_not_be_stored(monkeypatch):
+    test_utils.create_user(client=client, user=user_1)
+    token = test_utils.login_user(client=client, user=user_1)
+    response = test_utils.create_event(client=client, event=event_1, token=token)
+    event_uuid = response.json()["uuid"]
+
+    create_event_guests = crud_guests.create_event_guests
+
+    def fail_on_bad_guest(db, event_guests, event_id):
+        if any(guest.name == "Bad" for guest in event_guests):
+            raise IntegrityError("INSERT", {}, Exception("bad guest"))
+
+        return create_event_guests(db, event_guests, event_id)
+
+    monkeypatch.setattr(crud_guests, "create_event_guests", fail_on_bad_guest)
+    monkeypatch.setattr(settings, "guest_import_batch_size", 3)
+
+    ndjson_body = "\n".join(
+        json.dumps({**guests[1], "name": name})
+        for name in ["First", "Bad", "Third", "Fourth"]
+    )
+    response = client.post(
+        f"/events/{event_uuid}/guests/import",
+        content=ndjson_body.encode(),
+        headers={
+            "Authorization": f"Bearer {token}",
+            "Content-Type": "application/x-ndjson",
+        },
+    )
+
+    assert response.status_code == 200
+    assert response.json()["imported"] == 3
+    assert response.json()["errors"] == [
+        {"line": 2, "detail": "Guest could not be stored"}
+    ]
+
+    response = client.get(
+        f"/events/{event_uuid}/guests",
+        headers={
+            "Authorization": f"Bearer {token}",
+        },
+    )
+    assert sorted(guest["name"] for guest in response.json()) == [
+        "First",
+        "Fourth",
+        "Third",
+    ]
+
+    db = SessionLocal()
+    assert stats.reconcile_event_stats(db, fix=False) == []
+    db.close()
+
+
+def test_export_guests_as_csv_and_xlsx():
+    test_utils.create_user(client=client, user=user_1)
+    token = test_utils.login_user(client=client, user=user_1)
+    response = test_utils.create_event(client=client, event=event_1, token=token)
+    event_uuid = response.json()["uuid"]
+
+    for guest in guests:
+        test_utils.create_guest(client, dict(guest), event_uuid, token)
+
+    response = client.get(
+        f"/events/{event_uuid}/guests/export",
+        headers={
+            "Authorization": f"Bearer {token}",
+        },
+    )
+
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/csv")
+    rows = list(csv.reader(io.StringIO(response.text)))
+    assert rows[0] == [
+        "name",
+        "surname",
+        "email",
+        "phone",
+        "answer",
+        "menu",
+        "comments",
+    ]
+    # The first guest has a companion, which is created before them.
+    assert [row[0] for row in rows[1:]] == ["", "Karolina", "Michał"]
+    assert {row[4] for row in rows[1:]} == {"unknown"}
+
+    response = client.get(
+        f"/events/{event_uuid}/guests/export",
+        params={"format": "xlsx"},
+        headers={
+            "Authorization": f"Bearer {token}",
+        },
+    )
+
+    assert response.status_code == 200
+    sheet = openpyxl.load_workbook(io.BytesIO(response.content)).active
+    assert [
+        [cell or "" for cell in row] for row in sheet.iter_rows(values_only=True)
+    ] == rows
+
+    test_utils.create_user(client=client, user=user_2)
+    token_2 = test_utils.login_user(client=client, user=user_2)
+    response = client.get(
+        f"/events/{event_uuid}/guests/export",
+        headers={
+            "Authorization": f"Bearer {token_2}",
+        },
+    )
+    assert response.status_code == 404
+
+
+def wait_for_image_pool():
+    deadline = time.monotonic() + 10
+    while images.image_pool.stats()["in_flight"] and time.monotonic() < deadline:
+        time.sleep(0.01)
+
+
+def test_background_variants(monkeypatch, tmp_path):
+    monkeypatch.setattr(images, "storage", storage.LocalStorage(str(tmp_path)))
+
+    test_utils.create_user(client=client, user=user_1)
+    token = test_utils.login_user(client=client, user=user_1)
+    response = test_utils.create_event(client=client, event=event_1, token=token)
+    event_uuid = response.json()["uuid"]
+    headers = {"Authorization": f"Bearer {token}"}
+
+    upload = io.BytesIO()
+    Image.new("RGBA", (1000, 600), "red").save(upload, "PNG")
+
+    response = client.post(
+        f"/events/{event_uuid}/background",
+        files={"file": ("background.png", upload.getvalue(), "image/png")},
+        headers=headers,
+    )
+    assert response.status_code == 200
+    wait_for_image_pool()
+    background_hash = hashlib.sha256(upload.getvalue()).hexdigest()
+
+    assert sorted(os.listdir(tmp_path)) == [
+        f"{background_hash}-{width}.{image_format}"
+        for width in (1920, 320, 768)
+        for image_format in ("jpeg", "webp")
+    ] + [f"{background_hash}.placeholder", f"{background_hash}.png"]
+
+    placeholder = client.get(f"/events/{event_uuid}").json()["background_placeholder"]
+    prefix = "data:image/webp;base64,"
+    assert placeholder.startswith(prefix)
+    assert len(placeholder) < 1024
+    preview = Image.open(io.BytesIO(base64.b64decode(placeholder.removeprefix(prefix))))
+    assert preview.size == (16, 10)
+
+    response = client.get(
+        f"/events/{event_uuid}/background",
+        params={"width": 500},
+        headers={**headers, "Accept": "image/webp,*/*"},
+    )
+    assert response.headers["content-type"] == "image/webp"
+    assert Image.open(io.BytesIO(response.content)).size == (768, 461)
+
+    response = client.get(
+        f"/events/{event_uuid}/background",
+        params={"width": 4000, "format": "jpeg"},
+        headers=headers,
+    )
+    assert response.headers["content-type"] == "image/jpeg"
+    # Variants are never upscaled past the original.
+    assert Image.open(io.BytesIO(response.content)).size == (1000, 600)
+
+    response = client.get(f"/events/{event_uuid}/background", headers=headers)
+    assert response.headers["content-type"] == "image/png"
+    assert response.content == upload.getvalue()
+
+    response = client.delete(f"/events/{event_uuid}/background", headers=headers)
+    assert response.status_code == 200
+    assert os.listdir(tmp_path) == []
+
+
+def upload_background(event_uuid, token, content, content_type="image/png"):
+    return client.post(
+        f"/events/{event_uuid}/background",
+        files={"file": ("background", content, content_type)},
+        headers={"Authorization": f"Bearer {token}"},
+    )
+
+
+def test_background_metadata_is_stripped(monkeypatch, tmp_path):
+    monkeypatch.setattr(images, "storage", storage.LocalStorage(str(tmp_path)))
+
+    test_utils.create_user(client=client, user=user_1)
+    token = test_utils.login_user(client=client, user=user_1)
+    headers = {"Authorization": f"Bearer {token}"}
+
+    exif = Image.Exif()
+    exif[271] = "SecretCam"
+    exif[34853] = {1: "N", 2: (52.0, 13.0, 0.0)}
+    png_info = PngImagePlugin.PngInfo()
+    png_info.add_text("Comment", "SecretCam")
+
+    uploads = {}
+    for file_extension, options in [
+        ("jpeg", {"exif": exif, "comment": b"SecretCam"}),
+        ("png", {"exif": exif, "pnginfo": png_info}),
+        ("webp", {"exif": exif, "xmp": b"<x:xmpmeta>SecretCam</x:xmpmeta>"}),
+    ]:
+        upload = io.BytesIO()
+        Image.new("RGB", (400, 300), "red").save(upload, file_extension, **options)
+        uploads[file_extension] = upload.getvalue()
+        assert b"SecretCam" in uploads[file_extension]
+
+        event_uuid = test_utils.create_event(
+            client=client, event=event_1, token=token
+        ).json()["uuid"]
+        response = upload_background(
+            event_uuid, token, uploads[file_extension], f"image/{file_extension}"
+        )
+        assert response.status_code == 200
+        wait_for_image_pool()
+
+        response = client.get(f"/events/{event_uuid}/background", headers=headers)
+        assert response.headers["content-type"] == f"image/{file_extension}"
+        assert b"SecretCam" not in response.content
+
+        with Image.open(io.BytesIO(response.content)) as image:
+            assert not image.getexif()
+            assert image.size == (400, 300)
+            image.load()
+
+
+def test_failed_variant_generation_is_logged(monkeypatch, tmp_path, caplog):
+    monkeypatch.setattr(images, "storage", storage.LocalStorage(str(tmp_path)))
+
+    test_utils.create_user(client=client, user=user_1)
+    token = test_utils.login_user(client=client, user=user_1)
+    response = test_utils.create_event(client=client, event=event_1, token=token)
+    event_uuid = response.json()["uuid"]
+
+    upload = io.BytesIO()
+    Image.effect_noise((1000, 600), 64).save(upload, "PNG")
+
+    # The header is intact, so the upload is accepted; decoding fails later.
+    response = upload_background(event_uuid, token, upload.getvalue()[:2000])
+    assert response.status_code == 200
+    wait_for_image_pool()
+
+    (record,) = [record for record in caplog.records if record.name.endswith(".pools")]
+    assert record.getMessage() == "prepare_background failed in the image pool"
+    assert client.get(f"/events/{event_uuid}").json()["background_placeholder"] is None
+
+
+def test_background_upload_is_validated_from_the_header(monkeypatch, tmp_path):
+    monkeypatch.setattr(images, "storage", storage.LocalStorage(str(tmp_path)))
+
+    test_utils.create_user(client=client, user=user_1)
+    token = test_utils.login_user(client=client, user=user_1)
+    response = test_utils.create_event(client=client, event=event_1, token=token)
+    event_uuid = response.json()["uuid"]
+
+    png = io.BytesIO()
+    Image.new("RGB", (1000, 600), "red").save(png, "PNG")
+
+    response = client.post(
+        f"/events/{event_uuid}/background",
+        content=b"0" * (settings.max_background_size + 65 * 1024),
+        headers={
+            "Authorization": f"Bearer {token}",
+            "Content-Type": "multipart/form-data; boundary=x",
+        },
+    )
+    assert response.status_code == 413
+
+    response = client.post(
+        f"/events/{event_uuid}/background",
+        content=png.getvalue(),
+        headers={
+            "Authorization": f"Bearer {token}",
+            "Content-Type": "multipart/form-data; boundary=x",
+            "Content-Length": "ten",
+        },
+    )
+    assert response.status_code == 400
+    assert response.json()["detail"] == "Invalid Content-Length header"
+
+    response = upload_background(event_uuid, token, png.getvalue(), "image/jpeg")
+    assert response.status_code == 406
+
+    response = upload_background(event_uuid, token, b"not an image")
+    assert response.status_code == 406
+
+    monkeypatch.setattr(settings, "max_background_pixels", 500_000)
+    response = upload_background(event_uuid, token, png.getvalue())
+    assert response.status_code == 406
+    assert os.listdir(tmp_path) == []
+
+
+def test_png_and_webp_backgrounds_have_a_lower_pixel_limit(monkeypatch, tmp_path):
+    monkeypatch.setattr(images, "storage", storage.LocalStorage(str(tmp_path)))
+
+    test_utils.create_user(client=client, user=user_1)
+    token = test_utils.login_user(client=client, user=user_1)
+    response = test_utils.create_event(client=client, event=event_1, token=token)
+    event_uuid = response.json()["uuid"]
+
+    # Within MAX_BACKGROUND_PIXELS, but PNG and WebP are decoded at full size.
+    size = (5000, 4000)
+    assert size[0] * size[1] <= settings.max_background_pixels
+
+    for image_format in ["PNG", "WEBP"]:
+        content = io.BytesIO()
+        Image.new("RGB", size, "red").save(content, image_format)
+
+        response = upload_background(
+            event_uuid, token, content.getvalue(), f"image/{image_format.lower()}"
+        )
+        assert response.status_code == 406
+        assert str(settings.max_decoded_background_pixels) in response.json()["detail"]
+
+    assert os.listdir(tmp_path) == []
+
+    # JPEG is drafted to the largest variant, so the full limit applies.
+    assert images.max_pixels("jpeg") == settings.max_background_pixels
+
+
+MEASURE_RSS = """
+import resource, sys
+from {package} import images
+
+before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+images.generate_variants(sys.argv[1], "jpeg")
+print((resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - before) * 1024)
+"""
+
+
+@pytest.mark.skipif(sys.platform != "linux", reason="ru_maxrss is in KiB on Linux")
+def test_variant_generation_peak_rss_is_bounded(tmp_path):
+    width, height = 8000, 6000
+    background_hash = "0" * 64
+    source_path = tmp_path / images.original_key(background_hash, "jpeg")
+    Image.new("RGB", (width, height), "red").save(source_path, "JPEG")
+
+    package = __package__.rsplit(".", 1)[0]
+    result = subprocess.run(
+        [sys.executable, "-c", MEASURE_RSS.format(package=package), background_hash],
+        cwd=tmp_path,
+        env={
+            **os.environ,
+            "PYTHONPATH": os.path.dirname(os.path.dirname(images.__file__)),
+            "BACKGROUND_PATH": str(tmp_path),
+        },
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+
+    # Decoding the full image alone would take width * height * 3 bytes.
+    assert int(result.stdout) < width * height * 3 // 2
+
+
+def test_background_caching_headers(monkeypatch, tmp_path):
+    monkeypatch.setattr(images, "storage", storage.LocalStorage(str(tmp_path)))
+
+    test_utils.create_user(client=client, user=user_1)
+    token = test_utils.login_user(client=client, user=user_1)
+    response = test_utils.create_event(client=client, event=event_1, token=token)
+    event_uuid = response.json()["uuid"]
+    headers = {"Authorization": f"Bearer {token}"}
+
+    png = io.BytesIO()
+    Image.new("RGB", (1000, 600), "red").save(png, "PNG")
+    background_hash = hashlib.sha256(png.getvalue()).hexdigest()
+
+    response = upload_background(event_uuid, token, png.getvalue())
+    assert (
+        response.json()["url"] == f"/events/{event_uuid}/background/{background_hash}"
+    )
+    wait_for_image_pool()
+
+    response = client.get(f"/events/{event_uuid}/background", headers=headers)
+    assert response.headers["etag"] == f'"{background_hash}"'
+    assert response.headers["cache-control"] == "no-cache"
+
+    response = client.get(
+        f"/events/{event_uuid}/background",
+        headers={**headers, "If-None-Match": f'W/"other", "{background_hash}"'},
+    )
+    assert response.status_code == 304
+    assert response.content == b""
+
+    response = client.get(
+        f"/events/{event_uuid}/background",
+        headers={**headers, "Range": "bytes=0-7"},
+    )
+    assert response.status_code == 206
+    assert response.content == png.getvalue()[:8]
+
+    response = client.get(
+        f"/events/{event_uuid}/background/{background_hash}",
+        params={"width": 320, "format": "webp"},
+        headers=headers,
+    )
+    assert response.status_code == 200
+    assert response.headers["etag"] == f'"{background_hash}-320.webp"'
+    assert "immutable" in response.headers["cache-control"]
+
+    response = client.get(
+        f"/events/{event_uuid}/background/{'0' * 64}", headers=headers
+    )
+    assert response.status_code == 404
+
+
+def test_signed_background_urls_skip_the_database(monkeypatch, tmp_path):
+    monkeypatch.setattr(images, "storage", storage.LocalStorage(str(tmp_path)))
+
+    test_utils.create_user(client=client, user=user_1)
+    token = test_utils.login_user(client=client, user=user_1)
+    response = test_utils.create_event(client=client, event=event_1, token=token)
+    event_uuid = response.json()["uuid"]
+    guest_uuid = test_utils.create_guest(client, dict(guest_1), event_uuid, token)
+    guest_uuid = guest_uuid.json()["uuid"]
+
+    png = io.BytesIO()
+    Image.new("RGB", (1000, 600), "red").save(png, "PNG")
+    upload_background(event_uuid, token, png.getvalue())
+    wait_for_image_pool()
+
+    response = client.get(
+        f"/events/{event_uuid}/background_url",
+        params={"width": 320, "format": "webp"},
+        headers={"Authorization": f"Bearer {token}"},
+    )
+    url = response.json()["url"]
+    assert response.json()["expires"] > time.time() + settings.signed_url_ttl - 1
+
+    statements = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(engine, "before_cursor_execute", record)
+    try:
+        response = client.get(url)
+    finally:
+        event.remove(engine, "before_cursor_execute", record)
+
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "image/webp"
+    assert "public" in response.headers["cache-control"]
+    assert statements == []
+
+    response = client.get(url, headers={"If-None-Match": response.headers["etag"]})
+    assert response.status_code == 304
+
+    response = client.get(url.replace("320.webp", "1920.webp"))
+    assert response.status_code == 403
+
+    path = url.split("?")[0]
+    expires = int(time.time()) - 1
+    response = client.get(
+        path, params={"expires": expires, "signature": signing.sign(path, expires)}
+    )
+    assert response.status_code == 403
+
+    response = client.get(f"/guests/{guest_uuid}/background_url")
+    assert response.status_code == 200
+    response = client.get(response.json()["url"])
+    assert response.content == png.getvalue()
+
+
+def test_identical_backgrounds_are_stored_once(monkeypatch, tmp_path):
+    monkeypatch.setattr(images, "storage", storage.LocalStorage(str(tmp_path)))
+
+    test_utils.create_user(client=client, user=user_1)
+    token = test_utils.login_user(client=client, user=user_1)
+    headers = {"Authorization": f"Bearer {token}"}
+    event_uuids = [
+        test_utils.create_event(client=client, event=event_1, token=token).json()[
+            "uuid"
+        ]
+        for _ in range(2)
+    ]
+
+    png = io.BytesIO()
+    Image.new("RGB", (1000, 600), "red").save(png, "PNG")
+    background_hash = hashlib.sha256(png.getvalue()).hexdigest()
+
+    for event_uuid in event_uuids:
+        upload_background(event_uuid, token, png.getvalue())
+        wait_for_image_pool()
+
+    # The second upload reuses the placeholder without generating anything.
+    placeholders = {
+        client.get(f"/events/{event_uuid}").json()["background_placeholder"]
+        for event_uuid in event_uuids
+    }
+    assert len(placeholders) == 1 and None not in placeholders
+
+    keys = sorted(images.background_keys(background_hash, "png"))
+    assert sorted(os.listdir(tmp_path)) == keys
+
+    response = client.delete(f"/events/{event_uuids[0]}/background", headers=headers)
+    assert response.status_code == 200
+    assert sorted(os.listdir(tmp_path)) == keys
+
+    response = client.get(f"/events/{event_uuids[1]}/background", headers=headers)
+    assert response.content == png.getvalue()
+
+    # Replacing the last reference releases the old image.
+    other = io.BytesIO()
+    Image.new("RGB", (1000, 600), "blue").save(other, "PNG")
+    other_hash = hashlib.sha256(other.getvalue()).hexdigest()
+    upload_background(event_uuids[1], token, other.getvalue())
+    wait_for_image_pool()
+    assert sorted(os.listdir(tmp_path)) == sorted(
+        images.background_keys(other_hash, "png")
+    )
+
+    response = client.delete(f"/events/{event_uuids[1]}", headers=headers)
+    assert response.status_code == 200
+    assert os.listdir(tmp_path) == []
+
+
+def test_deleting_an_account_releases_its_backgrounds(monkeypatch, tmp_path):
+    monkeypatch.setattr(images, "storage", storage.LocalStorage(str(tmp_path)))
+
+    test_utils.create_user(client=client, user=user_1)
+    token = test_utils.login_user(client=client, user=user_1)
+
+    for color in ["red", "blue"]:
+        event_uuid = test_utils.create_event(
+            client=client, event=event_1, token=token
+        ).json()["uuid"]
+        png = io.BytesIO()
+        Image.new("RGB", (1000, 600), color).save(png, "PNG")
+        upload_background(event_uuid, token, png.getvalue())
+        wait_for_image_pool()
+
+    assert len(os.listdir(tmp_path)) == 2 * len(images.background_keys("0", "png"))
+
+    with SessionLocal() as db:
+        user_uuid = users.get_user_by_email(db, user_1["email"]).uuid
+
+    response = client.delete(
+        f"/users/{user_uuid}", headers={"Authorization": f"Bearer {token}"}
+    )
+    assert response.status_code == 202
+    assert os.listdir(tmp_path) == []
+
+
+def test_background_released_during_upload_is_restored(monkeypatch, tmp_path):
+    monkeypatch.setattr(images, "storage", storage.LocalStorage(str(tmp_path)))
+
+    test_utils.create_user(client=client, user=user_1)
+    token = test_utils.login_user(client=client, user=user_1)
+    event_uuids = [
+        test_utils.create_event(client=client, event=event_1, token=token).json()[
+            "uuid"
+        ]
+        for _ in range(2)
+    ]
+
+    png = io.BytesIO()
+    Image.new("RGB", (1000, 600), "red").save(png, "PNG")
+    background_hash = hashlib.sha256(png.getvalue()).hexdigest()
+
+    upload_background(event_uuids[0], token, png.getvalue())
+    wait_for_image_pool()
+
+    # The first event's release commits after the second upload found the blob
+    # but before its reference is committed.
+    add_background = crud_events.add_background
+
+    def add_background_after_release(db, *args):
+        images.remove_background(background_hash, "png")
+        return add_background(db, *args)
+
+    monkeypatch.setattr(crud_events, "add_background", add_background_after_release)
+    response = upload_background(event_uuids[1], token, png.getvalue())
+    assert response.status_code == 200
+    wait_for_image_pool()
+
+    assert sorted(os.listdir(tmp_path)) == sorted(
+        images.background_keys(background_hash, "png")
+    )
+
+
+def test_variants_of_a_released_background_are_removed(monkeypatch, tmp_path):
+    monkeypatch.setattr(images, "storage", storage.LocalStorage(str(tmp_path)))
+
+    png = io.BytesIO()
+    Image.new("RGB", (1000, 600), "red").save(png, "PNG")
+    background_hash = images.save_original(png, "png")
+
+    # No event references the blob any more once the variants are written.
+    prepare_background(background_hash, "png")
+
+    assert os.listdir(tmp_path) == []
+
+
+class FakeS3Error(Exception):
+    def __init__(self, code):
+        self.response = {"Error": {"Code": code}}
+
+
+class FakeS3Body:
+    def __init__(self, content):
+        self.content = content
+
+    def iter_chunks(self, chunk_size):
+        for start in range(0, len(self.content), chunk_size):
+            stop = start + chunk_size
+            yield self.content[start:stop]
+
+
+class FakeS3Client:
+    def __init__(self):
+        self.objects = {}
+
+    def head_object(self, Bucket, Key):
+        if (Bucket, Key) not in self.objects:
+            raise FakeS3Error("404")
+
+    def upload_fileobj(self, file, bucket, key):
+        self.objects[bucket, key] = file.read()
+
+    def download_fileobj(self, bucket, key, file):
+        file.write(self.objects[bucket, key])
+
+    def delete_object(self, Bucket, Key):
+        self.objects.pop((Bucket, Key), None)
+
+    def get_object(self, Bucket, Key, Range=None):
+        content = self.objects[Bucket, Key]
+        if Range is None:
+            return {"Body": FakeS3Body(content), "ContentLength": len(content)}
+
+        start, end = map(int, Range.removeprefix("bytes=").split("-"))
+        stop = end + 1
+        return {
+            "Body": FakeS3Body(content[start:stop]),
+            "ContentLength": end + 1 - start,
+            "ContentRange": f"bytes {start}-{end}/{len(content)}",
+        }
+
+
+def test_backgrounds_in_s3(monkeypatch):
+    s3 = FakeS3Client()
+    monkeypatch.setattr(
+        images, "storage", storage.S3Storage("invitations", "backgrounds/", s3)
+    )
+
+    test_utils.create_user(client=client, user=user_1)
+    token = test_utils.login_user(client=client, user=user_1)
+    response = test_utils.create_event(client=client, event=event_1, token=token)
+    event_uuid = response.json()["uuid"]
+    headers = {"Authorization": f"Bearer {token}"}
+
+    png = io.BytesIO()
+    Image.new("RGB", (1000, 600), "red").save(png, "PNG")
+    background_hash = hashlib.sha256(png.getvalue()).hexdigest()
+
+    upload_background(event_uuid, token, png.getvalue())
+    wait_for_image_pool()
+    assert sorted(s3.objects) == sorted(
+        ("invitations", f"backgrounds/{key}")
+        for key in images.background_keys(background_hash, "png")
+    )
+
+    response = client.get(f"/events/{event_uuid}/background", headers=headers)
+    assert response.content == png.getvalue()
+    assert response.headers["etag"] == f'"{background_hash}"'
+
+    response = client.get(
+        f"/events/{event_uuid}/background",
+        headers={**headers, "Range": "bytes=0-7"},
+    )
+    assert response.status_code == 206
+    assert response.headers["content-range"] == f"bytes 0-7/{len(png.getvalue())}"
+    assert response.content == png.getvalue()[:8]
+
+    response = client.get(
+        f"/events/{event_uuid}/background",
+        params={"width": 320, "format": "webp"},
+        headers=headers,
+    )
+    assert Image.open(io.BytesIO(response.content)).size == (320, 192)
+
+    client.delete(f"/events/{event_uuid}/background", headers=headers)
+    assert s3.objects == {}
+
+
+def test_resumable_background_upload(monkeypatch, tmp_path):
+    monkeypatch.setattr(images, "storage", storage.LocalStorage(str(tmp_path)))
+    monkeypatch.setattr(settings, "upload_path", str(tmp_path / "uploads"))
+
+    test_utils.create_user(client=client, user=user_1)
+    token = test_utils.login_user(client=client, user=user_1)
+    response = test_utils.create_event(client=client, event=event_1, token=token)
+    event_uuid = response.json()["uuid"]
+    headers = {"Authorization": f"Bearer {token}"}
+
+    png = io.BytesIO()
+    Image.effect_noise((1000, 600), 64).save(png, "PNG")
+    content = png.getvalue()
+    half = len(content) // 2
+
+    response = client.post(
+        f"/events/{event_uuid}/background/uploads",
+        json={"size": len(content), "content_type": "image/png"},
+        headers=headers,
+    )
+    assert response.status_code == 201
+    upload_url = (
+        f"/events/{event_uuid}/background/uploads/{response.json()['upload_id']}"
+    )
+
+    response = client.put(
+        upload_url, params={"offset": 0}, content=content[:half], headers=headers
+    )
+    assert response.json()["offset"] == half
+
+    response = client.post(f"{upload_url}/finalize", headers=headers)
+    assert response.status_code == 409
+
+    # A retried chunk from a stale offset is refused and the client resumes.
+    response = client.put(
+        upload_url, params={"offset": 0}, content=content[:half], headers=headers
+    )
+    assert response.status_code == 409
+    assert client.get(upload_url, headers=headers).json()["offset"] == half
+
+    response = client.put(
+        upload_url,
+        params={"offset": half},
+        content=content[half:] + b"x",
+        headers=headers,
+    )
+    assert response.status_code == 413
+
+    response = client.put(
+        upload_url, params={"offset": half}, content=content[half:], headers=headers
+    )
+    assert response.json()["offset"] == len(content)
+
+    response = client.post(f"{upload_url}/finalize", headers=headers)
+    assert response.status_code == 200
+    wait_for_image_pool()
+    assert os.listdir(tmp_path / "uploads") == []
+
+    response = client.get(f"/events/{event_uuid}/background", headers=headers)
+    assert response.content == content
+
+    assert client.get(upload_url, headers=headers).status_code == 404
@@ -1,13 +1,21 @@
+from collections import Counter
+
 import pytest
 from fastapi.testclient import TestClient
+from sqlalchemy import event
+from sqlalchemy.ext.asyncio import AsyncSession
 
+from .. import models, utils
 from ..configuration import settings
+from ..database import SessionLocal, create_async_sessionmaker, engine
 from . import test_utils
 
 settings.sqlalchemy_database_url = "sqlite:///./sql_app_test.db"
 
-from ..main import app  # noqa: E402
+from ..main import create_app  # noqa: E402
+from ..routers import guests as guests_router  # noqa: E402
 
+app = create_app()
 client = TestClient(app)
 
 
@@ -385,3 +393,160 @@ def test_get_guests():
 
     # There are 2 guests because primary guest has a companion
     assert len(guests) == 2
+
+
+def count_queries(func, *args, **kwargs):
+    statements = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(engine, "before_cursor_execute", record)
+    try:
+        result = func(*args, **kwargs)
+    finally:
+        event.remove(engine, "before_cursor_execute", record)
+
+    return result, statements
+
+
+def statement_counts(statements):
+    # The unit of work does not guarantee the order of unrelated tables.
+    return Counter(statement.split()[0] for statement in statements)
+
+
+def count_answer_count_rows():
+    with SessionLocal() as db:
+        return db.query(models.EventAnswerCount).count()
+
+
+def test_answer_runs_in_one_transaction_with_pinned_query_budget():
+    test_utils.create_user(client, user_1)
+    user1_token = test_utils.login_user(client, user_1)
+    response = test_utils.create_event(client, event_2, user1_token)
+
+    guest_1["event_uuid"] = response.json()["uuid"]
+    response = test_utils.add_guest_to_event(client, guest_1, user1_token)
+    guest_uuid = response.json()["uuid"]
+
+    response, statements = count_queries(
+        client.post, f"/guests/{guest_uuid}/answer", json=guest_answer_3
+    )
+    assert response.status_code == 200
+    companion_uuid = response.json()["companion_uuid"]
+
+    # One SELECT loads guest, event and companion; the rest are the counter
+    # upserts and the guest UPDATE, all flushed by a single COMMIT.
+    assert statement_counts(statements) == {"SELECT": 1, "UPDATE": 1, "INSERT": 2}
+
+    response, statements = count_queries(
+        client.post, f"/guests/{guest_uuid}/answer", json=guest_answer_2
+    )
+    assert response.status_code == 200
+
+    # The companion follows the previous "no" answer in the same transaction,
+    # and both guest rows go out in one executemany UPDATE.
+    assert statement_counts(statements) == {"SELECT": 1, "UPDATE": 2, "INSERT": 4}
+    answer_count_rows = count_answer_count_rows()
+
+    response, statements = count_queries(
+        client.post,
+        f"/guests/{companion_uuid}/companion_answer",
+        json=companion_answer_2,
+    )
+    assert response.status_code == 200
+    assert response.json()["name"] == companion_answer_2["name"]
+    assert statement_counts(statements) == {"SELECT": 1, "UPDATE": 1, "INSERT": 2}
+
+    # Both keys already have a counter row, so the upserts add none.
+    assert count_answer_count_rows() == answer_count_rows
+
+
+def test_answers_are_group_committed_in_write_behind_mode(monkeypatch):
+    monkeypatch.setattr(settings, "rsvp_write_behind", True)
+
+    test_utils.create_user(client, user_1)
+    user1_token = test_utils.login_user(client, user_1)
+    response = test_utils.create_event(client, event_2, user1_token)
+
+    guest_1["event_uuid"] = response.json()["uuid"]
+    response = test_utils.add_guest_to_event(client, guest_1, user1_token)
+    guest_uuid = response.json()["uuid"]
+
+    flushed = guests_router.answer_queue.stats()["flushed"]
+
+    response = client.post(f"/guests/{guest_uuid}/answer", json=guest_answer_2)
+    assert response.status_code == 200
+    companion_uuid = response.json()["companion_uuid"]
+
+    response = client.post(
+        f"/guests/{companion_uuid}/companion_answer", json=companion_answer_2
+    )
+    assert response.status_code == 200
+    assert response.json()["name"] == companion_answer_2["name"]
+    assert response.json()["menu"] == companion_answer_2["menu"]
+
+    assert guests_router.answer_queue.stats()["flushed"] == flushed + 2
+
+    response = client.get(
+        f"/guests/{guest_uuid}",
+        headers={
+            "Authorization": f"Bearer {user1_token}",
+        },
+    )
+    assert response.json()["answer"] is True
+    assert response.json()["menu"] == guest_answer_2["menu"]
+
+
+def test_hot_paths_run_on_the_async_engine():
+    pytest.importorskip("aiosqlite")
+    AsyncSessionLocal = create_async_sessionmaker(engine.url)
+    sessions = []
+
+    async def get_async_db():
+        async with AsyncSessionLocal() as db:
+            sessions.append(db)
+            yield db
+
+    test_utils.create_user(client, user_1)
+    user1_token = test_utils.login_user(client, user_1)
+    response = test_utils.create_event(client, event_2, user1_token)
+    event_uuid = response.json()["uuid"]
+
+    guest_1["event_uuid"] = event_uuid
+    response = test_utils.add_guest_to_event(client, guest_1, user1_token)
+    guest_uuid = response.json()["uuid"]
+
+    app.dependency_overrides[utils.get_async_db] = get_async_db
+    try:
+        with TestClient(app) as async_client:
+            response = async_client.post(
+                f"/guests/{guest_uuid}/answer", json=guest_answer_2
+            )
+            assert response.status_code == 200
+            companion_uuid = response.json()["companion_uuid"]
+
+            response = async_client.post(
+                f"/guests/{companion_uuid}/companion_answer", json=companion_answer_2
+            )
+            assert response.json()["name"] == companion_answer_2["name"]
+
+            response = async_client.get(f"/guests/{guest_uuid}")
+            assert response.json()["menu"] == guest_answer_2["menu"]
+
+            response = async_client.get(f"/events/{event_uuid}")
+            assert response.json()["name"] == event_2["name"]
+
+            response = async_client.get("/guests/unknown")
+            assert response.status_code == 404
+    finally:
+        app.dependency_overrides.clear()
+
+    assert len(sessions) == 5
+    assert all(isinstance(db, AsyncSession) for db in sessions)
+
+    response = client.get(
+        f"/events/{event_uuid}/stats",
+        headers={"Authorization": f"Bearer {user1_token}"},
+    )
+    assert response.json()["sum_true"] == 2
@@ -0,0 +1,85 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+from ..pools import WorkerPool
+
+
+def wait_until_idle(pool):
+    # Futures resolve just before their done callback updates the counter.
+    deadline = time.monotonic() + 5
+    while pool.stats()["in_flight"] and time.monotonic() < deadline:
+        time.sleep(0.001)
+
+    return pool.stats()["in_flight"] == 0
+
+
+def test_worker_pool_limits_concurrency():
+    pool = WorkerPool(2, "test-pool")
+    release = threading.Event()
+    lock = threading.Lock()
+    running = 0
+    peak = 0
+
+    def work():
+        nonlocal running, peak
+        with lock:
+            running += 1
+            peak = max(peak, running)
+        release.wait(5)
+        with lock:
+            running -= 1
+
+    futures = [pool.submit(work) for _ in range(6)]
+
+    assert pool.stats() == {"workers": 2, "in_flight": 6, "queue_depth": 4}
+
+    deadline = time.monotonic() + 5
+    while running < 2 and time.monotonic() < deadline:
+        time.sleep(0.001)
+
+    release.set()
+    for future in futures:
+        future.result(5)
+
+    assert peak == 2
+    assert wait_until_idle(pool)
+
+
+def test_worker_pool_propagates_errors():
+    pool = WorkerPool(1, "test-pool")
+
+    def fail(message):
+        raise ValueError(message)
+
+    with pytest.raises(ValueError, match="from submit"):
+        pool.submit(fail, "from submit").result(5)
+
+    with pytest.raises(ValueError, match="from run"):
+        asyncio.run(pool.run(fail, "from run"))
+
+    # A failed task still frees its slot.
+    assert wait_until_idle(pool)
+    assert asyncio.run(pool.run(sum, [1, 2])) == 3
+
+
+def test_worker_pool_logs_errors_of_spawned_tasks(caplog):
+    pool = WorkerPool(1, "test-pool")
+
+    def fail():
+        raise ValueError("nobody is waiting")
+
+    with pytest.raises(ValueError):
+        pool.spawn(fail).result(5)
+    assert wait_until_idle(pool)
+
+    (record,) = caplog.records
+    assert record.getMessage() == "fail failed in the test-pool pool"
+    assert record.exc_info[1].args == ("nobody is waiting",)
+
+    caplog.clear()
+    pool.spawn(sum, [1, 2]).result(5)
+    assert wait_until_idle(pool)
+    assert caplog.records == []
@@ -0,0 +1,247 @@
+import inspect
+import re
+from collections import Counter
+from datetime import datetime
+
+import pytest
+from sqlalchemy import event, text
+
+from .. import crud, schemas
+from ..crud import events, guests, stats, users
+from ..database import SessionLocal, engine
+
+# Queries that return a whole table on purpose.
+FULL_SCAN_ALLOWED = {
+    "events.get_events",
+    "guests.get_guests",
+    "stats.merge_duplicate_answer_counts",
+    "stats.reconcile_event_stats",
+    "users.get_users",
+    "users.reset_tables",
+    "users.supersede_duplicate_deletion_jobs",
+}
+
+event_1 = schemas.EventCreate(
+    name="Spotkanie Biznesowe z Klientem",
+    is_public=True,
+    start_time=datetime(2024, 12, 5, 14),
+    location="Warszawa",
+    menu="Wegetariańskie;Mięsne",
+    decision_deadline=datetime(2050, 11, 28, 12),
+)
+
+
+def guest(event_uuid: str, has_companion: bool = False):
+    return schemas.GuestCreate(
+        name="Karolina",
+        surname="Kowalska",
+        email="karkowal@gmail.com",
+        phone="+48765456384",
+        event_uuid=event_uuid,
+        has_companion=has_companion,
+    )
+
+
+def explain(connection, statement, parameters):
+    if connection.dialect.name == "sqlite":
+        rows = connection.exec_driver_sql(
+            f"EXPLAIN QUERY PLAN {statement}", parameters
+        ).all()
+        return [row[-1] for row in rows if re.fullmatch(r"SCAN \w+( AS \w+)?", row[-1])]
+
+    connection.execute(text("SET LOCAL enable_seqscan = off"))
+    rows = connection.exec_driver_sql(f"EXPLAIN {statement}", parameters).all()
+    return [row[0] for row in rows if "Seq Scan" in row[0]]
+
+
+class QueryRecorder:
+    def __init__(self):
+        self.statements = []
+
+    def __call__(self, conn, cursor, statement, parameters, context, executemany):
+        if not executemany and statement.lstrip().upper().startswith(
+            ("SELECT", "UPDATE", "DELETE")
+        ):
+            self.statements.append((statement, parameters))
+
+    def full_scans(self):
+        scans = []
+
+        with engine.connect() as connection:
+            for statement, parameters in self.statements:
+                scans.extend(
+                    (statement, scan)
+                    for scan in explain(connection, statement, parameters)
+                )
+            connection.rollback()
+
+        return scans
+
+
+@pytest.fixture()
+def db():
+    db = SessionLocal()
+    users.reset_tables(db)
+
+    yield db
+
+    db.close()
+
+
+def crud_functions():
+    return {
+        f"{module.__name__.rsplit('.', 1)[-1]}.{name}"
+        for module in (events, guests, stats, users)
+        for name, function in inspect.getmembers(module, inspect.isfunction)
+        if function.__module__ == module.__name__ and not name.startswith("_")
+    }
+
+
+def test_crud_queries_use_indexes(db):
+    calls = []
+
+    def call(name, *args, **kwargs):
+        module_name, function_name = name.split(".")
+        function = getattr(getattr(crud, module_name), function_name)
+
+        recorder = QueryRecorder()
+        event.listen(engine, "before_cursor_execute", recorder)
+        try:
+            result = function(db, *args, **kwargs)
+        finally:
+            event.remove(engine, "before_cursor_execute", recorder)
+
+        calls.append((name, recorder))
+        return result
+
+    db_user = call(
+        "users.create_user",
+        schemas.UserCreate(email="test_user", password="123"),
+        "hashed",
+    )
+    call("users.get_user", db_user.user_id)
+    call("users.get_user_by_uuid", db_user.uuid)
+    call("users.get_user_by_email", db_user.email)
+    call("users.get_principal", db_user.email)
+    call("users.get_users")
+    call("users.change_user_role", "admin", db_user.email)
+    call(
+        "users.change_role_by_user_uuid",
+        schemas.UserChangeRole(role="user"),
+        db_user.uuid,
+    )
+    call("users.change_password", "hashed_again", db_user.user_id)
+    db_token = call("users.create_reset_password_token", db_user.email)
+    call("users.get_reset_password_token", db_token.token)
+    call("users.use_reset_password_token", db_token.token)
+
+    db_event = call("events.create_event", event_1, db_user.user_id)
+    call("events.get_event", db_event.uuid)
+    call("events.get_event_by_id", db_event.event_id)
+    call("events.get_event_by_organizer", db_user.user_id)
+    call("events.get_events")
+    call("events.get_public_events")
+    call("events.get_events_page")
+    call("events.get_events_page", organizer_id=db_user.user_id)
+    call("events.get_events_page", is_public=True, after=(event_1.start_time, 1))
+    call("events.get_events_page", start_after=event_1.start_time)
+    call("events.get_events_page", location="Warszawa", limit=10)
+    call("events.get_events_page", organizer_id=db_user.user_id, fields=["uuid"])
+    call(
+        "events.modify_event",
+        db_event.uuid,
+        schemas.EventModify(name="Kolacja z klientem"),
+    )
+    call("events.add_background", db_event.uuid, "png", "0" * 64)
+    call("events.set_background_placeholder", "0" * 64, "data:,")
+    call("events.lock_background", "0" * 64)
+    call("events.get_event_backgrounds", [db_event.event_id])
+    call("events.count_background_references", "0" * 64)
+    call("events.delete_background", db_event.uuid)
+
+    db_companion = call("guests.create_event_guest", guest(""), db_event.event_id)
+    db_guest = call(
+        "guests.create_event_guest",
+        guest(db_event.uuid, has_companion=True),
+        db_event.event_id,
+        db_companion.guest_id,
+    )
+    call(
+        "guests.create_event_guests",
+        [guest(db_event.uuid, has_companion=True), guest(db_event.uuid)],
+        db_event.event_id,
+    )
+    call("guests.get_guest", db_guest.uuid)
+    call("guests.get_guest_by_id", db_guest.guest_id)
+    call("guests.get_guests")
+    call("guests.get_guests", after=db_companion.guest_id)
+    call("guests.get_guests_from_event", db_event.uuid)
+    call("guests.get_guest_export_rows", db_event.event_id).close()
+    call("guests.get_guests_page", db_event.event_id)
+    call("guests.get_guests_page", db_event.event_id, answer="unknown", after=1)
+    call("guests.get_guests_page", db_event.event_id, fields=["uuid", "guest_id"])
+    call("guests.get_primary_guest", db_companion.guest_id)
+    call("guests.get_guest_for_answer", db_guest.uuid)
+    call("guests.get_companion_for_answer", db_companion.uuid)
+    call(
+        "guests.apply_guest_answer",
+        db_guest,
+        schemas.GuestAnswear(answer=False, menu=None),
+    )
+    call(
+        "guests.apply_companion_answer",
+        db_companion,
+        schemas.CompanionAnswear(answer=False, menu=None, name="Basia"),
+    )
+    call(
+        "guests.update_guest_answear",
+        db_guest.uuid,
+        schemas.GuestAnswear(answer=True, menu="Mięsne"),
+    )
+    call(
+        "guests.update_companion_answer",
+        db_companion.uuid,
+        schemas.CompanionAnswear(answer=True, menu="Mięsne", name="Basia"),
+    )
+    call("guests.answer_invitation", db_guest, schemas.GuestAnswear(answer=False))
+    call(
+        "guests.apply_queued_answers",
+        [
+            (db_guest.uuid, schemas.GuestAnswear(answer=True, menu="Mięsne")),
+            (db_companion.uuid, schemas.CompanionAnswear(answer=True, menu="Mięsne")),
+        ],
+    )
+    call("events.get_event_stats", db_event.uuid)
+    call("stats.get_answer_counts", db_event.uuid)
+    call("stats.adjust_answer_count", db_event.event_id, True, "Mięsne", -1)
+    call("stats.move_answer_count", db_guest, False, None)
+    call("stats.apply_answer_deltas", Counter({(db_event.event_id, None, None): 0}))
+    call("stats.reconcile_event_stats")
+    call("stats.merge_duplicate_answer_counts")
+    call("stats.delete_answer_counts", [db_event.event_id])
+    call("guests.delete_guest_from_event", db_guest.uuid)
+    call("guests.delete_participants_from_event", db_event.uuid)
+    call("events.delete_event", db_event)
+    call("events.delete_events", [db_event.event_id])
+    db_job = call("users.create_deletion_job", db_user.user_id)
+    call("users.get_deletion_job", db_job.job_id)
+    call("users.get_active_deletion_job", db_user.user_id)
+    call("users.claim_deletion_job", db_job.job_id, 300)
+    call("users.run_deletion_job", db_job.job_id, 10)
+    call("users.supersede_duplicate_deletion_jobs")
+
+    db_user = users.create_user(
+        db, schemas.UserCreate(email="test_user_2", password="123"), "hashed"
+    )
+    call("users.delete_user", db_user.user_id)
+    call("users.reset_tables")
+
+    assert {name for name, _ in calls} == crud_functions()
+
+    full_scans = [
+        (name, recorder.full_scans())
+        for name, recorder in calls
+        if name not in FULL_SCAN_ALLOWED
+    ]
+
+    assert [(name, scans) for name, scans in full_scans if scans] == []
@@ -0,0 +1,35 @@
+import json
+import os
+import subprocess
+import sys
+
+from .. import main
+
+FIRST_REQUEST = """
+import json, sys
+from fastapi.testclient import TestClient
+from {package}.main import create_app
+
+assert TestClient(create_app()).get("/events/public").status_code == 200
+print(json.dumps(sorted(sys.modules)))
+"""
+
+DEFERRED_MODULES = {"PIL", "passlib", "bcrypt", "openpyxl", "boto3"}
+
+
+def test_heavy_modules_are_not_imported_at_startup(tmp_path):
+    package = __package__.rsplit(".", 1)[0]
+    result = subprocess.run(
+        [sys.executable, "-c", FIRST_REQUEST.format(package=package)],
+        env={
+            **os.environ,
+            "PYTHONPATH": os.path.dirname(os.path.dirname(main.__file__)),
+            "SQLALCHEMY_DATABASE_URL": f"sqlite:///{tmp_path / 'startup.db'}",
+        },
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+
+    modules = {name.split(".")[0] for name in json.loads(result.stdout)}
+    assert modules.isdisjoint(DEFERRED_MODULES)
@@ -1,14 +1,18 @@
 import pytest
 from fastapi.testclient import TestClient
 
+from .. import schemas, utils
 from ..configuration import settings
+from ..crud import events as crud_events
+from ..crud import users
 from ..database import SessionLocal
 from . import test_utils
 
 settings.sqlalchemy_database_url = "sqlite:///./sql_app_test.db"
 
-from ..main import app  # noqa: E402
+from ..main import create_app  # noqa: E402
 
+app = create_app()
 client = TestClient(app)
 
 user_1 = {"email": "test_user", "password": "123"}
@@ -94,3 +98,275 @@ def test_user_email():
     assert response.status_code == 200
     assert "email" in response.json()
     assert response.json()["email"] == user_1["email"]
+
+
+def test_role_change_invalidates_cached_user():
+    test_utils.create_user(client=client, user=user_1)
+    token = test_utils.login_user(client=client, user=user_1)
+
+    response = client.get(
+        "/metrics",
+        headers={
+            "Authorization": f"Bearer {token}",
+        },
+    )
+    assert response.status_code == 401
+
+    users.change_user_role(SessionLocal(), "admin", user_1["email"])
+
+    response = client.get(
+        "/metrics",
+        headers={
+            "Authorization": f"Bearer {token}",
+        },
+    )
+    assert response.status_code == 200
+
+    response = client.get(
+        "/metrics",
+        headers={
+            "Authorization": f"Bearer {token}",
+        },
+    )
+    assert response.status_code == 200
+    assert response.json()["principal_cache"]["hits"] >= 1
+
+
+def test_password_change_invalidates_cached_user():
+    test_utils.create_user(client=client, user=user_1)
+    token = test_utils.login_user(client=client, user=user_1)
+    headers = {"Authorization": f"Bearer {token}"}
+    db_user = users.get_user_by_email(SessionLocal(), user_1["email"])
+    cache_key = (db_user.email, db_user.user_id)
+
+    client.get("/users/me", headers=headers)
+    assert utils.principal_cache.get(cache_key) is not None
+
+    response = client.post(
+        "/change_password",
+        json={"old_password": user_1["password"], "new_password": "456"},
+        headers=headers,
+    )
+    assert response.status_code == 200
+    assert utils.principal_cache.get(cache_key) is None
+
+    client.get("/users/me", headers=headers)
+    cached_user = utils.principal_cache.get(cache_key)
+    assert cached_user.hashed_password != db_user.hashed_password
+
+
+def test_deleted_user_is_not_served_from_cache():
+    test_utils.create_user(client=client, user=user_1)
+    token = test_utils.login_user(client=client, user=user_1)
+    headers = {"Authorization": f"Bearer {token}"}
+    db_user = users.get_user_by_email(SessionLocal(), user_1["email"])
+
+    assert client.get("/users/me", headers=headers).status_code == 200
+
+    users.delete_user(SessionLocal(), db_user.user_id)
+
+    assert client.get("/users/me", headers=headers).status_code == 401
+
+
+def test_user_read_before_an_invalidation_is_not_cached():
+    db_user = users.create_user(SessionLocal(), schemas.UserCreate(**user_1), "hashed")
+    cache_key = (db_user.email, db_user.user_id)
+
+    # A request read the row, then a role change committed and invalidated
+    # it before the request got to cache what it read.
+    generation = utils.principal_cache.generation()
+    users.change_user_role(SessionLocal(), "admin", db_user.email)
+    utils.principal_cache.set(cache_key, db_user, generation)
+
+    assert utils.principal_cache.get(cache_key) is None
+
+
+def test_delete_user_runs_deletion_job():
+    test_utils.create_user(client=client, user=user_1)
+    token = test_utils.login_user(client=client, user=user_1)
+
+    for _ in range(3):
+        response = test_utils.create_event(
+            client=client, event={**event_1, "is_public": True}, token=token
+        )
+        test_utils.create_guest(client, guest_1, response.json()["uuid"], token)
+
+    user_uuid = users.get_user_by_email(SessionLocal(), user_1["email"]).uuid
+
+    response = client.delete(
+        f"/users/{user_uuid}",
+        headers={
+            "Authorization": f"Bearer {token}",
+        },
+    )
+    assert response.status_code == 202
+
+    job_id = response.json()["job_id"]
+    assert client.get(f"/users/deletion_jobs/{job_id}").status_code == 401
+
+    test_utils.create_admin(SessionLocal(), client, admin_user)
+    admin_token = test_utils.login_user(client=client, user=admin_user)
+    response = client.get(
+        f"/users/deletion_jobs/{job_id}",
+        headers={
+            "Authorization": f"Bearer {admin_token}",
+        },
+    )
+
+    assert response.status_code == 200
+    assert response.json() == {
+        "job_id": job_id,
+        "status": "done",
+        "total_events": 3,
+        "deleted_events": 3,
+        "error": None,
+    }
+
+    response = client.get(
+        "/users/me",
+        headers={
+            "Authorization": f"Bearer {token}",
+        },
+    )
+    assert response.status_code == 401
+    assert client.get("/guests").json() == []
+
+
+def create_user_with_events(user, event_count):
+    test_utils.create_user(client=client, user=user)
+    token = test_utils.login_user(client=client, user=user)
+
+    for _ in range(event_count):
+        test_utils.create_event(
+            client=client, event={**event_1, "is_public": True}, token=token
+        )
+
+    return users.get_user_by_email(SessionLocal(), user["email"]), token
+
+
+def test_deletion_jobs_are_visible_to_their_owner_only():
+    db_user, token = create_user_with_events(user_1, 1)
+    test_utils.create_user(client=client, user=user_2)
+    user2_token = test_utils.login_user(client=client, user=user_2)
+
+    with SessionLocal() as db:
+        job_id = users.create_deletion_job(db, db_user.user_id).job_id
+
+    response = client.get(
+        f"/users/deletion_jobs/{job_id}",
+        headers={
+            "Authorization": f"Bearer {token}",
+        },
+    )
+    assert response.json()["status"] == "pending"
+
+    response = client.get(
+        f"/users/deletion_jobs/{job_id}",
+        headers={
+            "Authorization": f"Bearer {user2_token}",
+        },
+    )
+    assert response.status_code == 404
+
+
+def test_one_active_deletion_job_per_user():
+    db_user, _ = create_user_with_events(user_1, 1)
+
+    with SessionLocal() as db:
+        db_job = users.create_deletion_job(db, db_user.user_id)
+        assert users.create_deletion_job(db, db_user.user_id).job_id == db_job.job_id
+
+        # The second run finds the job done and the user already gone.
+        assert users.run_deletion_job(db, db_job.job_id, 10).status == "done"
+        assert users.run_deletion_job(db, db_job.job_id, 10).status == "done"
+
+
+def test_abandoned_deletion_job_is_resumed(monkeypatch):
+    db_user, token = create_user_with_events(user_1, 2)
+
+    with SessionLocal() as db:
+        db_job = users.create_deletion_job(db, db_user.user_id)
+        job_id = db_job.job_id
+
+        # A job that is still making progress is not run twice.
+        db_job.status = "running"
+        db.commit()
+        assert users.run_deletion_job(db, job_id, 10).status == "running"
+
+    # Its worker went away mid-job and stopped reporting progress.
+    monkeypatch.setattr(settings, "deletion_job_timeout", 0)
+
+    response = client.delete(
+        f"/users/{db_user.uuid}",
+        headers={
+            "Authorization": f"Bearer {token}",
+        },
+    )
+    assert response.status_code == 202
+    assert response.json()["job_id"] == job_id
+
+    with SessionLocal() as db:
+        db_job = users.get_deletion_job(db, job_id)
+        assert (db_job.status, db_job.deleted_events) == ("done", 2)
+
+
+def test_failed_deletion_job_frees_the_user(monkeypatch):
+    db_user, token = create_user_with_events(user_1, 1)
+
+    def fail(db, event_ids):
+        raise RuntimeError("storage unavailable")
+
+    monkeypatch.setattr(crud_events, "delete_events", fail)
+
+    response = client.delete(
+        f"/users/{db_user.uuid}",
+        headers={
+            "Authorization": f"Bearer {token}",
+        },
+    )
+    job_id = response.json()["job_id"]
+
+    with SessionLocal() as db:
+        db_job = users.get_deletion_job(db, job_id)
+        assert (db_job.status, db_job.error) == ("failed", "storage unavailable")
+
+    monkeypatch.undo()
+
+    response = client.delete(
+        f"/users/{db_user.uuid}",
+        headers={
+            "Authorization": f"Bearer {token}",
+        },
+    )
+    assert response.json()["job_id"] != job_id
+    assert users.get_user(SessionLocal(), db_user.user_id) is None
+
+
+def reset_password(token, new_password):
+    return client.post(
+        "/reset_password_with_token",
+        json={"token": token, "new_password": new_password},
+    )
+
+
+def test_reset_password_token_is_used_once(monkeypatch):
+    test_utils.create_user(client=client, user=user_1)
+    token = users.create_reset_password_token(SessionLocal(), user_1["email"]).token
+
+    assert reset_password(token, "456").status_code == 200
+    assert reset_password(token, "789").status_code == 401
+
+    # A concurrent request redeems the token while this one is hashing.
+    token = users.create_reset_password_token(SessionLocal(), user_1["email"]).token
+    get_password_hash_async = utils.get_password_hash_async
+
+    async def hash_after_concurrent_reset(password):
+        with SessionLocal() as db:
+            users.use_reset_password_token(db, token)
+            db.commit()
+        return await get_password_hash_async(password)
+
+    monkeypatch.setattr(utils, "get_password_hash_async", hash_after_concurrent_reset)
+
+    assert reset_password(token, "789").status_code == 401
+    assert test_utils.login_user(client=client, user={**user_1, "password": "456"})
@@ -0,0 +1,101 @@
+import fcntl
+import json
+import os
+import re
+import time
+import uuid
+
+from fastapi import HTTPException, status
+
+from .configuration import settings
+
+UPLOAD_ID = re.compile(r"[0-9a-f]{32}")
+
+
+def upload_path(upload_id: str, suffix: str):
+    return os.path.join(settings.upload_path, f"{upload_id}.{suffix}")
+
+
+def create_upload(event_uuid: str, size: int, content_type: str):
+    purge_expired()
+    os.makedirs(settings.upload_path, exist_ok=True)
+
+    upload = {
+        "upload_id": uuid.uuid4().hex,
+        "event_uuid": event_uuid,
+        "size": size,
+        "content_type": content_type,
+    }
+
+    open(upload_path(upload["upload_id"], "part"), "xb").close()
+    with open(upload_path(upload["upload_id"], "json"), "x") as file:
+        json.dump(upload, file)
+
+    return {**upload, "offset": 0}
+
+
+def get_upload(upload_id: str):
+    if not UPLOAD_ID.fullmatch(upload_id):
+        return None
+
+    try:
+        with open(upload_path(upload_id, "json")) as file:
+            upload = json.load(file)
+        # The bytes on disk are the source of truth, so an interrupted chunk
+        # resumes from whatever actually arrived.
+        offset = os.path.getsize(upload_path(upload_id, "part"))
+    except FileNotFoundError:
+        return None
+
+    return {**upload, "offset": offset}
+
+
+def open_part(upload_id: str, offset: int):
+    file = open(upload_path(upload_id, "part"), "r+b")
+
+    try:
+        fcntl.flock(file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except BlockingIOError:
+        file.close()
+        raise HTTPException(
+            status.HTTP_409_CONFLICT, detail="Another chunk is being written"
+        )
+
+    current = file.seek(0, os.SEEK_END)
+
+    if current != offset:
+        file.close()
+        raise HTTPException(
+            status.HTTP_409_CONFLICT, detail=f"The upload continues at offset {current}"
+        )
+
+    return file
+
+
+def remove_upload(upload_id: str):
+    for suffix in ("part", "json"):
+        try:
+            os.remove(upload_path(upload_id, suffix))
+        except FileNotFoundError:
+            pass
+
+
+def purge_expired():
+    if not os.path.isdir(settings.upload_path):
+        return
+
+    expired = time.time() - settings.upload_ttl
+
+    for name in os.listdir(settings.upload_path):
+        upload_id, _, suffix = name.partition(".")
+        if suffix != "json":
+            continue
+
+        # Uploads still receiving chunks are kept, however old they are.
+        try:
+            last_write = os.path.getmtime(upload_path(upload_id, "part"))
+        except FileNotFoundError:
+            last_write = 0
+
+        if last_write < expired:
+            remove_upload(upload_id)
@@ -1,51 +1,118 @@
+import functools
 import uuid
 from datetime import datetime, timedelta, timezone
 from typing import Annotated
 
 import jwt
-from fastapi import Depends, HTTPException, status
+from fastapi import Depends, HTTPException, Request, status
+from fastapi.concurrency import run_in_threadpool
 from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
 from jwt.exceptions import InvalidTokenError
-from passlib.context import CryptContext
-from sqlalchemy.orm import Session
+from sqlalchemy import inspect
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session, make_transient_to_detached
 
-from . import schemas
+from . import replicas, schemas
+from .cache import TTLCache
 from .configuration import settings
 from .crud import users
-from .database import SessionLocal
+from .database import AsyncSessionLocal, SessionLocal
+from .pools import WorkerPool
 
 SECRET_KEY = settings.secret_key
 ALGORITHM = settings.algorithm
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
 
+principal_cache = TTLCache(
+    maxsize=settings.principal_cache_size, ttl=settings.principal_cache_ttl
+)
+password_pool = WorkerPool(settings.password_hash_workers, "password-hash")
+
 
 # Dependency
-def get_db():
+def get_db(request: Request):
     db = SessionLocal()
+    if replicas.replica_engine is not None and replicas.use_replica(request):
+        db.info["replica"] = replicas.replica_engine
     try:
         yield db
     finally:
         db.close()
 
 
+async def get_async_db(request: Request):
+    # An AsyncSession when ASYNC_DATABASE is on, a Session otherwise; routes
+    # taking it must query it through run_db.
+    if AsyncSessionLocal is None:
+        db = SessionLocal()
+        if replicas.replica_engine is not None and replicas.use_replica(request):
+            db.info["replica"] = replicas.replica_engine
+        try:
+            yield db
+        finally:
+            # Closing only hands the connection back; doing it on the loop
+            # keeps it from queueing behind threads waiting for that connection.
+            db.close()
+    else:
+        async with AsyncSessionLocal() as db:
+            replica = replicas.async_replica_engine
+            if replica is not None and replicas.use_replica(request):
+                db.info["replica"] = replica.sync_engine
+            yield db
+
+
+async def run_db(db: Session | AsyncSession, func, *args):
+    # The crud functions are shared: on an AsyncSession they run in a greenlet
+    # against the async driver instead of occupying a threadpool thread.
+    if isinstance(db, AsyncSession):
+        return await db.run_sync(func, *args)
+
+    return await run_in_threadpool(func, db, *args)
+
+
+@functools.cache
+def pwd_context():
+    # passlib loads bcrypt on import; most workers only verify tokens.
+    from passlib.context import CryptContext
+
+    return CryptContext(schemes=["bcrypt"], deprecated="auto")
+
+
 def verify_password(plain_password, hashed_password):
-    return pwd_context.verify(plain_password, hashed_password)
+    return pwd_context().verify(plain_password, hashed_password)
 
 
-def authenticate_user(form_data: OAuth2PasswordRequestForm, db: Session):
-    user = users.get_user_by_email(db, form_data.username)
+async def verify_password_async(plain_password, hashed_password):
+    return await password_pool.run(verify_password, plain_password, hashed_password)
+
+
+async def authenticate_user(form_data: OAuth2PasswordRequestForm, db: Session):
+    user = await run_in_threadpool(users.get_user_by_email, db, form_data.username)
 
     if not user:
         return False
-    if not verify_password(form_data.password, user.hashed_password):
+
+    db.expunge(user)
+    release_connection(db)
+
+    if not await verify_password_async(form_data.password, user.hashed_password):
         return False
     return user
 
 
+def release_connection(db: Session):
+    # Give the connection back to the pool while a request awaits the password
+    # pool, so a login storm cannot hold every pooled connection at once.
+    db.rollback()
+
+
 def get_password_hash(password):
-    return pwd_context.hash(password)
+    return pwd_context().hash(password)
+
+
+async def get_password_hash_async(password):
+    return await password_pool.run(get_password_hash, password)
 
 
 def create_access_token(data: dict, expires_delta: timedelta = timedelta(minutes=60)):
@@ -81,13 +148,37 @@ def get_current_user(
     except InvalidTokenError:
         raise credentials_exception
 
-    user = users.get_user_by_email(db, email)
+    cache_key = (email, payload.get("user_id"))
+
+    cached_user = principal_cache.get(cache_key)
+    if cached_user is not None:
+        return db.merge(cached_user, load=False)
+
+    generation = principal_cache.generation()
+    user = users.get_principal(db, email)
     if user is None:
         raise credentials_exception
 
+    if user.user_id == cache_key[1]:
+        principal_cache.set(cache_key, _detached_copy(user), generation)
+
     return user
 
 
+def _detached_copy(db_object):
+    mapper = inspect(db_object).mapper
+    copy = mapper.class_(
+        **{attr.key: getattr(db_object, attr.key) for attr in mapper.column_attrs}
+    )
+    make_transient_to_detached(copy)
+
+    return copy
+
+
+def invalidate_principal(db_user):
+    principal_cache.invalidate((db_user.email, db_user.user_id))
+
+
 def get_admin_user(current_user: Annotated[schemas.User, Depends(get_current_user)]):
     if current_user.role != "admin":
         raise HTTPException(
@@ -103,3 +194,18 @@ def get_uuid4():
 
 def get_default_expire_date():
     return datetime.now(timezone.utc) + timedelta(minutes=60)
+
+
+def utc_now():
+    return datetime.now(timezone.utc)
+
+
+def etag_matches(request: Request, etag: str):
+    if_none_match = request.headers.get("if-none-match")
+
+    if if_none_match is None:
+        return False
+
+    tags = {tag.strip().removeprefix("W/") for tag in if_none_match.split(",")}
+
+    return "*" in tags or etag in tags